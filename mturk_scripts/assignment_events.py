@@ -0,0 +1,266 @@
+"""Sources of the HITs with new submitted assignments, used by `HITManager`.
+
+`PollingEventSource` reviews the open HITs in each sweep, calling
+`list_assignments_for_hit` once per HIT, optionally skipping the HITs reviewed recently.
+`NotificationEventSource` only reviews the HITs notified by MTurk with an
+`AssignmentSubmitted` event, and reconciles with a full sweep every `reconcile_seconds` in
+case a notification was lost.
+
+MTurk sends the notifications to an Amazon SQS queue, read with `SQSNotificationQueue`.
+`DirectoryNotificationQueue` is a local stand-in for testing, where each notification is a
+json file in a directory.
+
+Several collectors may read the same queue, each one reviewing its own HITs. A message is
+only deleted by the collector that has its HITs open, the others leave it in the queue to
+be received again once its visibility timeout expires.
+"""
+import json
+import os
+import time
+import uuid
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+from common import lazy_imports, logger
+
+boto3 = lazy_imports.lazy_import('boto3')
+
+_LOGGER = logger.get_logger(__name__)
+
+ASSIGNMENT_SUBMITTED = 'AssignmentSubmitted'
+
+
+def submitted_hit_ids(message: Dict[str, Any]) -> List[str]:
+    """HIT ids of the `AssignmentSubmitted` events of an MTurk notification message."""
+    return [event['HITId'] for event in message.get('Events', [])
+            if event.get('EventType') == ASSIGNMENT_SUBMITTED]
+
+
+def create_notification_message(hit_id: str, assignment_id: str = '') -> Dict[str, Any]:
+    """MTurk notification message with a single `AssignmentSubmitted` event."""
+    return {
+        'EventDocId': str(uuid.uuid4()),
+        'EventDocVersion': '2014-08-15',
+        'Events': [{
+            'EventType': ASSIGNMENT_SUBMITTED,
+            'EventTimestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'HITId': hit_id,
+            'AssignmentId': assignment_id,
+        }],
+    }
+
+
+class ReceivedMessage(NamedTuple):
+    """Message received from a notification queue, hidden from the other readers until it
+    is deleted with its @receipt or its visibility timeout expires."""
+    body: Dict[str, Any]
+    receipt: str
+    receive_count: int
+
+
+class PollingEventSource:
+    """Reviews the open HITs, waiting a fixed time between sweeps without results.
+
+    Args:
+        poll_seconds (float): minimum seconds between two reviews of the same HIT. By
+            default, every open HIT is reviewed in each sweep.
+        clock (Callable[[], float]): current timestamp. The next poll times are saved in
+            the collector checkpoints, so it must be a wall clock.
+    """
+
+    def __init__(self, poll_seconds: float = 0,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        # Timestamp from which each hit must be reviewed again
+        self.next_poll_times: Dict[str, float] = {}
+
+    def hit_ids_to_review(self, open_hit_ids: List[str]) -> List[str]:
+        now = self.clock()
+        self.next_poll_times = {
+            hit_id: self.next_poll_times[hit_id]
+            for hit_id in open_hit_ids if hit_id in self.next_poll_times}
+        hit_ids = [hit_id for hit_id in open_hit_ids
+                   if self.next_poll_times.get(hit_id, now) <= now]
+        for hit_id in hit_ids:
+            self.next_poll_times[hit_id] = now + self.poll_seconds
+        return hit_ids
+
+    def wait(self, seconds: float):
+        time.sleep(seconds)
+
+
+class SQSNotificationQueue:
+    """Notifications sent by MTurk to an Amazon SQS queue."""
+
+    def __init__(self, queue_url: str, aws_access_key: str, aws_secret_key: str,
+                 region_name: str = 'us-east-1') -> None:
+        self.queue_url = queue_url
+        self.sqs_client = boto3.client(
+            aws_access_key_id=aws_access_key,
+            aws_secret_access_key=aws_secret_key,
+            service_name='sqs',
+            region_name=region_name,
+        )
+
+    def receive(self, timeout: float) -> List[ReceivedMessage]:
+        """Waits up to @timeout seconds for messages. They are not deleted from the queue."""
+        response = self.sqs_client.receive_message(
+            QueueUrl=self.queue_url, MaxNumberOfMessages=10,
+            WaitTimeSeconds=max(0, min(20, int(timeout))),
+            AttributeNames=['ApproximateReceiveCount'])
+        return [
+            ReceivedMessage(
+                json.loads(message['Body']), message['ReceiptHandle'],
+                int(message.get('Attributes', {}).get('ApproximateReceiveCount', 1)))
+            for message in response.get('Messages', [])]
+
+    def delete(self, receipt: str):
+        self.sqs_client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+
+
+class DirectoryNotificationQueue:
+    """Local queue of notifications, each one a json file in @dirpath.
+
+    Files are consumed in order of name. A received file is renamed to hide it from the
+    other readers for @visibility_seconds, and removed once deleted. If it is not deleted
+    in time, the next reader renames it back. Use `publish` or `create_notification_message`
+    to write notifications.
+    """
+
+    # Received files are named `.received-<visibility deadline in ns>-<file name>`
+    RECEIVED_PREFIX = '.received-'
+
+    def __init__(self, dirpath: str, poll_seconds: float = 0.5,
+                 visibility_seconds: float = 30) -> None:
+        self.dirpath = dirpath
+        self.poll_seconds = poll_seconds
+        self.visibility_seconds = visibility_seconds
+        os.makedirs(dirpath, exist_ok=True)
+
+    def publish(self, message: Dict[str, Any]):
+        # The last part of the name is the number of times the file was received
+        filename = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}-0.json'
+        temporary_filepath = os.path.join(self.dirpath, '.' + filename)
+        with open(temporary_filepath, 'w') as message_file:
+            json.dump(message, message_file)
+        # Readers only list complete files
+        os.replace(temporary_filepath, os.path.join(self.dirpath, filename))
+
+    def _return_expired_messages(self, filenames: List[str]):
+        now = time.time_ns()
+        for filename in filenames:
+            if not filename.startswith(self.RECEIVED_PREFIX):
+                continue
+            deadline, original_filename = filename[len(self.RECEIVED_PREFIX):].split('-', 1)
+            if int(deadline) <= now:
+                try:
+                    os.rename(os.path.join(self.dirpath, filename),
+                              os.path.join(self.dirpath, original_filename))
+                except FileNotFoundError:
+                    # Deleted or returned by another reader
+                    continue
+
+    def _read_messages(self) -> List[ReceivedMessage]:
+        self._return_expired_messages(os.listdir(self.dirpath))
+        deadline = time.time_ns() + int(self.visibility_seconds * 1e9)
+        messages = []
+        for filename in sorted(os.listdir(self.dirpath)):
+            if filename.startswith('.') or not filename.endswith('.json'):
+                continue
+            name, receive_count = filename[:-len('.json')].rsplit('-', 1)
+            receive_count = int(receive_count) + 1
+            received_filepath = os.path.join(
+                self.dirpath,
+                f'{self.RECEIVED_PREFIX}{deadline}-{name}-{receive_count}.json')
+            try:
+                os.rename(os.path.join(self.dirpath, filename), received_filepath)
+            except FileNotFoundError:
+                # Received by another reader
+                continue
+            with open(received_filepath, 'r') as message_file:
+                messages.append(
+                    ReceivedMessage(json.load(message_file), received_filepath, receive_count))
+        return messages
+
+    def receive(self, timeout: float) -> List[ReceivedMessage]:
+        """Waits up to @timeout seconds for messages. They are not deleted from the queue."""
+        deadline = time.monotonic() + timeout
+        while True:
+            messages = self._read_messages()
+            remaining_seconds = deadline - time.monotonic()
+            if len(messages) > 0 or remaining_seconds <= 0:
+                return messages
+            time.sleep(min(self.poll_seconds, remaining_seconds))
+
+    def delete(self, receipt: str):
+        try:
+            os.remove(receipt)
+        except FileNotFoundError:
+            # Returned to the queue after its visibility timeout
+            _LOGGER.warning(f"Notification {receipt} was deleted after its visibility timeout")
+
+
+class NotificationEventSource:
+    """Reviews the HITs notified in a queue, with sparse reconciliation sweeps.
+
+    Only the messages whose HITs are all open, the ones owned by this collector, are
+    deleted from the queue. The others are left for the collector reviewing their HITs,
+    until they were received @max_receive_count times, e.g. for HITs already closed.
+
+    Args:
+        notification_queue: `SQSNotificationQueue` or `DirectoryNotificationQueue`.
+        reconcile_seconds (float): seconds between sweeps of all the open HITs. The first
+            call to `hit_ids_to_review` is always a full sweep.
+        max_receive_count (int): number of receptions after which a message of HITs that
+            are not open is deleted.
+        clock (Callable[[], float]): current time in seconds.
+    """
+
+    def __init__(self, notification_queue, reconcile_seconds: float = 600,
+                 max_receive_count: int = 10,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.notification_queue = notification_queue
+        self.reconcile_seconds = reconcile_seconds
+        self.max_receive_count = max_receive_count
+        self.clock = clock
+        self.last_reconcile_time: Optional[float] = None
+        # Messages received since the last sweep
+        self.received_messages: List[ReceivedMessage] = []
+
+    def _notified_hit_ids(self, open_hit_ids: List[str]) -> Set[str]:
+        """Open HIT ids of the received messages, deleting the messages owned."""
+        open_hit_ids = set(open_hit_ids)
+        notified_hit_ids = set()
+        for message in self.received_messages:
+            hit_ids = submitted_hit_ids(message.body)
+            notified_hit_ids.update(open_hit_ids.intersection(hit_ids))
+            if open_hit_ids.issuperset(hit_ids):
+                self.notification_queue.delete(message.receipt)
+            elif message.receive_count >= self.max_receive_count:
+                _LOGGER.info(f"Dropping notification of hits {hit_ids} not open in any of "
+                             f"{message.receive_count} receptions")
+                self.notification_queue.delete(message.receipt)
+        self.received_messages = []
+        return notified_hit_ids
+
+    def hit_ids_to_review(self, open_hit_ids: List[str]) -> List[str]:
+        self.received_messages.extend(self.notification_queue.receive(timeout=0))
+        notified_hit_ids = self._notified_hit_ids(open_hit_ids)
+        now = self.clock()
+        if (self.last_reconcile_time is None or
+                now - self.last_reconcile_time >= self.reconcile_seconds):
+            _LOGGER.info(f"Reconciliation sweep of {len(open_hit_ids)} open hits")
+            self.last_reconcile_time = now
+            return list(open_hit_ids)
+
+        return [hit_id for hit_id in open_hit_ids if hit_id in notified_hit_ids]
+
+    def wait(self, seconds: float):
+        """Waits until a notification is received, for at most @seconds."""
+        if len(self.received_messages) > 0:
+            return
+        if self.last_reconcile_time is not None:
+            seconds = min(
+                seconds, self.last_reconcile_time + self.reconcile_seconds - self.clock())
+        self.received_messages.extend(self.notification_queue.receive(timeout=max(0, seconds)))
@@ -0,0 +1,190 @@
+"""Concurrent listing of the blobs of a container, sharded by name prefix.
+
+`container_client.list_blobs(name_starts_with=prefix)` is a single paged iterator, so listing
+a container with hundreds of thousands of blobs waits for every page in sequence. Here, if the
+listing does not fit in its first page, the virtual directories under the prefix, e.g. the
+game directories `builder-data/1-c70/`, are found with `walk_blobs`, which returns a single
+item per directory. The directories are then grouped by the start of their names in shards of
+similar size, and the shards are listed concurrently, each with its own paged iterator:
+
+>>> for blob_name in iter_blob_names(container_client, 'builder-data', ['.png']):
+...     print(blob_name)
+
+The names are yielded while they are listed, in no particular order, and at most
+`queue_size` names are kept in memory waiting to be consumed.
+"""
+import itertools
+import math
+import queue
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Tuple
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+# Names passed from the listing threads to the consumer at once
+BATCH_SIZE = 1000
+
+
+def walk_directories(container_client, prefix: str, min_directories: int = 1,
+                     delimiter: str = '/', max_depth: int = 3,
+                     max_workers: int = 16) -> Tuple[List[str], List[str]]:
+    """Finds the virtual directories under @prefix, descending until there are enough of them.
+
+    Directories are walked one level at a time, at most @max_depth levels, until at least
+    @min_directories are found. For example, the prefix `builder-data` has a single directory
+    `builder-data/`, which holds one directory per game. The directories of a level are
+    walked concurrently.
+
+    Returns:
+        Tuple: the names of the deepest directories found, ending with @delimiter, and the
+        names of the blobs found in the levels walked above them.
+    """
+    def walk(directory):
+        return [item.name for item in container_client.walk_blobs(
+            name_starts_with=directory, delimiter=delimiter)]
+
+    directories = [prefix]
+    blob_names = []
+    for _ in range(max_depth):
+        if len(directories) >= min_directories:
+            break
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(directories))) as executor:
+            names = list(itertools.chain.from_iterable(executor.map(walk, directories)))
+        # Directories are returned as `BlobPrefix` items named after the prefix
+        directories = [name for name in names if name.endswith(delimiter)]
+        blob_names.extend(name for name in names if not name.endswith(delimiter))
+        if len(directories) == 0:
+            break
+    return directories, blob_names
+
+
+def shard_prefixes(directories: Iterable[str], shard_count: int) -> List[str]:
+    """Name prefixes grouping @directories in about @shard_count shards of similar size.
+
+    A prefix selects all the directories starting with it, and no directory is selected by
+    two prefixes. @directories end with the delimiter, so no directory name is the prefix of
+    another one.
+    """
+    directories = sorted(directories)
+    max_shard_size = max(1, math.ceil(len(directories) / max(shard_count, 1)))
+    prefixes = []
+    pending = [(0, directories)]
+    while len(pending) > 0:
+        prefix_length, group = pending.pop()
+        if len(group) <= max_shard_size:
+            prefixes.append(group[0][:prefix_length] if len(group) > 1 else group[0])
+            continue
+        # Split the group by the next character of the names
+        for _, subgroup in itertools.groupby(group, key=lambda name: name[prefix_length]):
+            pending.append((prefix_length + 1, list(subgroup)))
+    return sorted(prefixes)
+
+
+def iter_blob_names(container_client, prefix: str, exclude_suffixes: Iterable[str] = (),
+                    max_workers: int = 16, shard_count: int = None, delimiter: str = '/',
+                    queue_size: int = 10000) -> Iterator[str]:
+    """Yields the names of the blobs starting with @prefix, listed concurrently in shards.
+
+    Args:
+        container_client (ContainerClient): client of the container to list.
+        prefix (str): start of the names of the blobs, as in `list_blobs`.
+        exclude_suffixes (list): names ending with any of these are skipped while listing.
+        max_workers (int): maximum number of shards listed at the same time.
+        shard_count (int): approximate number of shards, by default 4 per worker.
+        delimiter (str): separator of the virtual directories in the blob names.
+        queue_size (int): maximum number of listed names waiting to be yielded.
+    """
+    exclude_suffixes = tuple(exclude_suffixes)
+    pager = container_client.list_blobs(name_starts_with=prefix)
+    if not hasattr(pager, 'by_page'):
+        # Clients without pages, such as replayed ones, are listed at once
+        for blob in pager:
+            if not blob.name.endswith(exclude_suffixes):
+                yield blob.name
+        return
+
+    # Small listings fit in a single page, and are not worth sharding
+    pages = pager.by_page()
+    first_page_names = [blob.name for blob in next(pages, [])]
+    for blob_name in first_page_names:
+        if not blob_name.endswith(exclude_suffixes):
+            yield blob_name
+    if pages.continuation_token is None or len(first_page_names) == 0:
+        return
+    # Blobs are listed in lexicographical order, the ones up to here were already yielded
+    listed_until = first_page_names[-1]
+
+    shard_count = shard_count or 4 * max_workers
+    directories, walked_blob_names = walk_directories(
+        container_client, prefix, min_directories=shard_count, delimiter=delimiter,
+        max_workers=max_workers)
+    for blob_name in walked_blob_names:
+        if blob_name > listed_until and not blob_name.endswith(exclude_suffixes):
+            yield blob_name
+    if len(directories) == 0:
+        return
+
+    # Names starting with a shard sorted before the end of the first page were all listed
+    shards = [shard for shard in shard_prefixes(directories, shard_count)
+              if shard > listed_until or listed_until.startswith(shard)]
+    if len(shards) == 0:
+        return
+    _LOGGER.debug(f"Listing {len(directories)} directories under {prefix} in {len(shards)} "
+                  f"shards")
+    # Shards may start like a blob found by the walk, which was already yielded
+    walked_blob_names = set(walked_blob_names)
+    names_queue = queue.Queue(maxsize=max(1, queue_size // BATCH_SIZE))
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        # Stop waiting for the consumer if it is gone
+        while not stopped.is_set():
+            try:
+                names_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def list_shard(shard):
+        batch = []
+        try:
+            if stopped.is_set():
+                return
+            for blob in container_client.list_blobs(name_starts_with=shard):
+                if stopped.is_set():
+                    return
+                if (blob.name <= listed_until or blob.name.endswith(exclude_suffixes) or
+                        blob.name in walked_blob_names):
+                    continue
+                batch.append(blob.name)
+                if len(batch) >= BATCH_SIZE:
+                    put(batch)
+                    batch = []
+            put(batch)
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(shards)))
+    try:
+        for shard in shards:
+            executor.submit(list_shard, shard)
+        pending_shards = len(shards)
+        while pending_shards > 0:
+            item = names_queue.get()
+            if item is done:
+                pending_shards -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield from item
+    finally:
+        # The consumer may stop early, shards not started are never listed
+        stopped.set()
+        executor.shutdown(wait=True, cancel_futures=True)
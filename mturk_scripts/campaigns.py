@@ -0,0 +1,123 @@
+"""Several data collection campaigns served by a single collector process.
+
+A campaign is a hit type with its template, its number of HITs and the section of
+`env_configs.json` of its environment. The campaigns are listed in a json file:
+
+    [
+        {"environment": "production", "hit_type": "builder-normal", "hit_count": 100,
+         "template_filepath": "templates/builder_normal.xml"},
+        {"environment": "sandbox", "hit_type": "builder-normal", "hit_count": 5,
+         "reward": "0.10"}
+    ]
+
+Any other key of a campaign overrides the configuration of its environment and the
+command line settings, e.g. `reward` or `duplicate_index_filepath`.
+
+The campaigns of the same MTurk endpoint share its client and a single `HitSweep`, which
+lists all the HITs once per collection round, and the Azure clients of all the campaigns
+share a connection pool.
+"""
+import json
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from game_storage import create_shared_transport
+from hit_manager import HitSweep, create_mturk_client
+from common import logger, utils
+
+_LOGGER = logger.get_logger(__name__)
+
+DEFAULT_HIT_TYPE = 'builder-normal'
+DEFAULT_TEMPLATE_FILEPATH = 'templates/builder_normal.xml'
+
+
+class Campaign:
+    """HITs of one type, template and environment.
+
+    Args:
+        name (str): name of the campaign in the logs.
+        hit_type (str): type of the HITs, saved in their `RequesterAnnotation`.
+        template_filepath (str): path of the template of the HITs.
+        hit_count (int): number of HITs to create.
+        config (dict): configuration of the campaign, as the one of a single collector.
+    """
+
+    def __init__(self, name: str, hit_type: str, template_filepath: str, hit_count: int,
+                 config: Dict[str, Any]) -> None:
+        self.name = name
+        self.hit_type = hit_type
+        self.template_filepath = template_filepath
+        self.hit_count = hit_count
+        self.config = config
+
+
+def load_campaigns(filepath: str, settings: Dict[str, Any],
+                   config_filepath: Optional[str] = None) -> List[Campaign]:
+    """Reads the campaigns of the json file @filepath, see the module documentation.
+
+    Args:
+        filepath (str): path of the file with the list of campaigns.
+        settings (dict): configuration shared by all the campaigns, e.g. from the command
+            line, overriding the one of their environments.
+        config_filepath (str): path of the configuration of the environments, by default
+            `common/env_configs.json`.
+
+    Raises:
+        ValueError: if a campaign has no environment or hit count, or two campaigns have the
+            same hit type in the same MTurk endpoint, as their HITs could not be told apart.
+    """
+    with open(filepath, 'r') as campaigns_file:
+        entries = json.load(campaigns_file)
+
+    campaigns = []
+    hit_types = set()
+    for index, entry in enumerate(entries):
+        overrides = dict(entry)
+        environment = overrides.pop('environment', None)
+        hit_count = overrides.pop('hit_count', None)
+        if environment is None or hit_count is None:
+            raise ValueError(f"Campaign {index} of {filepath} has no environment or hit_count")
+        hit_type = overrides.pop('hit_type', DEFAULT_HIT_TYPE)
+        template_filepath = overrides.pop('template_filepath', DEFAULT_TEMPLATE_FILEPATH)
+        name = overrides.pop('name', f'{environment}/{hit_type}')
+
+        config = utils.read_config(environment, config_filepath=config_filepath)
+        config.update(settings)
+        config.update(overrides)
+        if (config['mturk_endpoint'], hit_type) in hit_types:
+            raise ValueError(f"Campaign {name} has the same hit type as a previous campaign "
+                             f"of {config['mturk_endpoint']}")
+        hit_types.add((config['mturk_endpoint'], hit_type))
+        campaigns.append(Campaign(name, hit_type, template_filepath, hit_count, config))
+    return campaigns
+
+
+class SharedClients:
+    """MTurk clients and HIT sweeps by endpoint, and Azure transport, of several campaigns."""
+
+    def __init__(self) -> None:
+        self.mturk_clients: Dict[Tuple[str, str], Tuple[Any, HitSweep]] = {}
+        self.azure_transport = None
+
+    def add_to_config(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of @config with the shared clients, passed to the HIT manager and storage.
+
+        The keys are `mturk_client`, `hit_sweep` and `azure_transport`.
+        """
+        key = (config['mturk_endpoint'], config['aws_access_key'])
+        if key not in self.mturk_clients:
+            mturk_client = create_mturk_client(
+                config['mturk_endpoint'], config['aws_access_key'], config['aws_secret_key'],
+                cassette=config.get('cassette'))
+            self.mturk_clients[key] = mturk_client, HitSweep(mturk_client)
+            _LOGGER.info(f"MTurk client of {config['mturk_endpoint']} shared by its campaigns")
+        if self.azure_transport is None:
+            self.azure_transport = create_shared_transport()
+        mturk_client, hit_sweep = self.mturk_clients[key]
+        return dict(config, mturk_client=mturk_client, hit_sweep=hit_sweep,
+                    azure_transport=self.azure_transport)
+
+    def refresh_hit_sweeps(self):
+        """Lists the HITs of each endpoint, once per collection round."""
+        for _, hit_sweep in self.mturk_clients.values():
+            hit_sweep.refresh()
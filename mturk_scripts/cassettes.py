@@ -0,0 +1,371 @@
+"""Recording and replay of the MTurk and Azure calls of a collection run.
+
+A `Cassette` in record mode wraps the clients created by `HITManager` and `AzureGameStorage`,
+and appends every call with its response, or error, and its latency to a gzipped json lines
+file. The file is flushed every `flush_seconds`, so the recording of a run that crashed can
+still be replayed, up to its last flushed calls. In replay mode the clients are never
+created: stand-ins serve the recorded responses, optionally sleeping the recorded latency, so
+a real sweep can be run again offline, e.g. to benchmark changes of `wait_for_assignments`.
+
+Calls are matched by client, method and arguments, in the recorded order. A call with
+arguments never recorded gets the next unused response of the same method, so a run that
+makes fewer or different calls can still be replayed; a method without responses left
+raises `CassetteMissError`.
+
+Responses are stored as json: iterators of results, such as the pages of `query_entities` or
+`list_blobs`, are read to the end when recorded, downloads are stored as bytes, and other
+objects, such as `BlobProperties`, by their attributes. Datetimes are shifted by the time
+elapsed since the recording, so HITs open during the recording are not expired in the replay.
+
+>>> with Cassette('sweep.jsonl.gz', mode='record') as cassette:
+...     hit_manager = HITManager(..., cassette=cassette)
+"""
+import base64
+import collections
+import datetime
+import gzip
+import hashlib
+import importlib
+import json
+import threading
+import time
+import types
+
+from typing import Any, Callable, Dict, List
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+
+class CassetteMissError(LookupError):
+    """The cassette has no recorded response left for a call."""
+
+
+class RecordedEntity(dict):
+    """Replayed table entity, with its recorded metadata."""
+
+    def __init__(self, properties: Dict[str, Any], metadata: Dict[str, Any]) -> None:
+        super().__init__(properties)
+        self.metadata = metadata
+
+
+class RecordedObject(types.SimpleNamespace):
+    """Replayed object, such as `BlobProperties`, with attribute and item access."""
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+
+class RecordedDownload:
+    """Replayed download of a blob."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def readall(self) -> bytes:
+        return self.data
+
+
+def encode(value: Any) -> Any:
+    """Json compatible representation of a response, see `decode`."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        properties = {str(key): encode(item) for key, item in value.items()}
+        if hasattr(value, 'metadata'):
+            return {'$entity': properties, '$metadata': encode(value.metadata)}
+        return properties
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if hasattr(value, 'readall'):
+        return {'$download': base64.b64encode(value.readall()).decode('ascii')}
+    if hasattr(value, 'prefix') and hasattr(value, 'name'):
+        # `BlobPrefix` of `walk_blobs`, also a paged iterator of the blobs in the directory
+        return {'$object': {'name': value.name, 'prefix': value.prefix}}
+    if hasattr(value, '__next__') or hasattr(value, 'by_page'):
+        return {'$iterator': [encode(item) for item in value]}
+    if hasattr(value, '__dict__'):
+        return {'$object': {key: encode(item) for key, item in vars(value).items()
+                            if not key.startswith('_')}}
+    return str(value)
+
+
+def decode(value: Any, time_shift: datetime.timedelta = datetime.timedelta()) -> Any:
+    """Response represented by @value, with its datetimes moved by @time_shift."""
+    if isinstance(value, list):
+        return [decode(item, time_shift) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if '$datetime' in value:
+        return datetime.datetime.fromisoformat(value['$datetime']) + time_shift
+    if '$bytes' in value:
+        return base64.b64decode(value['$bytes'])
+    if '$entity' in value:
+        return RecordedEntity(decode(value['$entity'], time_shift),
+                              decode(value['$metadata'], time_shift))
+    if '$download' in value:
+        return RecordedDownload(base64.b64decode(value['$download']))
+    if '$iterator' in value:
+        return iter(decode(value['$iterator'], time_shift))
+    if '$object' in value:
+        return RecordedObject(**decode(value['$object'], time_shift))
+    return {key: decode(item, time_shift) for key, item in value.items()}
+
+
+def encode_error(error: Exception) -> Dict[str, Any]:
+    return {
+        'type': type(error).__name__,
+        'module': type(error).__module__,
+        'message': str(error),
+        # Only set for botocore errors, which are created from the response
+        'response': encode(getattr(error, 'response', None))
+        if isinstance(getattr(error, 'response', None), dict) else None,
+        'operation_name': getattr(error, 'operation_name', None),
+    }
+
+
+def decode_error(error: Dict[str, Any]) -> Exception:
+    try:
+        error_class = getattr(importlib.import_module(error['module']), error['type'])
+        if error['response'] is not None:
+            return error_class(decode(error['response']), error['operation_name'])
+        return error_class(error['message'])
+    except Exception:
+        return RuntimeError(f"{error['type']}: {error['message']}")
+
+
+def call_key(method: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    arguments = json.dumps([list(args), kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(f'{method}:{arguments}'.encode()).hexdigest()[:16]
+
+
+class RecordingClient:
+    """Wraps @client, recording the calls of its public methods in @cassette."""
+
+    def __init__(self, client, cassette: 'Cassette', service: str) -> None:
+        self._client = client
+        self._cassette = cassette
+        self._service = service
+
+    def __enter__(self):
+        self._client.__enter__()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        return self._client.__exit__(exception_type, exception_value, traceback)
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._client, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+
+        def record_call(*args, **kwargs):
+            return self._cassette.record(self._service, name, attribute, args, kwargs)
+        return record_call
+
+
+class ReplayClient:
+    """Stand-in of a client, serving the responses recorded for @service in @cassette."""
+
+    def __init__(self, cassette: 'Cassette', service: str) -> None:
+        self._cassette = cassette
+        self._service = service
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        return None
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def replay_call(*args, **kwargs):
+            return self._cassette.replay(self._service, name, args, kwargs)
+        return replay_call
+
+
+class Cassette:
+    """Calls to the MTurk and Azure clients, recorded to or replayed from @filepath.
+
+    Args:
+        filepath (str): gzipped json lines file, written as the calls are made in record mode.
+        mode (str): `RECORD` or `REPLAY`.
+        replay_latency (bool): in replay mode, sleep the recorded latency of each call.
+        shift_times (bool): in replay mode, move the datetimes of the responses by the time
+            elapsed since the recording.
+        flush_seconds (float): in record mode, maximum seconds between two flushes of the
+            calls recorded to the file.
+    """
+
+    VERSION = 1
+
+    def __init__(self, filepath: str, mode: str = RECORD, replay_latency: bool = False,
+                 shift_times: bool = True, flush_seconds: float = 1) -> None:
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Invalid cassette mode {mode}")
+        self.filepath = filepath
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        # Interactions loaded to be replayed, the recorded ones are only written to the file
+        self.interactions: List[Dict[str, Any]] = []
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.start_time = time.monotonic()
+        # Record state: the open file, when it was last flushed, and the calls by method
+        self.cassette_file = None
+        self.last_flush_time = self.start_time
+        self.recorded_counts = collections.Counter()
+        # Replay state: unused interactions by call key and by method
+        self.by_key = collections.defaultdict(collections.deque)
+        self.by_method = collections.defaultdict(collections.deque)
+        self.used = set()
+        self.counts = collections.Counter()
+        self.time_shift = datetime.timedelta()
+        if mode == REPLAY:
+            self._load(shift_times)
+        else:
+            self._open()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+        return None
+
+    def client(self, service: str, create_client: Callable[[], Any]):
+        """Client of @service, created with @create_client unless replaying."""
+        if self.replaying:
+            return ReplayClient(self, service)
+        return RecordingClient(create_client(), self, service)
+
+    def record(self, service: str, method: str, function: Callable, args: tuple,
+               kwargs: Dict[str, Any]) -> Any:
+        interaction = {
+            'service': service,
+            'method': method,
+            'key': call_key(method, args, kwargs),
+            'at': round(time.monotonic() - self.start_time, 6),
+        }
+        start_time = time.perf_counter()
+        try:
+            response = encode(function(*args, **kwargs))
+        except Exception as e:
+            interaction['latency'] = round(time.perf_counter() - start_time, 6)
+            interaction['error'] = encode_error(e)
+            self._append(interaction)
+            raise
+        interaction['latency'] = round(time.perf_counter() - start_time, 6)
+        interaction['response'] = response
+        self._append(interaction)
+        # Iterators and downloads were consumed, the caller gets the recorded copy
+        return decode(response)
+
+    def _next_interaction(self, service: str, method: str, key: str) -> Dict[str, Any]:
+        with self.lock:
+            for queue, match in [(self.by_key[(service, key)], 'matched'),
+                                 (self.by_method[(service, method)], 'unmatched')]:
+                while len(queue) > 0:
+                    index = queue.popleft()
+                    if index not in self.used:
+                        self.used.add(index)
+                        self.counts[match] += 1
+                        return self.interactions[index]
+            self.counts['missed'] += 1
+        raise CassetteMissError(f"No recorded response left for {service}.{method}")
+
+    def replay(self, service: str, method: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        interaction = self._next_interaction(service, method, call_key(method, args, kwargs))
+        if self.replay_latency:
+            time.sleep(interaction['latency'])
+        if 'error' in interaction:
+            raise decode_error(interaction['error'])
+        return decode(interaction['response'], self.time_shift)
+
+    def _open(self):
+        header = {'version': self.VERSION, 'started_at': self.started_at.isoformat()}
+        self.cassette_file = gzip.open(self.filepath, 'wt')
+        self.cassette_file.write(json.dumps(header) + '\n')
+        self.cassette_file.flush()
+
+    def _append(self, interaction: Dict[str, Any]):
+        with self.lock:
+            self.recorded_counts[f"{interaction['service']}.{interaction['method']}"] += 1
+            if self.cassette_file is None:
+                # Call made after the cassette was closed, e.g. by a thread still running
+                return
+            self.cassette_file.write(json.dumps(interaction, separators=(',', ':')) + '\n')
+            now = time.monotonic()
+            if now - self.last_flush_time >= self.flush_seconds:
+                self.cassette_file.flush()
+                self.last_flush_time = now
+
+    def _read_lines(self) -> List[str]:
+        """Lines of the cassette file, up to the last complete one if it was interrupted."""
+        lines = []
+        with gzip.open(self.filepath, 'rt') as cassette_file:
+            try:
+                for line in cassette_file:
+                    lines.append(line)
+            except EOFError:
+                _LOGGER.warning(f"Cassette {self.filepath} was not closed, replaying the "
+                                f"calls recorded until it was interrupted")
+        if len(lines) > 0 and not lines[-1].endswith('\n'):
+            lines.pop()
+        return lines
+
+    def _load(self, shift_times: bool):
+        lines = self._read_lines()
+        header = json.loads(lines[0])
+        if header.get('version') != self.VERSION:
+            raise ValueError(f"Unsupported cassette version {header.get('version')}")
+        self.interactions = [json.loads(line) for line in lines[1:]]
+        if shift_times:
+            self.time_shift = self.started_at - datetime.datetime.fromisoformat(
+                header['started_at'])
+        for index, interaction in enumerate(self.interactions):
+            service, method = interaction['service'], interaction['method']
+            self.by_key[(service, interaction['key'])].append(index)
+            self.by_method[(service, method)].append(index)
+        _LOGGER.info(f"{len(self.interactions)} calls loaded from cassette {self.filepath}")
+
+    def close(self):
+        """Closes the recording, or logs how the replayed calls were matched."""
+        if not self.replaying:
+            with self.lock:
+                if self.cassette_file is not None:
+                    self.cassette_file.close()
+                    self.cassette_file = None
+                _LOGGER.info(f"{sum(self.recorded_counts.values())} calls saved to cassette "
+                             f"{self.filepath}")
+            return
+        unused_count = len(self.interactions) - len(self.used)
+        _LOGGER.info(f"Cassette replay: {self.counts['matched']} calls matched, "
+                     f"{self.counts['unmatched']} served out of order, "
+                     f"{self.counts['missed']} missed, {unused_count} recorded calls unused")
+
+    def method_counts(self) -> Dict[str, int]:
+        """Number of recorded calls of each client method."""
+        if not self.replaying:
+            return dict(self.recorded_counts)
+        return dict(collections.Counter(
+            f"{interaction['service']}.{interaction['method']}"
+            for interaction in self.interactions))
@@ -0,0 +1,81 @@
+"""Checkpoint of the state of the collection loop, to resume it quickly after a restart.
+
+The checkpoint holds the hits opened by the script with their expiration, the time of the
+next review of each open hit, and the ids of the last processed assignments. It is saved
+after every sweep, so a restarted collector keeps reviewing the hits created just before
+it stopped, even if MTurk does not list them yet, and does not review again the hits
+reviewed recently.
+"""
+import json
+import os
+
+from typing import Any, Dict, Optional
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+
+class CollectorCheckpoint:
+    """Saves and restores the state of a `HITManager` and its polling event source.
+
+    >>> checkpoint = CollectorCheckpoint('checkpoint.json')
+    >>> checkpoint.restore(hit_manager)
+    >>> while collecting:
+    ...     checkpoint.save(hit_manager)
+    """
+
+    VERSION = 1
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath = filepath
+
+    @staticmethod
+    def capture(hit_manager) -> Dict[str, Any]:
+        return {
+            'version': CollectorCheckpoint.VERSION,
+            'open_hits': {
+                hit_id: hit_manager.session_hit_expirations.get(hit_id)
+                for hit_id in hit_manager.session_open_hits},
+            'next_poll_times': getattr(hit_manager.event_source, 'next_poll_times', {}),
+            'processed_assignment_ids': list(hit_manager.processed_assignment_ids),
+        }
+
+    def save(self, hit_manager):
+        """Writes the checkpoint, replacing the previous file atomically."""
+        temporary_filepath = self.filepath + '.tmp'
+        with open(temporary_filepath, 'w') as checkpoint_file:
+            json.dump(self.capture(hit_manager), checkpoint_file, separators=(',', ':'))
+        os.replace(temporary_filepath, self.filepath)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.filepath):
+            return None
+        with open(self.filepath, 'r') as checkpoint_file:
+            state = json.load(checkpoint_file)
+        if state.get('version') != self.VERSION:
+            _LOGGER.warning(f"Ignoring checkpoint {self.filepath} with version "
+                            f"{state.get('version')}")
+            return None
+        return state
+
+    def restore(self, hit_manager) -> bool:
+        """Restores the saved state into @hit_manager, if the checkpoint exists.
+
+        Returns:
+            bool: whether a checkpoint was restored.
+        """
+        state = self.load()
+        if state is None:
+            return False
+
+        for hit_id, expiration in state['open_hits'].items():
+            hit_manager.session_open_hits.add(hit_id)
+            if expiration is not None:
+                hit_manager.session_hit_expirations[hit_id] = expiration
+        if hasattr(hit_manager.event_source, 'next_poll_times'):
+            hit_manager.event_source.next_poll_times.update(state['next_poll_times'])
+        hit_manager.processed_assignment_ids.extend(state['processed_assignment_ids'])
+        _LOGGER.info(f"Checkpoint restored from {self.filepath} with "
+                     f"{len(state['open_hits'])} session open hits")
+        return True
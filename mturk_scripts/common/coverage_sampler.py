@@ -0,0 +1,122 @@
+"""Weighted sampling of structures that favors the ones with fewer collected turns."""
+import random
+
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class FenwickTree:
+    """Binary indexed tree of non negative weights.
+
+    Supports updating a weight and sampling an index proportionally to its weight in
+    O(log n) time.
+    """
+
+    def __init__(self, weights: Iterable[float]) -> None:
+        weights = list(weights)
+        self.size = len(weights)
+        self.tree = [0.0] * (self.size + 1)
+        # Linear time construction
+        for i, weight in enumerate(weights, start=1):
+            self.tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index: int, delta: float):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index: int) -> float:
+        """Sum of the weights in positions [0, index)."""
+        total = 0.0
+        i = index
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def total(self) -> float:
+        return self.prefix_sum(self.size)
+
+    def find(self, value: float) -> int:
+        """Returns the first index whose cumulative weight is greater than @value."""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step > 0:
+            next_position = position + step
+            if next_position <= self.size and self.tree[next_position] <= value:
+                position = next_position
+                value -= self.tree[next_position]
+            step >>= 1
+        return min(position, self.size - 1)
+
+
+class CoverageSampler:
+    """Samples structure ids with a weight that decreases with their number of turns.
+
+    The weight of a structure with `count` turns is `1 / (1 + count) ** exponent`, so
+    structures without turns are drawn first, and higher exponents make the sampling
+    closer to always picking the least covered structure.
+
+    >>> sampler = CoverageSampler({'c1': 10, 'c2': 0})
+    >>> structure_id = sampler.sample()
+    >>> sampler.increment(structure_id)
+
+    Structures that cannot be drawn for a while, e.g. already drawn in a batch or without
+    starting worlds left, are given no weight with `exclude` until `restore` is called.
+    """
+
+    def __init__(self, counts: Dict[str, int], exponent: float = 2.0,
+                 rng: Optional[random.Random] = None) -> None:
+        self.exponent = exponent
+        self.rng = rng or random.Random()
+        self.structure_ids: List[str] = list(counts.keys())
+        self.indexes = {structure_id: i for i, structure_id in enumerate(self.structure_ids)}
+        self.counts = [counts[structure_id] for structure_id in self.structure_ids]
+        self.tree = FenwickTree(self.weight(count) for count in self.counts)
+        self.excluded: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.structure_ids)
+
+    def __contains__(self, structure_id: str) -> bool:
+        return structure_id in self.indexes
+
+    def weight(self, count: int) -> float:
+        return 1.0 / (1 + count) ** self.exponent
+
+    def count(self, structure_id: str) -> int:
+        return self.counts[self.indexes[structure_id]]
+
+    def increment(self, structure_id: str, turns: int = 1):
+        index = self.indexes[structure_id]
+        old_weight = self.weight(self.counts[index])
+        self.counts[index] += turns
+        if index not in self.excluded:
+            self.tree.add(index, self.weight(self.counts[index]) - old_weight)
+
+    def exclude(self, structure_id: str):
+        """Sets the weight of @structure_id to 0 until `restore` is called."""
+        index = self.indexes[structure_id]
+        if index not in self.excluded:
+            self.excluded.add(index)
+            self.tree.add(index, -self.weight(self.counts[index]))
+
+    def restore(self):
+        """Gives back their weight to the excluded structures, with their current counts."""
+        for index in self.excluded:
+            self.tree.add(index, self.weight(self.counts[index]))
+        self.excluded = set()
+
+    def sample(self) -> Optional[str]:
+        """Draws a structure id proportionally to its weight, or None if there are none."""
+        if len(self.excluded) == len(self.structure_ids):
+            return None
+        value = self.rng.random() * self.tree.total()
+        index = self.tree.find(value)
+        if index in self.excluded:
+            # Only reached with the rounding errors of the weights left by `exclude`
+            return None
+        return self.structure_ids[index]
@@ -11,7 +11,7 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 
 from hit_manager import HITManager  # noqa: E402
-from common import utils, logger  # noqa: E402
+from common import lazy_imports, utils, logger  # noqa: E402
 
 _LOGGER = logger.get_logger(__name__)
 
@@ -27,11 +27,15 @@ def read_args():
     parser.add_argument('--env_filepath', type=str, default='.env',
                         help='Path to .env file with environment variables AWS_ACCESS_KEY_ID. '
                              'and AWS_SECRET_ACCESS_KEY, in case they are not already set.')
+    parser.add_argument('--profile_imports', action='store_true', default=False,
+                        help='Log on exit the time spent importing the SDKs loaded on first use.')
     return parser.parse_args()
 
 
 def main():
     args = read_args()
+    if args.profile_imports:
+        lazy_imports.report_at_exit(_LOGGER.info)
 
     dotenv.load_dotenv(args.env_filepath)
 
@@ -0,0 +1,75 @@
+"""Latency percentiles and throughput of repeated operations."""
+import math
+import threading
+
+from typing import Any, Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of @sorted_values, with @fraction between 0 and 1."""
+    if len(sorted_values) == 0:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyStats:
+    """Latencies and errors of the calls of one operation, safe to update from threads.
+
+    >>> stats = LatencyStats('query_entities')
+    >>> stats.add(0.023)
+    >>> stats.elapsed_seconds = 1.0
+    >>> stats.summary()['p95']
+    0.023
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latencies: List[float] = []
+        self.error_count = 0
+        self.first_error: Optional[str] = None
+        # Wall time of the calls, to compute the throughput
+        self.elapsed_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def add_error(self, error: Exception):
+        with self.lock:
+            self.error_count += 1
+            if self.first_error is None:
+                self.first_error = f'{type(error).__name__}: {error}'
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, errors, mean and percentiles in seconds, and successful calls per second."""
+        latencies = sorted(self.latencies)
+        return {
+            'name': self.name,
+            'count': len(latencies),
+            'errors': self.error_count,
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'ops_per_second':
+                len(latencies) / self.elapsed_seconds if self.elapsed_seconds > 0 else None,
+        }
+
+
+def format_summaries(summaries: List[Dict[str, Any]], label: str = 'operation') -> str:
+    """Table with one `LatencyStats.summary` per line, latencies in milliseconds."""
+    def milliseconds(value):
+        return f'{value * 1000:9.1f}' if value is not None else f'{"-":>9}'
+
+    lines = [f'{label:<36} {"count":>7} {"errors":>6} {"p50 ms":>9} {"p95 ms":>9} '
+             f'{"p99 ms":>9} {"ops/s":>8}']
+    for summary in summaries:
+        ops_per_second = summary['ops_per_second']
+        lines.append(
+            f"{summary['name']:<36} {summary['count']:>7} {summary['errors']:>6} "
+            f"{milliseconds(summary['p50'])} {milliseconds(summary['p95'])} "
+            f"{milliseconds(summary['p99'])} "
+            + (f'{ops_per_second:8.1f}' if ops_per_second is not None else f'{"-":>8}'))
+    return '\n'.join(lines)
@@ -0,0 +1,102 @@
+"""Deferred imports of heavy dependencies.
+
+The boto3 and Azure SDKs take several hundred milliseconds to import, which dominates the
+run time of short scripts that may never use them. Modules and attributes returned by
+`lazy_import` and `lazy_attribute` are only imported on first use, and the time spent
+importing them is recorded to report where the start up time goes.
+
+>>> boto3 = lazy_import('boto3')
+>>> TableClient = lazy_attribute('azure.data.tables', 'TableClient')
+
+Exception classes used in `except` clauses should be accessed through a lazy module, e.g.
+`except azure_exceptions.ResourceExistsError`, as the clause is only evaluated when an
+exception is raised.
+"""
+import atexit
+import importlib
+import sys
+import time
+import types
+
+from typing import Any, Callable, Dict
+
+# Seconds spent importing each deferred module, in order of import
+_IMPORT_SECONDS: Dict[str, float] = {}
+_DEFERRED_MODULES = set()
+
+
+def _import_module(module_name: str) -> types.ModuleType:
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    start_time = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _IMPORT_SECONDS[module_name] = time.perf_counter() - start_time
+    return module
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, module_name: str) -> None:
+        super().__init__(module_name)
+        _DEFERRED_MODULES.add(module_name)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(_import_module(self.__name__), name)
+
+    def __dir__(self):
+        return dir(_import_module(self.__name__))
+
+
+class LazyAttribute:
+    """Proxy of a module attribute, usually a class, imported on first use."""
+
+    def __init__(self, module_name: str, attribute_name: str) -> None:
+        self._module_name = module_name
+        self._attribute_name = attribute_name
+        _DEFERRED_MODULES.add(module_name)
+
+    def resolve(self) -> Any:
+        return getattr(_import_module(self._module_name), self._attribute_name)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<lazy attribute {self._module_name}.{self._attribute_name}>"
+
+
+def lazy_import(module_name: str) -> types.ModuleType:
+    """Returns the module if already imported, otherwise a proxy that imports it when used."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    return LazyModule(module_name)
+
+
+def lazy_attribute(module_name: str, attribute_name: str) -> Any:
+    """Returns the attribute if its module is already imported, otherwise a proxy."""
+    if module_name in sys.modules:
+        return getattr(sys.modules[module_name], attribute_name)
+    return LazyAttribute(module_name, attribute_name)
+
+
+def import_report() -> str:
+    """Describes the deferred imports done so far and the ones that were avoided."""
+    lines = ['Deferred imports:']
+    for module_name, seconds in _IMPORT_SECONDS.items():
+        lines.append(f'  {module_name:<30} {seconds * 1000:8.1f} ms')
+    lines.append(f'  {"total":<30} {sum(_IMPORT_SECONDS.values()) * 1000:8.1f} ms')
+    avoided = sorted(
+        module_name for module_name in _DEFERRED_MODULES
+        if module_name not in _IMPORT_SECONDS and module_name not in sys.modules)
+    lines.append(f'Never imported: {", ".join(avoided) if avoided else "none"}')
+    return '\n'.join(lines)
+
+
+def report_at_exit(log_function: Callable[[str], Any] = print):
+    """Writes the `import_report` with @log_function when the process exits."""
+    atexit.register(lambda: log_function(import_report()))
@@ -1,5 +1,10 @@
+import atexit
+import datetime
+import json
 import logging
+import logging.handlers
 import os
+import queue
 
 
 class CustomFormatter(logging.Formatter):
@@ -29,29 +34,123 @@ class CustomFormatter(logging.Formatter):
         return local_formatter.format(record)
 
 
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a single json line.
+
+    Identifiers of the collection passed with the `extra` argument of the logging calls
+    are added as fields, for example:
+    >>> _LOGGER.info("Assignment saved", extra={'hit_id': hit_id, 'game_id': game_id})
+    """
+
+    EXTRA_FIELDS = ('hit_id', 'game_id', 'assignment_id', 'worker_id')
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in self.EXTRA_FIELDS:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
 LOGLEVEL = os.getenv('LOGLEVEL', 'INFO').upper()
+# Write logs from a background thread instead of the thread that emits them
+LOGQUEUE = os.getenv('LOGQUEUE', 'FALSE').upper() == 'TRUE'
+# One of 'text' or 'json'
+LOGFORMAT = os.getenv('LOGFORMAT', 'text').lower()
+
+_LOG_LISTENER = None
+_LOGGING_CONFIGURED = False
 
 
-def get_stdout_handler():
+def get_stdout_handler(json_format: bool = False) -> logging.Handler:
     formatter = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    stdout_handler = None
-    if os.getenv('LOGCOLOR', 'FALSE').upper() != 'TRUE':
-        logging.basicConfig(format=formatter, level=LOGLEVEL)
-    else:
-        stdout_handler = logging.StreamHandler()
+    stdout_handler = logging.StreamHandler()
+    if json_format:
+        stdout_handler.setFormatter(JsonFormatter())
+    elif os.getenv('LOGCOLOR', 'FALSE').upper() == 'TRUE':
         stdout_handler.setFormatter(CustomFormatter(formatter))
+    else:
+        stdout_handler.setFormatter(logging.Formatter(formatter))
+    return stdout_handler
+
+
+def configure_logging(use_queue: bool = LOGQUEUE, json_format: bool = LOGFORMAT == 'json',
+                      level: str = LOGLEVEL):
+    """Configures the root logger. Only the first call in each process has effect.
+
+    Args:
+        use_queue (bool): if True, records are put in a queue by the calling thread, and
+            written by a `QueueListener` background thread, so logging does not block the
+            collection loop on I/O.
+        json_format (bool): whether to write json lines instead of text.
+        level (str): level of the root logger.
+    """
+    global _LOG_LISTENER, _LOGGING_CONFIGURED
+    if _LOGGING_CONFIGURED:
+        return
+    _LOGGING_CONFIGURED = True
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    stdout_handler = get_stdout_handler(json_format)
+    if not use_queue:
+        root_logger.addHandler(stdout_handler)
+        return
+
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _LOG_LISTENER = logging.handlers.QueueListener(
+        log_queue, stdout_handler, respect_handler_level=True)
+    _LOG_LISTENER.start()
+
+
+def stop_logging():
+    """Writes the records left in the queue, if any, and stops its listener thread.
+
+    Called at exit, and by the processes that exit without running the exit handlers, such
+    as the ones started with `multiprocessing`.
+    """
+    global _LOG_LISTENER
+    if _LOG_LISTENER is not None:
+        _LOG_LISTENER.stop()
+        _LOG_LISTENER = None
+
+
+# Flush the remaining records before the process exits
+atexit.register(stop_logging)
+
+
+def reset_logging():
+    """Removes the handlers of the root logger, so that `configure_logging` has effect again.
+
+    A process forked after the logging was configured inherits the queue handler of its
+    parent, but not the listener thread writing the queue, so it must configure it again.
+    """
+    global _LOG_LISTENER, _LOGGING_CONFIGURED
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    # The listener of the parent process, not running in this one
+    _LOG_LISTENER = None
+    _LOGGING_CONFIGURED = False
 
 
 def get_logger(name: str) -> logging.Logger:
-    stdout_handler = get_stdout_handler()
-    logger = logging.getLogger(name)
-    if stdout_handler is not None:
-        logger.setLevel(LOGLEVEL)
-        logger.addHandler(stdout_handler)
-    return logger
+    configure_logging()
+    return logging.getLogger(name)
 
 
 def set_logger_level(logger_prefix, new_level=logging.WARNING):
-    for logger_name in logging.Logger.manager.loggerDict.keys():
-        if logger_prefix in logger_name:
-            logging.getLogger(logger_name).setLevel(new_level)
+    """Sets the level of the @logger_prefix logger, inherited by all its descendants.
+
+    Loggers of libraries such as azure do not set their own level, so it is enough to set
+    the level of their common parent, even for loggers created after this call.
+    """
+    logging.getLogger(logger_prefix).setLevel(new_level)
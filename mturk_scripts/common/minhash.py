@@ -0,0 +1,184 @@
+"""Near-duplicate detection of texts with MinHash signatures and locality sensitive hashing.
+
+Each text is represented by the set of its character shingles. The MinHash signature of
+the set estimates the Jaccard similarity between texts, and splitting the signature in
+bands allows to retrieve the candidate duplicates of a new text from hash tables, without
+comparing it against every previous text.
+"""
+import os
+import re
+import zlib
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+# Mersenne prime used for the universal hash functions. The shingle hashes are reduced to
+# 31 bits, so products with the coefficients fit in 64 bits.
+_PRIME = (1 << 31) - 1
+
+
+def shingles(text: str, size: int = 4) -> List[str]:
+    """Character shingles of the text, ignoring case, punctuation and repeated spaces."""
+    normalized = ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+    if len(normalized) <= size:
+        return [normalized] if normalized else []
+    return [normalized[i:i + size] for i in range(len(normalized) - size + 1)]
+
+
+class MinHasher:
+    """Computes MinHash signatures with `num_perm` random universal hash functions."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 4, seed: int = 1) -> None:
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        random_state = np.random.RandomState(seed)
+        self.a = random_state.randint(1, _PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self.b = random_state.randint(0, _PRIME, size=(num_perm, 1)).astype(np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Returns the signature of the text, or None if the text has no shingles."""
+        text_shingles = set(shingles(text, self.shingle_size))
+        if len(text_shingles) == 0:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode()) & _PRIME for shingle in text_shingles),
+            dtype=np.uint64, count=len(text_shingles))
+        return ((self.a * hashes + self.b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+class MinHashLSH:
+    """Index of MinHash signatures split in `bands` hash tables.
+
+    Two texts with Jaccard similarity s share at least one band with probability
+    1 - (1 - s ** rows) ** bands, where rows = num_perm / bands.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16) -> None:
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm {num_perm} is not divisible by bands {bands}")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        # Band hash tables contain positions in self.keys and self.signatures
+        self.tables: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self.keys: List[str] = []
+        self.key_positions: Dict[str, int] = {}
+        # Preallocated matrix of signatures, grown by doubling its capacity
+        self.signatures = np.zeros((1024, num_perm), dtype=np.uint32)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.key_positions
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[bytes]:
+        return (band.tobytes() for band in signature.reshape(self.bands, self.rows))
+
+    def insert(self, key: str, signature: np.ndarray):
+        if key in self.key_positions:
+            return
+        position = len(self.keys)
+        if position == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+        self.signatures[position] = signature
+        self.keys.append(key)
+        self.key_positions[key] = position
+        for table, band_key in zip(self.tables, self._band_keys(signature)):
+            table.setdefault(band_key, []).append(position)
+
+    def indexed_signatures(self) -> np.ndarray:
+        return self.signatures[:len(self.keys)]
+
+    def query(self, signature: np.ndarray, threshold: float = 0.8) -> List[Tuple[str, float]]:
+        """Returns the indexed keys with estimated similarity of at least @threshold.
+
+        Returns:
+            List[Tuple[str, float]]: pairs of key and estimated Jaccard similarity, with the
+            most similar first.
+        """
+        candidates = set()
+        for table, band_key in zip(self.tables, self._band_keys(signature)):
+            candidates.update(table.get(band_key, ()))
+        if len(candidates) == 0:
+            return []
+        positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = (self.signatures[positions] == signature).mean(axis=1)
+        order = np.argsort(-similarities, kind='stable')
+        return [
+            (self.keys[positions[i]], float(similarities[i]))
+            for i in order if similarities[i] >= threshold]
+
+
+class InstructionDuplicateIndex:
+    """Persistent index to find near-duplicates among the collected instructions.
+
+    >>> index = InstructionDuplicateIndex('instruction_index.npz')
+    >>> duplicates = index.find_duplicates('place a red block')
+    >>> index.add(hit_id, 'place a red block')
+    >>> index.save()
+
+    Use `InstructionDuplicateIndex.load` to read a previously saved index.
+    """
+
+    def __init__(self, filepath: Optional[str] = None, num_perm: int = 64, bands: int = 16,
+                 threshold: float = 0.8) -> None:
+        self.filepath = filepath
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.lsh = MinHashLSH(num_perm=num_perm, bands=bands)
+
+    def __len__(self) -> int:
+        return len(self.lsh)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.lsh
+
+    def find_duplicates(self, text: Optional[str]) -> List[Tuple[str, float]]:
+        """Returns the keys of indexed texts similar to @text, see `MinHashLSH.query`."""
+        if text is None:
+            return []
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return []
+        return self.lsh.query(signature, self.threshold)
+
+    def add(self, key: str, text: Optional[str]):
+        if text is None or key in self.lsh:
+            return
+        signature = self.hasher.signature(text)
+        if signature is not None:
+            self.lsh.insert(key, signature)
+
+    def add_many(self, keys_and_texts: Iterable[Tuple[str, Optional[str]]]):
+        for key, text in keys_and_texts:
+            self.add(key, text)
+
+    def save(self, filepath: Optional[str] = None):
+        """Writes the signatures to disk, replacing the previous file atomically."""
+        filepath = filepath or self.filepath
+        keys = self.lsh.keys
+        signatures = self.lsh.indexed_signatures()
+        temporary_filepath = filepath + '.tmp'
+        with open(temporary_filepath, 'wb') as index_file:
+            np.savez_compressed(
+                index_file, keys=np.array(keys, dtype=str), signatures=signatures,
+                bands=self.lsh.bands)
+        os.replace(temporary_filepath, filepath)
+        _LOGGER.debug(f"Instruction index with {len(keys)} entries saved to {filepath}")
+
+    @classmethod
+    def load(cls, filepath: str, threshold: float = 0.8) -> 'InstructionDuplicateIndex':
+        with np.load(filepath) as data:
+            signatures = data['signatures']
+            index = cls(filepath, num_perm=signatures.shape[1], bands=int(data['bands']),
+                        threshold=threshold)
+            for key, signature in zip(data['keys'].tolist(), signatures):
+                index.lsh.insert(key, signature)
+        _LOGGER.info(f"Instruction index with {len(index)} entries loaded from {filepath}")
+        return index
@@ -0,0 +1,242 @@
+"""Sampling profiler of a running process, started on demand by a signal or a control file.
+
+While a profile is captured, a thread reads the stack of every other thread of the process
+each `interval_seconds`, for `duration_seconds`. Then it writes two files:
+
+* `<prefix>.folded`, one line per distinct stack with its number of samples, from the thread
+  name to the innermost function, in the format read by flamegraph.pl and speedscope;
+* `<prefix>.txt`, the functions with most samples, with their own samples and the samples of
+  the calls they made.
+
+While inactive, the hook holds no thread: the signal handler is only called when the signal
+is sent, and `ProfilerHook.poll` is a single `os.stat` of the control file. The signal handler
+only sets a flag, and the profile is started by the next `poll`, as the handler runs in the
+main thread, which may be holding the lock of the profiler.
+
+>>> profiler_hook = ProfilerHook('./profiles', control_filepath='./profile.now')
+>>> profiler_hook.install()
+>>> while collecting:
+...     profiler_hook.poll()
+
+Then `kill -USR1 <pid>` or `touch ./profile.now` captures a profile of the next 30 seconds,
+from the next call to `poll`.
+"""
+import collections
+import datetime
+import os
+import signal
+import sys
+import threading
+import time
+
+from typing import Callable, Counter, Dict, List, Optional, Tuple
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+# Function of a frame, as file, first line and name, e.g. ('hit_manager.py', 221, 'f')
+FunctionKey = Tuple[str, int, str]
+
+
+def function_key(frame) -> FunctionKey:
+    code = frame.f_code
+    return os.path.basename(code.co_filename), code.co_firstlineno, code.co_name
+
+
+def format_function(key: FunctionKey) -> str:
+    filename, line, name = key
+    return f'{name} ({filename}:{line})'
+
+
+class SamplingProfiler:
+    """Samples the stacks of all the threads of the process in a background thread.
+
+    Args:
+        output_dirpath (str): directory of the written profiles, created if needed.
+        duration_seconds (float): time the stacks are sampled for each profile.
+        interval_seconds (float): time between two samples.
+        clock (callable): returns the current time in seconds.
+    """
+
+    def __init__(self, output_dirpath: str, duration_seconds: float = 30,
+                 interval_seconds: float = 0.005,
+                 clock: Callable[[], float] = time.perf_counter) -> None:
+        self.output_dirpath = output_dirpath
+        self.duration_seconds = duration_seconds
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, duration_seconds: Optional[float] = None) -> bool:
+        """Starts capturing a profile, unless one is already being captured.
+
+        Returns:
+            bool: whether a new profile was started.
+        """
+        with self.lock:
+            if self.is_running:
+                return False
+            self.thread = threading.Thread(
+                target=self.run, args=(duration_seconds or self.duration_seconds,),
+                name='sampling-profiler', daemon=True)
+            self.thread.start()
+            return True
+
+    def sample(self, stacks: Counter[Tuple], own_thread_id: int):
+        """Adds the current stack of each thread, but the profiler's, to @stacks."""
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(function_key(frame))
+                frame = frame.f_back
+            stacks[(thread_names.get(thread_id, str(thread_id)), *reversed(stack))] += 1
+
+    def capture(self, duration_seconds: float) -> Tuple[Counter[Tuple], int, float]:
+        """Samples the stacks for @duration_seconds.
+
+        Returns:
+            Tuple: the number of samples of each stack, whose first element is the thread
+            name, the number of samples of the process and the seconds elapsed.
+        """
+        stacks = collections.Counter()
+        own_thread_id = threading.get_ident()
+        sample_count = 0
+        started_at = self.clock()
+        while self.clock() - started_at < duration_seconds:
+            self.sample(stacks, own_thread_id)
+            sample_count += 1
+            time.sleep(self.interval_seconds)
+        return stacks, sample_count, self.clock() - started_at
+
+    def run(self, duration_seconds: float):
+        _LOGGER.info(f"Capturing a profile of {duration_seconds} seconds")
+        stacks, sample_count, elapsed_seconds = self.capture(duration_seconds)
+        prefix = os.path.join(self.output_dirpath, 'profile-{}-{}'.format(
+            datetime.datetime.now().strftime('%Y%m%d-%H%M%S'), os.getpid()))
+        os.makedirs(self.output_dirpath, exist_ok=True)
+        write_folded(stacks, prefix + '.folded')
+        with open(prefix + '.txt', 'w') as summary_file:
+            summary_file.write(summarize(stacks, sample_count, elapsed_seconds))
+        _LOGGER.info(f"Profile with {sample_count} samples written to {prefix}.folded "
+                     f"and {prefix}.txt")
+
+
+def write_folded(stacks: Counter[Tuple], filepath: str):
+    """Writes @stacks in the folded format of flamegraph.pl, one `a;b;c <count>` per line."""
+    with open(filepath, 'w') as folded_file:
+        for stack, count in sorted(stacks.items()):
+            frames = [stack[0]] + [format_function(key) for key in stack[1:]]
+            folded_file.write(f"{';'.join(frame.replace(';', ':') for frame in frames)} "
+                              f"{count}\n")
+
+
+def function_samples(stacks: Counter[Tuple]) -> Dict[FunctionKey, List[int]]:
+    """Own and total samples of each function in @stacks.
+
+    The own samples are the ones where the function is the innermost frame, the total ones
+    the samples where the function is anywhere in the stack, counted once.
+    """
+    samples = collections.defaultdict(lambda: [0, 0])
+    for stack, count in stacks.items():
+        functions = stack[1:]
+        if len(functions) == 0:
+            continue
+        samples[functions[-1]][0] += count
+        for key in set(functions):
+            samples[key][1] += count
+    return samples
+
+
+def summarize(stacks: Counter[Tuple], sample_count: int, elapsed_seconds: float,
+              limit: int = 40) -> str:
+    """Table of the @limit functions with most total samples, over all the threads."""
+    thread_samples = collections.Counter()
+    for stack, count in stacks.items():
+        thread_samples[stack[0]] += count
+    lines = [f'{sample_count} samples in {elapsed_seconds:.1f} s, '
+             f'{elapsed_seconds / max(sample_count, 1) * 1000:.1f} ms per sample',
+             'Samples by thread: ' + ', '.join(
+                 f'{name} {count}' for name, count in thread_samples.most_common()),
+             '',
+             f'{"own":>7} {"own %":>6} {"total":>7} {"total %":>7}  function']
+    samples = function_samples(stacks)
+    total_samples = max(sum(thread_samples.values()), 1)
+    ranked = sorted(samples.items(), key=lambda item: (-item[1][1], -item[1][0]))
+    for key, (own, total) in ranked[:limit]:
+        lines.append(f'{own:>7} {own * 100 / total_samples:>6.1f} {total:>7} '
+                     f'{total * 100 / total_samples:>7.1f}  {format_function(key)}')
+    return '\n'.join(lines) + '\n'
+
+
+class ProfilerHook:
+    """Starts a `SamplingProfiler` when the process receives a signal or a control file
+    is touched.
+
+    The control file may contain the duration of the profile in seconds. Its modification
+    time is compared with the previous one in each `poll`, so the same file can trigger the
+    profiles of several processes.
+
+    Args:
+        output_dirpath (str): directory of the written profiles.
+        control_filepath (str): optional path of the control file.
+        signal_number (int): signal that starts a profile, None to not install a handler.
+        duration_seconds (float): default duration of the profiles.
+    """
+
+    def __init__(self, output_dirpath: str, control_filepath: Optional[str] = None,
+                 signal_number: Optional[int] = getattr(signal, 'SIGUSR1', None),
+                 duration_seconds: float = 30) -> None:
+        self.profiler = SamplingProfiler(output_dirpath, duration_seconds=duration_seconds)
+        self.control_filepath = control_filepath
+        self.signal_number = signal_number
+        # Set by the signal handler, and cleared by the poll starting the profile
+        self.signaled = threading.Event()
+        # A control file left from a previous run does not start a profile
+        self.control_mtime = self._control_mtime()
+
+    def install(self):
+        """Installs the signal handler, only possible in the main thread."""
+        if self.signal_number is None:
+            return
+        signal.signal(self.signal_number, lambda signal_number, frame: self.signaled.set())
+        _LOGGER.debug(f"Signal {self.signal_number} captures a profile of process "
+                      f"{os.getpid()}")
+
+    def _control_mtime(self) -> Optional[int]:
+        if self.control_filepath is None:
+            return None
+        try:
+            return os.stat(self.control_filepath).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def poll(self) -> bool:
+        """Starts a profile if the signal was received or the control file was touched since
+        the last call.
+
+        Returns:
+            bool: whether a new profile was started.
+        """
+        if self.signaled.is_set():
+            self.signaled.clear()
+            return self.profiler.start()
+        control_mtime = self._control_mtime()
+        if control_mtime is None or control_mtime == self.control_mtime:
+            return False
+        self.control_mtime = control_mtime
+        duration_seconds = None
+        try:
+            with open(self.control_filepath) as control_file:
+                duration_seconds = float(control_file.read().strip() or 0) or None
+        except (OSError, ValueError):
+            _LOGGER.warning(f"Duration in {self.control_filepath} not valid, using the default")
+        return self.profiler.start(duration_seconds)
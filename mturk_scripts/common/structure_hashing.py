@@ -0,0 +1,146 @@
+"""Canonical hashing of voxel grids, to detect equivalent starting worlds.
+
+Two grids are considered equivalent if one can be obtained from the other by moving it
+horizontally inside the build zone and rotating it around the vertical axis. The height
+of the blocks is kept, as a structure resting on the ground is a different task than the
+same structure floating in the air.
+"""
+import hashlib
+import json
+import random
+
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+
+def _normalized_blocks(coordinates: np.ndarray, block_ids: np.ndarray) -> np.ndarray:
+    """Moves blocks to the origin of the horizontal plane and sorts them.
+
+    Args:
+        coordinates (np.ndarray): array with shape (n, 3) and columns (y, x, z).
+        block_ids (np.ndarray): array with shape (n,).
+
+    Returns:
+        np.ndarray: sorted array with shape (n, 4) and columns (y, x, z, block_id).
+    """
+    coordinates = coordinates.copy()
+    coordinates[:, 1:] -= coordinates[:, 1:].min(axis=0)
+    blocks = np.column_stack([coordinates, block_ids]).astype(np.int16)
+    order = np.lexsort(blocks.T[::-1])
+    return blocks[order]
+
+
+def canonical_blocks(grid: np.ndarray) -> np.ndarray:
+    """Returns the canonical representation of the blocks of a grid.
+
+    The grid is rotated with the 4 yaw rotations, each rotation is translated to the
+    horizontal origin, and the smallest resulting block list is selected.
+
+    Args:
+        grid (np.ndarray): grid of block ids with layout (height, x, z).
+
+    Returns:
+        np.ndarray: array with shape (n, 4) and columns (y, x, z, block_id).
+    """
+    coordinates = np.argwhere(grid != 0)
+    if len(coordinates) == 0:
+        return np.zeros((0, 4), dtype=np.int16)
+    block_ids = grid[tuple(coordinates.T)]
+
+    y, x, z = coordinates.T
+    rotations = [
+        np.column_stack([y, x, z]),
+        np.column_stack([y, z, -x]),
+        np.column_stack([y, -x, -z]),
+        np.column_stack([y, -z, x]),
+    ]
+    candidates = [_normalized_blocks(rotation, block_ids) for rotation in rotations]
+    return min(candidates, key=lambda blocks: blocks.tobytes())
+
+
+def structure_hash(grid: np.ndarray) -> str:
+    """Hash of a grid that is invariant to horizontal translations and yaw rotations."""
+    return hashlib.blake2b(canonical_blocks(grid).tobytes(), digest_size=16).hexdigest()
+
+
+class StructureHashIndex:
+    """Index of starting world blobs by the canonical hash of their structures.
+
+    The index is built offline, see `singleturn/build_structure_index.py`, and saved as
+    a json file from blob name to hash.
+    """
+
+    def __init__(self, blob_hashes: Optional[Dict[str, str]] = None) -> None:
+        self.blob_hashes: Dict[str, str] = {}
+        self.hash_blobs: Dict[str, List[str]] = {}
+        for blob_name, blob_hash in (blob_hashes or {}).items():
+            self.add_hash(blob_name, blob_hash)
+
+    def __len__(self) -> int:
+        return len(self.blob_hashes)
+
+    def __contains__(self, blob_name: str) -> bool:
+        return blob_name in self.blob_hashes
+
+    def add_hash(self, blob_name: str, blob_hash: str):
+        self.blob_hashes[blob_name] = blob_hash
+        self.hash_blobs.setdefault(blob_hash, []).append(blob_name)
+
+    def add_grid(self, blob_name: str, grid: np.ndarray) -> str:
+        blob_hash = structure_hash(grid)
+        self.add_hash(blob_name, blob_hash)
+        return blob_hash
+
+    def hash_of(self, blob_name: str) -> Optional[str]:
+        return self.blob_hashes.get(blob_name)
+
+    def unique_structures_count(self) -> int:
+        return len(self.hash_blobs)
+
+    def sample_unique(self, candidates: Iterable[str], count: int,
+                      exclude_hashes: Optional[Set[str]] = None) -> List[str]:
+        """Selects at most @count random candidates with distinct structures.
+
+        Candidates that are not in the index are considered unique, since their hash is
+        unknown. Each candidate is checked in constant time.
+
+        Args:
+            candidates (Iterable[str]): blob names to select from.
+            count (int): maximum number of blob names to return.
+            exclude_hashes (Optional[Set[str]]): hashes of structures already in use, that
+                should not be selected again.
+
+        Returns:
+            List[str]: the selected blob names, in random order.
+        """
+        candidates = list(candidates)
+        random.shuffle(candidates)
+        seen_hashes = set(exclude_hashes or ())
+        selected = []
+        for blob_name in candidates:
+            blob_hash = self.blob_hashes.get(blob_name)
+            if blob_hash is not None:
+                if blob_hash in seen_hashes:
+                    continue
+                seen_hashes.add(blob_hash)
+            selected.append(blob_name)
+            if len(selected) == count:
+                break
+        return selected
+
+    def save(self, filepath: str):
+        with open(filepath, 'w') as index_file:
+            json.dump(self.blob_hashes, index_file)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'StructureHashIndex':
+        with open(filepath, 'r') as index_file:
+            index = cls(json.load(index_file))
+        _LOGGER.info(f"Structure index with {len(index)} blobs and "
+                     f"{index.unique_structures_count()} unique structures loaded.")
+        return index
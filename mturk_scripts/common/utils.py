@@ -1,10 +1,15 @@
+import contextlib
+import gc
 import json
-import langdetect
 import os
 import re
 
 from typing import Any, Dict, Optional
 
+from common import lazy_imports
+
+langdetect = lazy_imports.lazy_import('langdetect')
+
 
 def read_config(environment: str, config_filepath: Optional[str] = None) -> Dict[str, Any]:
     if config_filepath is None:
@@ -25,3 +30,18 @@ def is_english(input: str) -> bool:
     """
     return (input is not None and bool(re.match('^(?=.*[a-zA-Z])', input)) and
             langdetect.detect(input) == 'en')
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """Pauses the cyclic garbage collector, which slows down creating millions of objects.
+
+    Objects without reference cycles are still freed when they are no longer used.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
@@ -0,0 +1,72 @@
+"""Conversion of the VoxelWorld json files into dense numpy grids.
+
+The starting worlds and the results of each HIT are saved by the VoxelWorld javascript
+as json files, where the blocks of the world are listed under
+`["worldEndingState"]["blocks"]` as `[x, y, z, block_id]` lists. The coordinates are
+relative to the center of the build zone, and are shifted here to be valid indexes of a
+grid with shape `BUILD_ZONE_SIZE`, which is the same layout used by the gridworld
+environment and by `utils/grid_visualization.py`: (height, x, z).
+"""
+import json
+
+from typing import Any, Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+BUILD_ZONE_SIZE = (9, 11, 11)
+# Offset added to (y, x, z) block coordinates to obtain grid indexes.
+BUILD_ZONE_OFFSET = (1, 5, 5)
+
+
+def blocks_to_grid(blocks: Sequence[Sequence[int]]) -> np.ndarray:
+    """Creates a grid of block ids from a list of `[x, y, z, block_id]` blocks.
+
+    Blocks outside the build zone are ignored.
+    """
+    grid = np.zeros(BUILD_ZONE_SIZE, dtype=np.int8)
+    if len(blocks) == 0:
+        return grid
+    blocks_array = np.asarray(blocks, dtype=np.int64)[:, :4]
+    indexes = blocks_array[:, [1, 0, 2]] + np.array(BUILD_ZONE_OFFSET)
+    inside = np.all((indexes >= 0) & (indexes < np.array(BUILD_ZONE_SIZE)), axis=1)
+    indexes = indexes[inside]
+    grid[indexes[:, 0], indexes[:, 1], indexes[:, 2]] = blocks_array[inside, 3]
+    return grid
+
+
+def grid_from_step_data(step_data: Union[str, bytes, Dict[str, Any]]) -> np.ndarray:
+    """Reads the world of a VoxelWorld json file, raw or already parsed, into a grid."""
+    if not isinstance(step_data, dict):
+        step_data = json.loads(step_data)
+    blocks = step_data.get('worldEndingState', {}).get('blocks', [])
+    return blocks_to_grid(blocks)
+
+
+def grid_diff(start_grid: np.ndarray, end_grid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes the blocks added and removed between two grids.
+
+    A block whose color changed is counted both as removed and added.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: boolean masks with the shape of the grids, of the
+        cells with added and removed blocks respectively.
+    """
+    changed = start_grid != end_grid
+    added = changed & (end_grid != 0)
+    removed = changed & (start_grid != 0)
+    return added, removed
+
+
+def diff_sizes(start_grids: np.ndarray, end_grids: np.ndarray) -> np.ndarray:
+    """Number of added plus removed blocks for each pair of a stack of grids.
+
+    Args:
+        start_grids (np.ndarray): array with shape (n,) + BUILD_ZONE_SIZE.
+        end_grids (np.ndarray): array with the same shape as @start_grids.
+
+    Returns:
+        np.ndarray: integer array with shape (n,).
+    """
+    added, removed = grid_diff(start_grids, end_grids)
+    axes = tuple(range(1, added.ndim))
+    return np.count_nonzero(added, axis=axes) + np.count_nonzero(removed, axis=axes)
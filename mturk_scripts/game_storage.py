@@ -1,16 +1,41 @@
 from typing import Dict, List, Optional, Any
-from azure.core.exceptions import ResourceExistsError
-from azure.data.tables import TableServiceClient, TableClient, UpdateMode
-from azure.storage.blob import ContainerClient
-
 
+from hits_table import HitsTable, create_layout
 from turn import Turn
-from common import logger
+from common import lazy_imports, logger
+from common.structure_hashing import StructureHashIndex
+
+# The Azure SDKs are only imported when a storage is used
+azure_exceptions = lazy_imports.lazy_import('azure.core.exceptions')
+TableServiceClient = lazy_imports.lazy_attribute('azure.data.tables', 'TableServiceClient')
+TableClient = lazy_imports.lazy_attribute('azure.data.tables', 'TableClient')
+ContainerClient = lazy_imports.lazy_attribute('azure.storage.blob', 'ContainerClient')
+RequestsTransport = lazy_imports.lazy_attribute(
+    'azure.core.pipeline.transport', 'RequestsTransport')
+requests = lazy_imports.lazy_import('requests')
+HTTPAdapter = lazy_imports.lazy_attribute('requests.adapters', 'HTTPAdapter')
 
 _LOGGER = logger.get_logger(__name__)
 logger.set_logger_level('azure')
 
 
+def create_shared_transport(pool_maxsize: int = 16):
+    """HTTP transport of the Azure clients of several storages, sharing a connection pool.
+
+    The session is not closed when the clients are, only when the process exits.
+
+    Args:
+        pool_maxsize (int): connections kept open to each host, at least the number of
+            concurrent requests, 16 for the listings and downloads of a storage by default.
+            Requests above it open connections that are closed after their response.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return RequestsTransport(session=session, session_owner=False)
+
+
 class AzureGameStorage:
     """Abstraction of data structures to save game data in Azure tables and containers.
 
@@ -21,17 +46,37 @@ class AzureGameStorage:
     Data is saved in two parts:
     * An Azure table contain HIT data.
     * An Azure container saves the initial and target structures, and VoxelWorld data.
+
+    The rows of the hits table are read and written through `self.hits_table`, with the
+    layout @hits_table_layout, see `hits_table.py`. While the rows of a previous table are
+    migrated to the hits table, pass its name as @legacy_hits_table_name to also read the
+    rows not migrated yet.
+
+    If @cassette is set, the calls to the tables and containers are recorded or replayed,
+    see `cassettes.py`. If @azure_transport is set, e.g. with `create_shared_transport`, the
+    clients send their requests through it instead of opening their own connections.
     """
 
     def __init__(self, hits_table_name: str, azure_connection_str: str,
                  starting_structures_container_name: str,
                  starting_structures_blob_prefix: str,
+                 structure_index_filepath: Optional[str] = None,
+                 hits_table_layout: str = 'game',
+                 legacy_hits_table_name: Optional[str] = None,
+                 cassette=None,
+                 azure_transport=None,
                  **kwargs) -> None:
 
         self.azure_connection_str = azure_connection_str
+        # Keyword arguments of all the Azure clients
+        self.client_kwargs = {} if azure_transport is None else {'transport': azure_transport}
 
         self.hits_table_name = hits_table_name
         self.table_client = None
+        self.hits_table_layout = create_layout(hits_table_layout)
+
+        self.legacy_hits_table_name = legacy_hits_table_name
+        self.legacy_table_client = None
 
         self.starting_structures_container_name = starting_structures_container_name
         self.container_client = None
@@ -39,25 +84,55 @@ class AzureGameStorage:
         self.starting_structures_blob_prefix = starting_structures_blob_prefix
         self.blob_service_client = None
 
-    def __enter__(self):
-        with TableServiceClient.from_connection_string(
-                self.azure_connection_str) as table_service_client:
-            _ = table_service_client.create_table_if_not_exists(
-                table_name=self.hits_table_name)
+        self.cassette = cassette
+
+        # Optional index of starting worlds by structure, used to avoid duplicated tasks
+        self.structure_index = None
+        if structure_index_filepath is not None:
+            self.structure_index = StructureHashIndex.load(structure_index_filepath)
+
+    def _create_client(self, service: str, create_client):
+        if self.cassette is None:
+            return create_client()
+        return self.cassette.client(service, create_client)
 
-        self.table_client = TableClient.from_connection_string(
-            conn_str=self.azure_connection_str, table_name=self.hits_table_name)
+    def _create_table_client(self, table_name: str, create_table: bool = False):
+        def create_table_client():
+            if create_table:
+                with TableServiceClient.from_connection_string(
+                        self.azure_connection_str, **self.client_kwargs) as table_service_client:
+                    _ = table_service_client.create_table_if_not_exists(table_name=table_name)
+            return TableClient.from_connection_string(
+                conn_str=self.azure_connection_str, table_name=table_name, **self.client_kwargs)
+        return self._create_client(f'table:{table_name}', create_table_client)
+
+    def __enter__(self):
+        self.table_client = self._create_table_client(self.hits_table_name, create_table=True)
         self.table_client.__enter__()
+        if self.legacy_hits_table_name is not None:
+            self.legacy_table_client = self._create_table_client(self.legacy_hits_table_name)
+            self.legacy_table_client.__enter__()
         _LOGGER.debug(f"Entering {self.__class__.__name__} context anc closing TableClient.")
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
         self.table_client.__exit__(
             exception_type, exception_value, traceback)
+        if self.legacy_table_client is not None:
+            self.legacy_table_client.__exit__(exception_type, exception_value, traceback)
+            self.legacy_table_client = None
         _LOGGER.debug(f"Leaving {self.__class__.__name__} context and closing TableClient.")
         self.table_client = None
         return None
 
+    @property
+    def hits_table(self) -> HitsTable:
+        """Rows of the hits table, and of the legacy table if it is being migrated."""
+        legacy_table = None
+        if self.legacy_table_client is not None:
+            legacy_table = HitsTable(self.legacy_table_client)
+        return HitsTable(self.table_client, self.hits_table_layout, legacy_table=legacy_table)
+
     def select_start_worlds_ids(self, game_count: int = 30) -> List[str]:
         """
         Searches @game_count new games selecting random start target structures.
@@ -78,10 +153,13 @@ class AzureGameStorage:
         """
         raise NotImplementedError
 
-    def create_container_client(self):
-        return ContainerClient.from_connection_string(
-            self.azure_connection_str,
-            self.starting_structures_container_name)
+    def create_container_client(self, container_name: Optional[str] = None):
+        """Creates a client for @container_name, by default the starting structures one."""
+        container_name = container_name or self.starting_structures_container_name
+        return self._create_client(
+            f'blob:{container_name}',
+            lambda: ContainerClient.from_connection_string(
+                self.azure_connection_str, container_name, **self.client_kwargs))
 
     def get_turns_from_open_game(
             self, game_id: str, turn_type: str, starting_world_path: str) -> Turn:
@@ -102,14 +180,9 @@ class AzureGameStorage:
 
     def retrieve_turn_entity(
             self, key: str, column_name: str = 'RowKey') -> Optional[Dict[str, Any]]:
-        query_filter = f"{column_name} eq '{key}'"
         try:
-            entity = self.table_client.query_entities(
-                query_filter=query_filter,
-                results_per_page=1).next()
-            return entity
-
-        except (ResourceExistsError, StopIteration):
+            return next(self.hits_table.rows_where(column_name, key))
+        except (azure_exceptions.ResourceExistsError, StopIteration):
             _LOGGER.warning(f'No turn with {column_name} = {key} found on table')
 
     def save_new_turn(self, turn: Turn):
@@ -120,9 +193,9 @@ class AzureGameStorage:
         entity = turn.to_database_entry(self.starting_structures_container_name)
 
         try:
-            self.table_client.create_entity(entity)
+            self.hits_table.create(entity)
             _LOGGER.debug(f'Successfully inserted new turn {turn.hit_id} for game {turn.game_id}.')
-        except ResourceExistsError:
+        except azure_exceptions.ResourceExistsError:
             _LOGGER.error(f"Turn entry {turn.hit_id} for game {turn.game_id} already exists")
 
     def upsert_turn(self, turn: Turn):
@@ -131,4 +204,4 @@ class AzureGameStorage:
                 f"Attempting to upsert turn without created hit for game {turn.game_id}")
             return
         entity = turn.to_database_entry(self.starting_structures_container_name)
-        self.table_client.upsert_entity(mode=UpdateMode.MERGE, entity=entity)
\ No newline at end of file
+        self.hits_table.upsert(entity)
\ No newline at end of file
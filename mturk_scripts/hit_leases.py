@@ -0,0 +1,251 @@
+"""Leases of shards of the open HITs, to review them with several collector processes.
+
+Each HIT belongs to the shard `crc32(HITId) % shard_count`. A collector only reviews the
+HITs of the shards it holds a lease for. Leases are rows of a table with the owner and the
+expiration time, written with optimistic concurrency so two collectors never hold the same
+shard. Every collector also writes a heartbeat row, and holds at most its fair share of
+the shards among the live collectors. Leases are renewed in each iteration of the
+collection loop; the shards of a collector that dies are taken over by the others once
+its leases expire.
+
+>>> with AzureTableLeaseStore(azure_connection_str, 'HitLeases') as lease_store:
+...     lease_manager = ShardLeaseManager(lease_store, shard_count=8)
+...     lease_manager.refresh()
+...     hit_ids = lease_manager.filter_hit_ids(open_hit_ids)
+"""
+import math
+import os
+import socket
+import threading
+import time
+import zlib
+
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from common import lazy_imports, logger
+
+azure_exceptions = lazy_imports.lazy_import('azure.core.exceptions')
+MatchConditions = lazy_imports.lazy_attribute('azure.core', 'MatchConditions')
+TableClient = lazy_imports.lazy_attribute('azure.data.tables', 'TableClient')
+TableServiceClient = lazy_imports.lazy_attribute('azure.data.tables', 'TableServiceClient')
+UpdateMode = lazy_imports.lazy_attribute('azure.data.tables', 'UpdateMode')
+
+_LOGGER = logger.get_logger(__name__)
+
+
+def shard_of(hit_id: str, shard_count: int) -> int:
+    return zlib.crc32(hit_id.encode()) % shard_count
+
+
+def default_owner_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class Lease:
+    """Row of the lease table. `etag` identifies the version of the row in the store."""
+
+    def __init__(self, key: str, owner: str, expires_at: float,
+                 etag: Optional[str] = None) -> None:
+        self.key = key
+        self.owner = owner
+        self.expires_at = expires_at
+        self.etag = etag
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires_at <= now
+
+
+class InMemoryLeaseStore:
+    """Lease store shared by the threads of a single process, used for testing."""
+
+    def __init__(self) -> None:
+        self.leases: Dict[str, Lease] = {}
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def list_leases(self) -> List[Lease]:
+        with self.lock:
+            return [Lease(lease.key, lease.owner, lease.expires_at, lease.etag)
+                    for lease in self.leases.values()]
+
+    def try_write(self, lease: Lease, previous: Optional[Lease]) -> Optional[Lease]:
+        """Writes @lease if the row was not modified since @previous was read.
+
+        Returns:
+            Optional[Lease]: the written lease with its new etag, or None if the row was
+            modified by another owner.
+        """
+        with self.lock:
+            current = self.leases.get(lease.key)
+            current_etag = current.etag if current is not None else None
+            previous_etag = previous.etag if previous is not None else None
+            if current_etag != previous_etag:
+                return None
+            self.version += 1
+            written = Lease(lease.key, lease.owner, lease.expires_at, str(self.version))
+            self.leases[lease.key] = written
+            return written
+
+
+class AzureTableLeaseStore:
+    """Lease store in an Azure table, shared by collectors in different hosts.
+
+    This class is a context manager, use inside a with statement.
+    """
+
+    PARTITION_KEY = 'lease'
+
+    def __init__(self, azure_connection_str: str, lease_table_name: str) -> None:
+        self.azure_connection_str = azure_connection_str
+        self.lease_table_name = lease_table_name
+        self.table_client = None
+
+    def __enter__(self):
+        with TableServiceClient.from_connection_string(
+                self.azure_connection_str) as table_service_client:
+            _ = table_service_client.create_table_if_not_exists(
+                table_name=self.lease_table_name)
+
+        self.table_client = TableClient.from_connection_string(
+            conn_str=self.azure_connection_str, table_name=self.lease_table_name)
+        self.table_client.__enter__()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.table_client.__exit__(exception_type, exception_value, traceback)
+        self.table_client = None
+        return None
+
+    def list_leases(self) -> List[Lease]:
+        entities = self.table_client.query_entities(
+            query_filter=f"PartitionKey eq '{self.PARTITION_KEY}'")
+        return [
+            Lease(entity['RowKey'], entity['Owner'], entity['ExpiresAt'],
+                  entity.metadata['etag'])
+            for entity in entities]
+
+    def try_write(self, lease: Lease, previous: Optional[Lease]) -> Optional[Lease]:
+        """See `InMemoryLeaseStore.try_write`."""
+        entity = {
+            'PartitionKey': self.PARTITION_KEY,
+            'RowKey': lease.key,
+            'Owner': lease.owner,
+            'ExpiresAt': float(lease.expires_at),
+        }
+        try:
+            if previous is None:
+                metadata = self.table_client.create_entity(entity=entity)
+            else:
+                metadata = self.table_client.update_entity(
+                    entity=entity, mode=UpdateMode.REPLACE, etag=previous.etag,
+                    match_condition=MatchConditions.IfNotModified)
+        except (azure_exceptions.ResourceExistsError, azure_exceptions.ResourceModifiedError,
+                azure_exceptions.ResourceNotFoundError):
+            return None
+        return Lease(lease.key, lease.owner, lease.expires_at, metadata.get('etag'))
+
+
+class ShardLeaseManager:
+    """Acquires and renews the leases of the shards reviewed by one collector.
+
+    Args:
+        lease_store: `InMemoryLeaseStore` or `AzureTableLeaseStore`.
+        shard_count (int): number of shards of the HITs. Must be the same for all the
+            collectors sharing the store.
+        owner_id (str): unique identifier of the collector, by default host and process id.
+        lease_seconds (float): validity of leases and heartbeats. Must be longer than an
+            iteration of the collection loop.
+        clock (Callable[[], float]): current time in seconds.
+    """
+
+    SHARD_PREFIX = 'shard-'
+    OWNER_PREFIX = 'owner-'
+
+    def __init__(self, lease_store, shard_count: int, owner_id: Optional[str] = None,
+                 lease_seconds: float = 300, clock: Callable[[], float] = time.time) -> None:
+        if shard_count < 1:
+            raise ValueError(f"Invalid shard count {shard_count}")
+        self.lease_store = lease_store
+        self.shard_count = shard_count
+        self.owner_id = owner_id or default_owner_id()
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        # Leases held by this owner, from shard to the last written version
+        self.owned_leases: Dict[int, Lease] = {}
+
+    @property
+    def owned_shards(self) -> Set[int]:
+        return set(self.owned_leases.keys())
+
+    def owns(self, hit_id: str) -> bool:
+        return shard_of(hit_id, self.shard_count) in self.owned_leases
+
+    def filter_hit_ids(self, hit_ids: Iterable[str]) -> List[str]:
+        return [hit_id for hit_id in hit_ids if self.owns(hit_id)]
+
+    def _shard_order(self) -> List[int]:
+        # Each owner starts from a different shard, so they do not race for the same ones
+        offset = zlib.crc32(self.owner_id.encode()) % self.shard_count
+        return [(offset + i) % self.shard_count for i in range(self.shard_count)]
+
+    def refresh(self) -> Set[int]:
+        """Renews the heartbeat and the owned leases, and acquires free or expired shards.
+
+        Shards above the fair share of this owner are released, so new collectors get
+        their part of the shards after the next refresh of the existing ones.
+
+        Returns:
+            Set[int]: the shards owned after the refresh.
+        """
+        now = self.clock()
+        expires_at = now + self.lease_seconds
+        rows = {lease.key: lease for lease in self.lease_store.list_leases()}
+
+        heartbeat_key = self.OWNER_PREFIX + self.owner_id
+        self.lease_store.try_write(
+            Lease(heartbeat_key, self.owner_id, expires_at), rows.get(heartbeat_key))
+        live_owners = {
+            lease.owner for key, lease in rows.items()
+            if key.startswith(self.OWNER_PREFIX) and not lease.is_expired(now)}
+        live_owners.add(self.owner_id)
+        fair_share = math.ceil(self.shard_count / len(live_owners))
+
+        previous_shards = self.owned_shards
+        self.owned_leases = {}
+        shard_order = self._shard_order()
+        # Renew the leases still held by this owner first
+        for shard in shard_order:
+            lease = rows.get(self.SHARD_PREFIX + str(shard))
+            if lease is None or lease.owner != self.owner_id:
+                continue
+            if len(self.owned_leases) < fair_share:
+                self._write_shard_lease(shard, expires_at, lease)
+            else:
+                self.lease_store.try_write(
+                    Lease(lease.key, self.owner_id, expires_at=0), lease)
+        for shard in shard_order:
+            if len(self.owned_leases) >= fair_share:
+                break
+            lease = rows.get(self.SHARD_PREFIX + str(shard))
+            if lease is None or (lease.owner != self.owner_id and lease.is_expired(now)):
+                self._write_shard_lease(shard, expires_at, lease)
+
+        if self.owned_shards != previous_shards:
+            _LOGGER.info(f"Collector {self.owner_id} owns shards {sorted(self.owned_shards)} "
+                         f"of {self.shard_count}, with {len(live_owners)} live collectors")
+        return self.owned_shards
+
+    def _write_shard_lease(self, shard: int, expires_at: float, previous: Optional[Lease]):
+        written = self.lease_store.try_write(
+            Lease(self.SHARD_PREFIX + str(shard), self.owner_id, expires_at), previous)
+        if written is not None:
+            self.owned_leases[shard] = written
+
+    def release(self):
+        """Releases the owned leases and the heartbeat, so other owners take over now."""
+        rows = {lease.key: lease for lease in self.lease_store.list_leases()}
+        for key, lease in rows.items():
+            if lease.owner == self.owner_id:
+                self.lease_store.try_write(Lease(key, self.owner_id, expires_at=0), lease)
+        _LOGGER.info(f"Collector {self.owner_id} released shards {sorted(self.owned_shards)}")
+        self.owned_leases = {}
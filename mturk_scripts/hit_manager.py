@@ -1,14 +1,17 @@
 """Function to create HITs with a given layouts.
 """
-import boto3
+import collections
 import datetime
 import json
-import xmltodict
 
 from string import Template
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
-from common import logger
+from assignment_events import PollingEventSource
+from common import lazy_imports, logger
+
+boto3 = lazy_imports.lazy_import('boto3')
+xmltodict = lazy_imports.lazy_import('xmltodict')
 
 _LOGGER = logger.get_logger(__name__)
 
@@ -31,19 +34,97 @@ class TemplateRenderer:
         return template.substitute(**kwargs)
 
 
-class HITManager:
+def create_mturk_client(mturk_endpoint: str, aws_access_key: str, aws_secret_key: str,
+                        cassette=None):
+    """Client of the MTurk API at @mturk_endpoint.
 
-    def __init__(self, mturk_endpoint: str,
-                 aws_access_key: str, aws_secret_key: str, max_hits: int = 99,
-                 verification_function: Optional[Callable[[Dict[str, str]], bool]] = None,
-                 **kwargs) -> None:
-        self.mturk_client = boto3.client(
+    If @cassette is set, a `cassettes.Cassette`, the calls are recorded or replayed.
+    """
+    def create_client():
+        return boto3.client(
             aws_access_key_id=aws_access_key,
             aws_secret_access_key=aws_secret_key,
             service_name='mturk',
             region_name='us-east-1',
             endpoint_url=mturk_endpoint,
         )
+    if cassette is not None:
+        return cassette.client('mturk', create_client)
+    return create_client()
+
+
+def iter_hits(mturk_client, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+    """All the HITs of the requester listed by MTurk, following the pagination."""
+    next_token = None
+    while True:
+        kwargs = {'NextToken': next_token} if next_token else {}
+        response = mturk_client.list_hits(MaxResults=page_size, **kwargs)
+        yield from response['HITs']
+        next_token = response.get('NextToken')
+        if not next_token or len(response['HITs']) == 0:
+            return
+
+
+def hit_type_of(hit: Dict[str, Any]) -> Optional[str]:
+    """Type of @hit saved in its 'RequesterAnnotation' by `HITManager.create_hit`, if any."""
+    try:
+        return json.loads(hit['RequesterAnnotation']).get('hit_type')
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+
+class HitSweep:
+    """Listing of the HITs of the requester shared by the HIT managers of several hit types.
+
+    Each collection round lists all the HITs once with `refresh`, and each `HITManager`
+    created with this sweep reads the HITs of its type from it, instead of listing all the
+    HITs again.
+
+    Args:
+        mturk_client: client of the MTurk API shared by the HIT managers.
+    """
+
+    def __init__(self, mturk_client) -> None:
+        self.mturk_client = mturk_client
+        self.hits: Dict[str, Dict[str, Any]] = {}
+        self.hits_by_type: Dict[Optional[str], List[Dict[str, Any]]] = {}
+
+    def refresh(self):
+        hits = {}
+        hits_by_type = collections.defaultdict(list)
+        for hit in iter_hits(self.mturk_client):
+            hits[hit['HITId']] = hit
+            hits_by_type[hit_type_of(hit)].append(hit)
+        self.hits = hits
+        self.hits_by_type = dict(hits_by_type)
+        _LOGGER.debug(f"{len(hits)} HITs listed of {len(hits_by_type)} types")
+
+    def hits_of_type(self, hit_type: str) -> List[Dict[str, Any]]:
+        return self.hits_by_type.get(hit_type, [])
+
+
+class HITManager:
+    """Creates HITs and reviews their assignments.
+
+    The MTurk client is created from @mturk_endpoint and the AWS keys, unless @mturk_client
+    is given. If @hit_sweep is given, a `HitSweep` refreshed by the caller, the HITs are read
+    from it instead of listed by each call to `get_open_hit_ids`.
+    """
+
+    def __init__(self, mturk_endpoint: str,
+                 aws_access_key: str, aws_secret_key: str, max_hits: int = 99,
+                 verification_function: Optional[Callable[[Dict[str, str]], bool]] = None,
+                 sweep_verification_function: Optional[
+                     Callable[[Dict[str, Dict[str, Any]]], None]] = None,
+                 event_source=None, cassette=None, mturk_client=None,
+                 hit_sweep: Optional[HitSweep] = None,
+                 **kwargs) -> None:
+        # A client given may be shared with the HIT managers of other hit types
+        if mturk_client is None:
+            mturk_client = create_mturk_client(
+                mturk_endpoint, aws_access_key, aws_secret_key, cassette=cassette)
+        self.mturk_client = mturk_client
+        self.hit_sweep = hit_sweep
         self.max_hits = max_hits
         # Save the open hits to know when to stop the collection. More hits may be open
         # from previous runs, and will be completed by this script.
@@ -52,6 +133,20 @@ class HITManager:
             self.verification_function = lambda x: True
         else:
             self.verification_function = verification_function
+        # Optional second verification stage, applied at once to all the assignments found
+        # in the same call to complete_open_assignments, before they are closed.
+        self.sweep_verification_function = sweep_verification_function
+        # Decides which open hits to review in each sweep, and how to wait between sweeps
+        self.event_source = event_source or PollingEventSource()
+        # Types of the hits created by this script, to enable their notifications, and the
+        # ones whose notifications are enabled
+        self.session_hit_type_ids = set()
+        self.notified_hit_type_ids = set()
+        # Expiration timestamps of the session open hits, which are dropped once expired, or
+        # once listed by MTurk, as the listing then tells whether they are open
+        self.session_hit_expirations: Dict[str, float] = {}
+        # Ids of the last assignments closed, never processed twice
+        self.processed_assignment_ids = collections.deque(maxlen=1000)
 
     def create_hit(
             self, rendered_template, hit_type: str = '', hit_lifetime_seconds=3600,
@@ -92,8 +187,12 @@ class HITManager:
             QualificationRequirements=qualifiers
         )
         hit_id = hit['HIT']['HITId']
-        _LOGGER.info(f'HIT created with Id {hit_id}')
+        _LOGGER.info(f'HIT created with Id {hit_id}', extra={'hit_id': hit_id})
         self.session_open_hits.add(hit_id)
+        self.session_hit_expirations[hit_id] = (
+            datetime.datetime.now().timestamp() + hit_lifetime_seconds)
+        if 'HITTypeId' in hit['HIT']:
+            self.session_hit_type_ids.add(hit['HIT']['HITTypeId'])
         return hit_id
 
     def get_open_hit_ids(self, hit_type: str) -> List[Dict[str, Any]]:
@@ -102,25 +201,108 @@ class HITManager:
         Returns:
             List[Dict[str, Any]]: _description_
         """
-        # TODO use pagination string
-        hit_dict = self.mturk_client.list_hits(MaxResults=self.max_hits)['HITs']
+        if self.hit_sweep is not None:
+            hit_dict = self.hit_sweep.hits_of_type(hit_type)
+        else:
+            hit_dict = iter_hits(self.mturk_client, page_size=self.max_hits)
         selected_hits = []
+        listed_hit_ids = set()
         for hit in hit_dict:
-            if 'RequesterAnnotation' in hit:
-                is_correct_type = json.loads(hit['RequesterAnnotation'])['hit_type'] == hit_type
-            else:
-                is_correct_type = False
+            listed_hit_ids.add(hit['HITId'])
+            is_correct_type = hit_type_of(hit) == hit_type
             # Check hit is correct type and reviewable
             if (is_correct_type and hit['HITStatus'] not in ['Disposed'] and
                 hit['HITReviewStatus'] not in ['ReviewedAppropriate', 'ReviewedInappropriate'] and
                     not self.is_hit_expired(hit)):
                 selected_hits.append(hit['HITId'])
         # Add the hits opened by this script that may not have been processed by mturk yet
+        now = datetime.datetime.now().timestamp()
+        for hit_id in list(self.session_open_hits):
+            # Once listed, the listing tells whether the hit is open, even when it is closed
+            # by another collector process
+            if (hit_id in listed_hit_ids or
+                    self.session_hit_expirations.get(hit_id, now + 1) <= now):
+                self.session_open_hits.remove(hit_id)
+                self.session_hit_expirations.pop(hit_id, None)
         selected_hits = list(set(selected_hits).union(self.session_open_hits))
 
         _LOGGER.info(f"{len(selected_hits)} previous open hits of type {hit_type} returned")
         return selected_hits
 
+    def list_all_hits(self) -> Dict[str, Dict[str, Any]]:
+        """All the HITs of the requester listed by MTurk, following the pagination, by id.
+
+        With a `HitSweep`, the HITs of its last refresh.
+        """
+        if self.hit_sweep is not None:
+            return self.hit_sweep.hits
+        return {hit['HITId']: hit for hit in iter_hits(self.mturk_client)}
+
+    def get_expired_unworked_hit_ids(self, hit_ids: Iterable[str]) -> List[str]:
+        """Subset of @hit_ids whose HITs expired without any accepted or submitted assignment.
+
+        The HITs are found in a single listing of all the HITs. Expired HITs without pending
+        assignments are then checked for submitted or reviewed ones. HITs not listed by MTurk
+        are never returned, as their state is unknown.
+        """
+        hits = self.list_all_hits()
+        expired_hit_ids = []
+        for hit_id in hit_ids:
+            hit = hits.get(hit_id)
+            if (hit is None or not self.is_hit_expired(hit) or
+                    hit.get('NumberOfAssignmentsPending', 0) > 0):
+                continue
+            assignments = self.mturk_client.list_assignments_for_hit(
+                HITId=hit_id, AssignmentStatuses=['Submitted', 'Approved', 'Rejected'])
+            if assignments['NumResults'] == 0:
+                expired_hit_ids.append(hit_id)
+        return expired_hit_ids
+
+    def delete_expired_hit(self, hit_id: str) -> bool:
+        """Deletes the expired HIT @hit_id, e.g. once its turn is published in a new HIT.
+
+        Returns:
+            bool: whether the HIT was deleted, MTurk refuses to delete HITs with assignments
+            not reviewed yet.
+        """
+        try:
+            self.mturk_client.delete_hit(HITId=hit_id)
+        except Exception as e:
+            _LOGGER.warning(f"Expired HIT {hit_id} not deleted: {e}", extra={'hit_id': hit_id})
+            return False
+        self.session_open_hits.discard(hit_id)
+        self.session_hit_expirations.pop(hit_id, None)
+        _LOGGER.info(f"Expired HIT {hit_id} deleted.", extra={'hit_id': hit_id})
+        return True
+
+    def enable_notifications(self, hit_type_id: str, sqs_queue_url: str):
+        """Sends `AssignmentSubmitted` events of the hits of @hit_type_id to an SQS queue."""
+        self.mturk_client.update_notification_settings(
+            HITTypeId=hit_type_id,
+            Notification={
+                'Destination': sqs_queue_url,
+                'Transport': 'SQS',
+                'Version': '2014-08-15',
+                'EventTypes': ['AssignmentSubmitted'],
+            },
+            Active=True,
+        )
+        _LOGGER.info(f"Notifications of hit type {hit_type_id} sent to {sqs_queue_url}")
+
+    def enable_new_notifications(self, sqs_queue_url: str):
+        """Enables the notifications of the types of the hits created since the last call."""
+        for hit_type_id in self.session_hit_type_ids - self.notified_hit_type_ids:
+            self.enable_notifications(hit_type_id, sqs_queue_url)
+            self.notified_hit_type_ids.add(hit_type_id)
+
+    def hit_ids_to_review(self, open_hit_ids: List[str]) -> List[str]:
+        """Subset of @open_hit_ids that may have new submitted assignments."""
+        return self.event_source.hit_ids_to_review(open_hit_ids)
+
+    def wait_for_submissions(self, seconds: float):
+        """Waits until new assignments may have been submitted, for at most @seconds."""
+        self.event_source.wait(seconds)
+
     @staticmethod
     def is_hit_expired(hit_dict):
         return datetime.datetime.now().timestamp() >= hit_dict['Expiration'].timestamp()
@@ -139,13 +321,16 @@ class HITManager:
             one is retrieved.
             The values are dictionaries with the results from each assignment. They contain
             the specific keys
+                * `HITId` and `AssignmentId`
                 * `WorkerId`
+                * `AcceptTime` and `SubmitTime`, as datetimes
                 * `Answer` the parsed content of the original mturk client response under keys
                     ["QuestionFormAnswers"]["Answer"]
                 * `IsHitQualified`, the result of applying `self.verification_function`
-                    on the previous field.
+                    on the previous field, and `self.sweep_verification_function` if set.
         """
         results = {}
+        processed_assignments = []
 
         for hit_id in hit_ids:
             # Get a list of the Assignments that have been submitted
@@ -159,13 +344,31 @@ class HITManager:
             assignments = submitted_assignments['Assignments']
             # Retrieve the attributes for each Assignment
             for assignment in assignments:
-                _LOGGER.info(f"Processing {assignment['AssignmentId']} assignment for HIT {hit_id}")
+                if assignment['AssignmentId'] in self.processed_assignment_ids:
+                    continue
+                _LOGGER.info(
+                    f"Processing {assignment['AssignmentId']} assignment for HIT {hit_id}",
+                    extra={'hit_id': hit_id, 'assignment_id': assignment['AssignmentId'],
+                           'worker_id': assignment['WorkerId']})
                 assignment_dict = {}
+                assignment_dict['HITId'] = hit_id
+                assignment_dict['AssignmentId'] = assignment['AssignmentId']
                 assignment_dict['WorkerId'] = assignment['WorkerId']
+                assignment_dict['AcceptTime'] = assignment.get('AcceptTime')
+                assignment_dict['SubmitTime'] = assignment.get('SubmitTime')
                 assignment_dict['Answer'] = self._parse_xml_response(assignment['Answer'])
                 assignment_dict['IsHITQualified'] = self.verification_function(assignment_dict)
                 results[hit_id] = assignment_dict
-                self.close_assignment(assignment['AssignmentId'], hit_id, assignment_dict['IsHITQualified'])
+                processed_assignments.append(assignment_dict)
+
+        if self.sweep_verification_function is not None and len(results) > 0:
+            self.sweep_verification_function(results)
+
+        for assignment_dict in processed_assignments:
+            self.close_assignment(
+                assignment_dict['AssignmentId'], assignment_dict['HITId'],
+                assignment_dict['IsHITQualified'])
+            self.processed_assignment_ids.append(assignment_dict['AssignmentId'])
         return results
 
     @staticmethod
@@ -191,4 +394,6 @@ class HITManager:
         self.mturk_client.delete_hit(HITId=hit_id)
         if hit_id in self.session_open_hits:
             self.session_open_hits.remove(hit_id)
-        _LOGGER.info(f"Assignment {assignment_id} and {hit_id} closed.")
+            self.session_hit_expirations.pop(hit_id, None)
+        _LOGGER.info(f"Assignment {assignment_id} and {hit_id} closed.",
+                     extra={'hit_id': hit_id, 'assignment_id': assignment_id})
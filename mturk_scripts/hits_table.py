@@ -0,0 +1,403 @@
+"""Layouts of the hits table, and reads from two tables while the rows are migrated.
+
+The hits table was created with the game id as PartitionKey and the hit id as RowKey
+(`GameIdLayout`). Every query by hit type or by hit id scans all the partitions, and finding
+the latest game index reads every turn of the type. `HitTypeMonthLayout` uses
+'<hit type>|<YYYY-MM>' as PartitionKey, with the month the turn was created, and keeps the
+game id in column GameId. Rows saved before the month was stored are in the partition
+'<hit type>|0000-00', as they were all created before the other rows:
+
+* the turns of a type are a range of partitions, read with a range scan;
+* the latest game index is in the partitions of the last months;
+* hits of a known type created recently are in one or two partitions.
+
+`HitsTable` reads and writes a table with either layout, and always returns rows with the
+columns of the original layout, so turns are parsed the same way. While the rows are copied
+to a new table with `singleturn/migrate_hits_table.py`, a `HitsTable` of the new table with
+the old one as `legacy_table` also reads the rows not copied yet, and only writes to the new
+table.
+
+>>> hits_table = HitsTable(new_table_client, HitTypeMonthLayout(),
+...                        legacy_table=HitsTable(old_table_client))
+>>> rows = hits_table.rows_by_type('builder-normal', select=['PartitionKey', 'RowKey'])
+"""
+import collections
+import datetime
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from common import lazy_imports, logger
+
+azure_exceptions = lazy_imports.lazy_import('azure.core.exceptions')
+azure_tables = lazy_imports.lazy_import('azure.data.tables')
+UpdateMode = lazy_imports.lazy_attribute('azure.data.tables', 'UpdateMode')
+
+_LOGGER = logger.get_logger(__name__)
+
+# Maximum number of comparisons in a filter of the table service
+MAX_FILTER_COMPARISONS = 15
+# Maximum number of operations in a transaction of the table service
+MAX_TRANSACTION_OPERATIONS = 100
+# Date bucket of the rows saved before column DateBucket, sorted before every month
+LEGACY_DATE_BUCKET = '0000-00'
+
+
+def quote(value: str) -> str:
+    """String literal of @value in a table filter."""
+    return "'{}'".format(value.replace("'", "''"))
+
+
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def date_bucket(timestamp: Optional[datetime.datetime] = None) -> str:
+    """Month of @timestamp, by default the current one, as 'YYYY-MM'."""
+    return (timestamp or utc_now()).strftime('%Y-%m')
+
+
+def previous_date_buckets(count: int,
+                          timestamp: Optional[datetime.datetime] = None) -> List[str]:
+    """The @count months up to the one of @timestamp, latest first."""
+    timestamp = timestamp or utc_now()
+    year, month = timestamp.year, timestamp.month
+    buckets = []
+    for _ in range(count):
+        buckets.append(f'{year:04d}-{month:02d}')
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return buckets
+
+
+def entity_date_bucket(entity: Dict[str, Any]) -> str:
+    """Date bucket saved in @entity, or `LEGACY_DATE_BUCKET` for the rows saved before.
+
+    The timestamp of an entity is the last time it was written, not when it was created,
+    so a turn completed months after it was created would be in a later bucket than newer
+    turns, and hidden from the queries of recent turns.
+    """
+    return entity.get('DateBucket') or LEGACY_DATE_BUCKET
+
+
+def row_key_filters(hit_ids: List[str], chunk_size: int = MAX_FILTER_COMPARISONS) -> List[str]:
+    """Filters of up to @chunk_size hit ids combined with `or`."""
+    return [
+        ' or '.join(f"RowKey eq {quote(hit_id)}" for hit_id in hit_ids[i:i + chunk_size])
+        for i in range(0, len(hit_ids), chunk_size)]
+
+
+class GameIdLayout:
+    """Original layout, with the game id as PartitionKey and the hit id as RowKey."""
+
+    name = 'game'
+    partitioned_by_type = False
+
+    def to_entity(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        return row
+
+    def to_row(self, entity: Dict[str, Any]) -> Dict[str, Any]:
+        return entity
+
+    def select(self, columns: Optional[List[str]]) -> Optional[List[str]]:
+        return columns
+
+    def column(self, name: str) -> str:
+        """Column of this layout with the values of column @name of the original layout."""
+        return name
+
+    def point_key(self, game_id: str) -> Optional[str]:
+        """PartitionKey of the turn of @game_id, if it can be read with a point read."""
+        return game_id
+
+    def type_filter(self, hit_type: str, recent_only: bool = False) -> str:
+        return f"HitType eq {quote(hit_type)}"
+
+    def hit_filters(self, hit_ids: List[str], hit_type: Optional[str] = None) -> List[str]:
+        return row_key_filters(hit_ids)
+
+
+class HitTypeMonthLayout:
+    """Layout partitioned by hit type and month, with the game id in column GameId.
+
+    Args:
+        recent_months (int): months read by the queries of recent turns, including the
+            current one.
+        clock (Callable[[], datetime]): current time, used to set the month of new turns.
+    """
+
+    name = 'hit_type_month'
+    partitioned_by_type = True
+    SEPARATOR = '|'
+    # Character following the separator, the exclusive end of the partitions of a type
+    SEPARATOR_END = '}'
+
+    def __init__(self, recent_months: int = 2,
+                 clock: Callable[[], datetime.datetime] = utc_now) -> None:
+        self.recent_months = recent_months
+        self.clock = clock
+
+    def partition_key(self, hit_type: str, bucket: str) -> str:
+        return f'{hit_type}{self.SEPARATOR}{bucket}'
+
+    def recent_partition_keys(self, hit_type: str) -> List[str]:
+        return [self.partition_key(hit_type, bucket)
+                for bucket in previous_date_buckets(self.recent_months, self.clock())]
+
+    def to_entity(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        entity = dict(row)
+        entity['DateBucket'] = row.get('DateBucket') or date_bucket(self.clock())
+        entity['GameId'] = row['PartitionKey']
+        entity['PartitionKey'] = self.partition_key(row['HitType'], entity['DateBucket'])
+        return entity
+
+    def to_row(self, entity: Dict[str, Any]) -> Dict[str, Any]:
+        row = dict(entity)
+        row['PartitionKey'] = row.pop('GameId', None)
+        return row
+
+    def select(self, columns: Optional[List[str]]) -> Optional[List[str]]:
+        if columns is None:
+            return None
+        return list(dict.fromkeys([*columns, 'GameId', 'DateBucket']))
+
+    def column(self, name: str) -> str:
+        return 'GameId' if name == 'PartitionKey' else name
+
+    def point_key(self, game_id: str) -> Optional[str]:
+        return None
+
+    def type_filter(self, hit_type: str, recent_only: bool = False) -> str:
+        if recent_only:
+            return ' or '.join(f"PartitionKey eq {quote(partition_key)}"
+                               for partition_key in self.recent_partition_keys(hit_type))
+        return (f"PartitionKey ge {quote(hit_type + self.SEPARATOR)} and "
+                f"PartitionKey lt {quote(hit_type + self.SEPARATOR_END)}")
+
+    def hit_filters(self, hit_ids: List[str], hit_type: Optional[str] = None) -> List[str]:
+        if hit_type is None:
+            return row_key_filters(hit_ids)
+        # The partition comparison counts towards the limit of the filter
+        return [
+            f"PartitionKey eq {quote(partition_key)} and ({row_key_filter})"
+            for partition_key in self.recent_partition_keys(hit_type)
+            for row_key_filter in row_key_filters(hit_ids, MAX_FILTER_COMPARISONS - 1)]
+
+
+LAYOUTS = {layout.name: layout for layout in (GameIdLayout, HitTypeMonthLayout)}
+
+
+def create_layout(name: str):
+    if name not in LAYOUTS:
+        raise ValueError(f"Unknown hits table layout {name}, expected one of {list(LAYOUTS)}")
+    return LAYOUTS[name]()
+
+
+class HitsTable:
+    """Reads and writes the rows of a hits table with any layout.
+
+    Rows are dictionaries with the columns of the original layout, where PartitionKey is the
+    game id. Projected columns missing in an entity are not included in its row.
+
+    Args:
+        table_client (TableClient): client of the table.
+        layout: `GameIdLayout`, by default, or `HitTypeMonthLayout`.
+        legacy_table (HitsTable): table with the rows that are not migrated yet. Its rows are
+            read after the ones of this table, skipping the hits already read, and it is
+            never written.
+        max_workers (int): maximum number of concurrent queries.
+    """
+
+    def __init__(self, table_client, layout=None, legacy_table: Optional['HitsTable'] = None,
+                 max_workers: int = 8) -> None:
+        self.table_client = table_client
+        self.layout = layout or GameIdLayout()
+        self.legacy_table = legacy_table
+        self.max_workers = max_workers
+
+    def _to_row(self, entity: Dict[str, Any]) -> Dict[str, Any]:
+        row = {key: value for key, value in entity.items() if value is not None}
+        row['DateBucket'] = entity_date_bucket(row)
+        return self.layout.to_row(row)
+
+    def _select(self, columns: Optional[List[str]]) -> Optional[List[str]]:
+        # Rows of both tables are deduplicated by hit id
+        if columns is not None and 'RowKey' not in columns:
+            columns = [*columns, 'RowKey']
+        return self.layout.select(columns)
+
+    def _query(self, query_filter: str,
+               select: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        entities = self.table_client.query_entities(
+            query_filter=query_filter, select=self._select(select))
+        return (self._to_row(entity) for entity in entities)
+
+    def _with_legacy(self, rows: Iterable[Dict[str, Any]],
+                     legacy_rows: Callable[[], Iterable[Dict[str, Any]]]):
+        if self.legacy_table is None:
+            yield from rows
+            return
+        read_hit_ids = set()
+        for row in rows:
+            read_hit_ids.add(row.get('RowKey'))
+            yield row
+        for row in legacy_rows():
+            if row.get('RowKey') not in read_hit_ids:
+                yield row
+
+    def scan(self, select: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Iterates over all the rows."""
+        entities = self.table_client.list_entities(select=self._select(select))
+        return self._with_legacy(
+            (self._to_row(entity) for entity in entities),
+            lambda: self.legacy_table.scan(select))
+
+    def rows_by_type(self, hit_type: str, select: Optional[List[str]] = None,
+                     extra_filter: Optional[str] = None,
+                     recent_only: bool = False) -> Iterator[Dict[str, Any]]:
+        """Iterates over the rows of @hit_type.
+
+        Args:
+            hit_type (str): value of column HitType.
+            select (List[str]): columns to read, by default all.
+            extra_filter (str): condition on columns other than PartitionKey.
+            recent_only (bool): if the layout is partitioned by type, only read the turns of
+                the last months.
+        """
+        query_filter = self.layout.type_filter(hit_type, recent_only)
+        if extra_filter is not None:
+            query_filter = f"({query_filter}) and {extra_filter}"
+        return self._with_legacy(
+            self._query(query_filter, select),
+            lambda: self.legacy_table.rows_by_type(hit_type, select, extra_filter, recent_only))
+
+    def rows_where(self, column: str, value: Any, extra_filter: Optional[str] = None,
+                   select: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Iterates over the rows whose @column of the original layout equals @value."""
+        literal = quote(value) if isinstance(value, str) else str(value).lower()
+        query_filter = f"{self.layout.column(column)} eq {literal}"
+        if extra_filter is not None:
+            query_filter = f"{query_filter} and {extra_filter}"
+        return self._with_legacy(
+            self._query(query_filter, select),
+            lambda: self.legacy_table.rows_where(column, value, extra_filter, select))
+
+    def _get_row(self, partition_key: str, hit_id: str,
+                 select: Optional[List[str]]) -> List[Dict[str, Any]]:
+        try:
+            return [self._to_row(self.table_client.get_entity(
+                partition_key=partition_key, row_key=hit_id, select=self._select(select)))]
+        except azure_exceptions.ResourceNotFoundError:
+            return []
+
+    def _read_concurrently(self, function: Callable, arguments: List[Any],
+                           rows: Dict[str, Dict[str, Any]]):
+        if len(arguments) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(arguments))) as executor:
+            for results in executor.map(function, arguments):
+                for row in results:
+                    rows.setdefault(row['RowKey'], row)
+
+    def rows_by_hit_ids(self, hit_ids: Iterable[str], hit_type: Optional[str] = None,
+                        game_ids: Optional[Dict[str, str]] = None,
+                        select: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Reads the rows of many hits with few requests, sent concurrently.
+
+        Hits in @game_ids are read with point reads if the layout allows it. The rest are read
+        with queries of up to `MAX_FILTER_COMPARISONS` hit ids combined with `or`. With a
+        layout partitioned by type and a known @hit_type, the hits are searched in the
+        partitions of the last months, then in the legacy table, and only the hits not found
+        yet in all the partitions.
+
+        Args:
+            hit_ids (Iterable[str]): ids of the hits, stored in column RowKey.
+            hit_type (str): type of all the hits, if known.
+            game_ids (Dict[str, str]): optional map from hit id to game id.
+            select (List[str]): columns to read, by default all.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: rows by hit id. Hits without row are missing.
+        """
+        game_ids = game_ids or {}
+        hit_ids = list(dict.fromkeys(hit_ids))
+        rows = {}
+        point_reads = [
+            (self.layout.point_key(game_ids[hit_id]), hit_id) for hit_id in hit_ids
+            if hit_id in game_ids and self.layout.point_key(game_ids[hit_id]) is not None]
+        self._read_concurrently(
+            lambda key: self._get_row(*key, select), point_reads, rows)
+
+        def missing_hit_ids():
+            return [hit_id for hit_id in hit_ids if hit_id not in rows]
+
+        def query_rows(query_filter):
+            return list(self._query(query_filter, select))
+
+        self._read_concurrently(
+            query_rows, self.layout.hit_filters(missing_hit_ids(), hit_type), rows)
+        if self.legacy_table is not None and len(missing_hit_ids()) > 0:
+            rows.update(self.legacy_table.rows_by_hit_ids(
+                missing_hit_ids(), hit_type, game_ids, select))
+        if self.layout.partitioned_by_type and hit_type is not None and \
+                len(missing_hit_ids()) > 0:
+            self._read_concurrently(
+                query_rows, self.layout.hit_filters(missing_hit_ids()), rows)
+        return rows
+
+    def create(self, row: Dict[str, Any]):
+        """Creates the entity of @row, raises `ResourceExistsError` if it exists."""
+        self.table_client.create_entity(entity=self.layout.to_entity(row))
+
+    def upsert(self, row: Dict[str, Any]):
+        """Merges the columns of @row into its entity, creating it if it does not exist."""
+        self.table_client.upsert_entity(mode=UpdateMode.MERGE, entity=self.layout.to_entity(row))
+
+    def replace_rows(self, replacements: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> int:
+        """Replaces rows by new ones, e.g. the rows of turns published again with a new hit id.
+
+        For each pair of rows, the new one is created and the old one deleted. Replacements of
+        the same partition are written in transactions of up to `MAX_TRANSACTION_OPERATIONS`
+        operations, the rest one by one. A transaction that fails, e.g. as one of its rows was
+        written since it was read, is written one by one too. Writing a replacement again is
+        harmless: the new row is replaced, and an old row already deleted is ignored.
+
+        Returns:
+            int: number of rows replaced.
+        """
+        batches = collections.defaultdict(list)
+        replaced_count = 0
+        for old_row, new_row in replacements:
+            old_entity = self.layout.to_entity(old_row)
+            new_entity = self.layout.to_entity(new_row)
+            if old_entity['PartitionKey'] == new_entity['PartitionKey']:
+                batches[new_entity['PartitionKey']].append((old_entity, new_entity))
+            else:
+                replaced_count += self._replace_entity(old_entity, new_entity)
+
+        batch_size = MAX_TRANSACTION_OPERATIONS // 2
+        for pairs in batches.values():
+            for i in range(0, len(pairs), batch_size):
+                batch = pairs[i:i + batch_size]
+                try:
+                    self.table_client.submit_transaction(
+                        [operation for old_entity, new_entity in batch
+                         for operation in (('create', new_entity), ('delete', old_entity))])
+                    replaced_count += len(batch)
+                except azure_tables.TableTransactionError:
+                    replaced_count += sum(self._replace_entity(*pair) for pair in batch)
+        return replaced_count
+
+    def _replace_entity(self, old_entity: Dict[str, Any], new_entity: Dict[str, Any]) -> bool:
+        try:
+            self.table_client.upsert_entity(mode=UpdateMode.REPLACE, entity=new_entity)
+            try:
+                self.table_client.delete_entity(
+                    partition_key=old_entity['PartitionKey'], row_key=old_entity['RowKey'])
+            except azure_exceptions.ResourceNotFoundError:
+                # Deleted by a previous attempt
+                pass
+            return True
+        except azure_exceptions.HttpResponseError as e:
+            _LOGGER.error(f"Error replacing row {old_entity['RowKey']} by "
+                          f"{new_entity['RowKey']}: {e}")
+            return False
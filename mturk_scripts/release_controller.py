@@ -0,0 +1,189 @@
+"""Adaptive release of new HITs, driven by the observed acceptance and expiration rates.
+
+Instead of creating all the HITs at start up, the collection loop asks the controller in
+every sweep how many HITs to release. The controller keeps a target number of open HITs:
+
+* The target is probed upwards while the released HITs are accepted quickly and none
+  expire unworked, and cut by half when the fraction of expired HITs is above
+  `target_expiration_ratio`. Expirations are only observed a HIT lifetime after the
+  release, so,
+* the target is also capped by the number of HITs the workers accept in
+  `headroom` of a HIT lifetime, at the acceptance rate observed. A HIT released when
+  more HITs are open waits longer than that to be accepted, and is likely to expire.
+
+Acceptances are measured with the `AcceptTime` of the assignments reviewed by the
+`HITManager`, so the controller only sees the HITs reviewed by its own process.
+
+>>> controller = ReleaseRateController(release_hits, total_hits=500)
+>>> while collecting:
+...     open_hit_ids += controller.release(len(open_hit_ids))
+...     controller.record_completed(hit_manager.complete_open_assignments(hit_ids))
+"""
+import collections
+import statistics
+import time
+
+from typing import Any, Callable, Dict, List, Optional
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+
+class ReleaseRateController:
+    """Number of HITs to release in each sweep, see the module documentation.
+
+    Args:
+        release_function (callable): creates the given number of HITs, and returns
+            their ids. It may create less of them.
+        total_hits (int): number of HITs to release in total.
+        hit_lifetime_seconds (float): lifetime of the HITs, after which they expire.
+        assignment_duration_seconds (float): time a worker has to submit an accepted
+            HIT, after which an unsubmitted HIT past its lifetime is counted as expired.
+        target_expiration_ratio (float): maximum fraction of the released HITs that
+            expire unworked.
+        initial_open_hits (int): target of open HITs until the first adjustment.
+        min_open_hits (int) and max_open_hits (int): bounds of the target of open HITs.
+        headroom (float): fraction of the HIT lifetime that a new HIT may wait to be
+            accepted, at the observed acceptance rate.
+        window_seconds (float): only the HITs accepted or expired in the last
+            @window_seconds are used for the rates.
+        min_outcomes (int): number of new accepted or expired HITs needed to adjust the
+            target.
+        clock (callable): returns the current timestamp in seconds.
+    """
+
+    def __init__(self, release_function: Callable[[int], List[str]], total_hits: int,
+                 hit_lifetime_seconds: float = 3600,
+                 assignment_duration_seconds: float = 480,
+                 target_expiration_ratio: float = 0.05, initial_open_hits: int = 10,
+                 min_open_hits: int = 1, max_open_hits: int = 99, headroom: float = 0.5,
+                 window_seconds: float = 3 * 3600, min_outcomes: int = 5,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.release_function = release_function
+        self.remaining_hits = total_hits
+        self.hit_lifetime_seconds = hit_lifetime_seconds
+        self.assignment_duration_seconds = assignment_duration_seconds
+        self.target_expiration_ratio = target_expiration_ratio
+        self.min_open_hits = min_open_hits
+        self.max_open_hits = max_open_hits
+        self.headroom = headroom
+        self.window_seconds = window_seconds
+        self.min_outcomes = min_outcomes
+        self.clock = clock
+        self.open_target = min(max(initial_open_hits, min_open_hits), max_open_hits)
+        self.started_at = clock()
+        # Release timestamps of the HITs released and not accepted nor expired yet
+        self.pending_hits: Dict[str, float] = {}
+        # (timestamp, seconds to accept or None if expired, seconds to submit) of each
+        # released HIT with a known outcome, oldest first
+        self.outcomes = collections.deque()
+        self.new_outcome_count = 0
+
+    def release(self, open_hit_count: int) -> List[str]:
+        """Releases new HITs up to the target of open HITs, given @open_hit_count open ones.
+
+        Returns:
+            List[str]: ids of the new HITs, empty if none are released.
+        """
+        now = self.clock()
+        self._expire_pending_hits(now)
+        if self.new_outcome_count >= self.min_outcomes:
+            self._adjust(now)
+        release_count = min(self.remaining_hits, self.target_open_hits(now) - open_hit_count)
+        if release_count <= 0:
+            return []
+        hit_ids = self.release_function(release_count)
+        self.remaining_hits -= len(hit_ids)
+        for hit_id in hit_ids:
+            self.pending_hits[hit_id] = now
+        _LOGGER.info(f"{len(hit_ids)} HITs released, {open_hit_count} already open, "
+                     f"{self.remaining_hits} left to release")
+        return hit_ids
+
+    def record_completed(self, assignments: Dict[str, Dict[str, Any]]):
+        """Records the accepted HITs in @assignments, as returned by
+        `HITManager.complete_open_assignments`."""
+        for hit_id, assignment_dict in assignments.items():
+            released_at = self.pending_hits.pop(hit_id, None)
+            if released_at is None:
+                # Released by another run, or counted as expired already
+                continue
+            now = self.clock()
+            accepted_at = _timestamp(assignment_dict.get('AcceptTime'), now)
+            submitted_at = _timestamp(assignment_dict.get('SubmitTime'), now)
+            self.outcomes.append((now, max(0.0, accepted_at - released_at),
+                                  max(0.0, submitted_at - accepted_at)))
+            self.new_outcome_count += 1
+
+    @property
+    def is_done(self) -> bool:
+        """Whether all the HITs were released."""
+        return self.remaining_hits <= 0
+
+    def _expire_pending_hits(self, now: float):
+        expired_before = now - self.hit_lifetime_seconds - self.assignment_duration_seconds
+        for hit_id, released_at in list(self.pending_hits.items()):
+            if released_at <= expired_before:
+                del self.pending_hits[hit_id]
+                self.outcomes.append((now, None, None))
+                self.new_outcome_count += 1
+        while len(self.outcomes) > 0 and self.outcomes[0][0] < now - self.window_seconds:
+            self.outcomes.popleft()
+
+    def stats(self, now: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Acceptance rate, median times to accept and submit, and expiration ratio of the
+        HITs with an outcome in the window."""
+        now = self.clock() if now is None else now
+        accepted = [outcome for outcome in self.outcomes if outcome[1] is not None]
+        outcome_count = len(self.outcomes)
+        window_seconds = min(self.window_seconds, now - self.started_at)
+        return {
+            'accepted_per_hour':
+                len(accepted) * 3600 / window_seconds if window_seconds > 0 else None,
+            'median_accept_seconds':
+                statistics.median(outcome[1] for outcome in accepted) if accepted else None,
+            'median_submit_seconds':
+                statistics.median(outcome[2] for outcome in accepted) if accepted else None,
+            'expiration_ratio':
+                (outcome_count - len(accepted)) / outcome_count if outcome_count else None,
+        }
+
+    def target_open_hits(self, now: Optional[float] = None) -> int:
+        """Number of open HITs to keep, the target capped by the acceptance rate."""
+        accepted_per_hour = self.stats(now)['accepted_per_hour']
+        target = self.open_target
+        if accepted_per_hour:
+            accepted_in_headroom = (accepted_per_hour / 3600 * self.hit_lifetime_seconds *
+                                    self.headroom)
+            target = min(target, max(int(accepted_in_headroom), self.min_open_hits))
+        return target
+
+    def _adjust(self, now: float):
+        """Updates the target of open HITs with the outcomes since the last adjustment."""
+        stats = self.stats(now)
+        expiration_ratio = stats['expiration_ratio']
+        median_accept_seconds = stats['median_accept_seconds']
+        if expiration_ratio is not None and expiration_ratio > self.target_expiration_ratio:
+            self.open_target = max(self.min_open_hits, self.open_target // 2)
+        elif (median_accept_seconds is not None and
+              median_accept_seconds < self.hit_lifetime_seconds * self.headroom / 2):
+            # Workers take the HITs well before they expire, more of them can be open
+            self.open_target = min(self.max_open_hits,
+                                   self.open_target + max(1, self.open_target // 4))
+        self.new_outcome_count = 0
+        _LOGGER.info(
+            f"Target of {self.open_target} open HITs: "
+            f"{_format(stats['accepted_per_hour'])} accepted per hour, "
+            f"{_format(median_accept_seconds)} s to accept, "
+            f"{_format(stats['median_submit_seconds'])} s to submit, "
+            f"{_format(expiration_ratio)} expired")
+
+
+def _timestamp(value, default: float) -> float:
+    """Timestamp of the datetime @value, or @default if it is not set."""
+    return value.timestamp() if value is not None else default
+
+
+def _format(value: Optional[float]) -> str:
+    return f'{value:.2f}' if value is not None else '-'
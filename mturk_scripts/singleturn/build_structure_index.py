@@ -0,0 +1,86 @@
+"""
+Script to build the index of starting worlds by the canonical hash of their structures.
+
+Every step file in the starting structures container is downloaded and hashed. The
+resulting json file can be passed to `run_data_collection.py` with the argument
+`--structure_index_filepath`, to skip starting worlds that are identical, up to
+translation and rotation, to previously selected ones.
+"""
+import argparse
+import dotenv
+import os
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Project root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from blob_listing import iter_blob_names  # noqa: E402
+from singleturn.singleturn_games_storage import SingleTurnGameStorage  # noqa: E402
+from common import utils, logger, voxels  # noqa: E402
+from common.structure_hashing import StructureHashIndex, structure_hash  # noqa: E402
+
+_LOGGER = logger.get_logger(__name__)
+
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', choices=['production', 'sandbox'], default='sandbox',
+                        help='Environment to use for operations')
+    parser.add_argument('--config_filepath', type=str, default='env_configs.json',
+                        help='Path to json file with environment configuration')
+    parser.add_argument('--env_filepath', type=str, default='.env',
+                        help='Path to .env file with environment variable '
+                             'AZURE_STORAGE_CONNECTION_STRING, in case it is not already set.')
+    parser.add_argument('--output_filepath', type=str, default='structure_index.json',
+                        help='Path of the json file to write. If it exists, only the blobs '
+                             'missing from it are hashed.')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='Number of concurrent blob downloads.')
+    return parser.parse_args()
+
+
+def hash_step_blob(container_client, blob_name):
+    step_data = container_client.download_blob(blob_name).readall()
+    return blob_name, structure_hash(voxels.grid_from_step_data(step_data))
+
+
+def main():
+    args = read_args()
+
+    dotenv.load_dotenv(args.env_filepath)
+
+    config = utils.read_config(args.config, config_filepath=args.config_filepath)
+    config['azure_connection_str'] = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+
+    if os.path.exists(args.output_filepath):
+        index = StructureHashIndex.load(args.output_filepath)
+    else:
+        index = StructureHashIndex()
+
+    game_storage = SingleTurnGameStorage(**config)
+    container_client = game_storage.create_container_client()
+    step_blob_names = [
+        blob_name for blob_name in iter_blob_names(
+            container_client, game_storage.starting_structures_blob_prefix,
+            exclude_suffixes=['.png'], max_workers=args.workers)
+        if blob_name not in index]
+    _LOGGER.info(f"Hashing {len(step_blob_names)} new step files.")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(hash_step_blob, container_client, blob_name)
+                   for blob_name in step_blob_names]
+        for future in futures:
+            try:
+                index.add_hash(*future.result())
+            except Exception as e:
+                _LOGGER.error(f"Error hashing step file: {e}")
+
+    index.save(args.output_filepath)
+    _LOGGER.info(f"Index with {len(index)} step files and {index.unique_structures_count()} "
+                 f"unique structures saved to {args.output_filepath}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,632 @@
+"""
+Script to drive synthetic turns through the stages of the collection, and find the slowest one.
+
+Turn requests arrive at `--arrival_rate` per second, evenly spaced or as a Poisson process,
+and each one goes through the same calls as `run_data_collection.py`:
+
+* allocate: `get_open_turns` for a single turn, i.e. the last game index and the listing of
+  the starting worlds.
+* render: the HIT layout of the turn, by default the one of `create_test_hits.py`, which does
+  not write the results of the HIT to the storage.
+* create_hit: `HITManager.create_hit`.
+* save: `save_new_turn`, the write of the turn to the hits table.
+* review: after a simulated working time, drawn from `--submission_distribution`, the
+  submitted assignment is validated with the instruction rules of `validation_rules` and
+  closed, and the turn is updated in the hits table.
+  A `--abandon_fraction` of the HITs is never submitted.
+
+Each stage has its own queue and workers, so the stage that cannot keep up with the arrivals
+is the one whose queue grows. The service times and throughput of every stage, and the depth
+and waiting times of their queues, are logged at the end.
+
+With `--backend local`, MTurk and the Azure tables and containers are replaced by in-memory
+stand-ins, passed to `HITManager` and `SingleTurnGameStorage` as their cassette, with an
+optional random latency per call. The stand-in tables ignore the query filters, as they only
+hold the turns of the load test. Thousands of turns can be generated this way in seconds.
+
+With `--backend sandbox`, the HITs are created in the MTurk sandbox with hit type
+`test_hit`, and the turns are written to `--hits_table_name`, never to the configured hits
+table. Nobody works on the sandbox HITs, so the review only updates the turns in the table.
+Use `remove_test_hits.py` to delete the HITs afterwards.
+
+    python ./generate_load.py --backend local --turn_count 5000 --arrival_rate 200
+"""
+import argparse
+import collections
+import datetime
+import dotenv
+import heapq
+import itertools
+import math
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import types
+import uuid
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from xml.sax.saxutils import escape
+
+# Project root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from hit_manager import HITManager  # noqa: E402
+from validation_pipeline import ValidationPipeline  # noqa: E402
+from singleturn.builder_template_renderer import BuilderTemplateRenderer  # noqa: E402
+from singleturn.singleturn_games_storage import SingleTurnGameStorage  # noqa: E402
+from singleturn.validation_rules import assignment_rules  # noqa: E402
+from common import lazy_imports, logger, utils  # noqa: E402
+from common.latency_stats import LatencyStats, format_summaries, percentile  # noqa: E402
+
+azure_exceptions = lazy_imports.lazy_import('azure.core.exceptions')
+
+_LOGGER = logger.get_logger(__name__)
+logger.set_logger_level('azure')
+
+TEST_TEMPLATE_FILEPATH = os.path.join(
+    os.path.dirname(__file__), 'tests', 'test_data', 'no_write_builder_normal.xml')
+
+INSTRUCTIONS = [
+    'Place a red block on top of the blue tower.',
+    'Remove the two green blocks on the left side.',
+    'Build a purple column of three blocks next to the yellow one.',
+    'Put an orange block under the bridge.',
+]
+
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['local', 'sandbox'], default='local',
+                        help='In-memory stand-ins of MTurk and Azure, or the MTurk sandbox and '
+                             'a separate Azure table.')
+    parser.add_argument('--config_filepath', type=str, default='env_configs.json',
+                        help='Path to json file with environment configuration')
+    parser.add_argument('--env_filepath', type=str, default='.env',
+                        help='Path to .env file with the Azure and AWS credentials, in case '
+                             'they are not already set.')
+    parser.add_argument('--template_filepath', type=str, default=TEST_TEMPLATE_FILEPATH,
+                        help='Path to the file with the xml/html template to render for each '
+                             'HIT.')
+    parser.add_argument('--turn_count', type=int, default=1000,
+                        help='Number of synthetic turns.')
+    parser.add_argument('--arrival_rate', type=float, default=50,
+                        help='Turn requests per second.')
+    parser.add_argument('--arrival_process', choices=['constant', 'poisson'], default='poisson',
+                        help='Evenly spaced arrivals, or exponential times between them.')
+    parser.add_argument('--submission_distribution',
+                        choices=['constant', 'exponential', 'lognormal'], default='lognormal',
+                        help='Distribution of the time between the creation of a HIT and the '
+                             'submission of its assignment.')
+    parser.add_argument('--submission_mean_seconds', type=float, default=5,
+                        help='Mean time between the creation and submission of a HIT.')
+    parser.add_argument('--abandon_fraction', type=float, default=0.1,
+                        help='Fraction of the HITs that are never submitted.')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Workers of the create_hit and save stages. Turns are allocated '
+                             'and reviewed by a single worker, as in the collector.')
+    parser.add_argument('--hits_table_name', type=str, default='LoadTestHits',
+                        help='Azure table where the turns are written with --backend sandbox.')
+    parser.add_argument('--synthetic_worlds', type=int, default=2000,
+                        help='Starting worlds listed by the local container.')
+    parser.add_argument('--local_mturk_latency_ms', type=float, default=0,
+                        help='Mean latency of the calls to the local MTurk stand-in.')
+    parser.add_argument('--local_azure_latency_ms', type=float, default=0,
+                        help='Mean latency of the calls to the local Azure stand-ins.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the arrivals and submission times.')
+    return parser.parse_args()
+
+
+def arrival_offsets(count: int, rate: float, process: str = 'poisson',
+                    rng: Optional[random.Random] = None) -> Iterable[float]:
+    """Seconds since the start of the run of @count arrivals, @rate per second on average."""
+    rng = rng or random.Random()
+    offset = 0.0
+    for index in range(count):
+        if process == 'constant':
+            yield index / rate
+        else:
+            yield offset
+            offset += rng.expovariate(rate)
+
+
+def create_delay_sampler(distribution: str, mean_seconds: float, abandon_fraction: float = 0.0,
+                         rng: Optional[random.Random] = None) -> Callable[[], Optional[float]]:
+    """Function returning the working time of a HIT, or None if it is never submitted."""
+    rng = rng or random.Random()
+
+    def sample_delay():
+        if rng.random() < abandon_fraction:
+            return None
+        if distribution == 'constant' or mean_seconds <= 0:
+            return max(mean_seconds, 0.0)
+        if distribution == 'exponential':
+            return rng.expovariate(1 / mean_seconds)
+        # Long tail of slow workers, with sigma 1 and the given mean
+        return rng.lognormvariate(math.log(mean_seconds) - 0.5, 1.0)
+    return sample_delay
+
+
+class LocalBackend:
+    """In-memory stand-ins of the MTurk and Azure clients, created as a `cassettes.Cassette`.
+
+    Every call sleeps a random latency, exponentially distributed with the mean of its
+    service. The HITs are only submitted through `submit`.
+    """
+
+    def __init__(self, starting_world_names: List[str], mturk_latency_seconds: float = 0.0,
+                 azure_latency_seconds: float = 0.0, rng: Optional[random.Random] = None) -> None:
+        self.rng = rng or random.Random()
+        self.lock = threading.Lock()
+        self.mturk_latency_seconds = mturk_latency_seconds
+        self.azure_latency_seconds = azure_latency_seconds
+        self.mturk_client = LocalMTurkClient(self)
+        self.tables: Dict[str, LocalTableClient] = {}
+        self.container_client = LocalContainerClient(self, starting_world_names)
+
+    def sleep(self, mean_seconds: float):
+        if mean_seconds > 0:
+            with self.lock:
+                seconds = self.rng.expovariate(1 / mean_seconds)
+            time.sleep(seconds)
+
+    def client(self, service: str, create_client: Callable[[], Any]):
+        """Stand-in of the client of @service, @create_client is never called."""
+        if service == 'mturk':
+            return self.mturk_client
+        if service.startswith('table:'):
+            with self.lock:
+                return self.tables.setdefault(service, LocalTableClient(self))
+        return self.container_client
+
+    def submit(self, hit_id: str, worker_id: str, instruction: str):
+        self.mturk_client.submit(hit_id, worker_id, instruction)
+
+
+class LocalMTurkClient:
+
+    def __init__(self, backend: LocalBackend) -> None:
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.hits: Dict[str, Dict[str, Any]] = {}
+        self.assignments: Dict[str, List[Dict[str, Any]]] = collections.defaultdict(list)
+
+    def create_hit(self, LifetimeInSeconds, RequesterAnnotation, **kwargs):
+        self.backend.sleep(self.backend.mturk_latency_seconds)
+        hit = {
+            'HITId': uuid.uuid4().hex[:30].upper(), 'HITTypeId': 'LOCALHITTYPE',
+            'RequesterAnnotation': RequesterAnnotation, 'HITStatus': 'Assignable',
+            'HITReviewStatus': 'NotReviewed',
+            'Expiration': datetime.datetime.now(datetime.timezone.utc) +
+            datetime.timedelta(seconds=LifetimeInSeconds),
+        }
+        with self.lock:
+            self.hits[hit['HITId']] = hit
+        return {'HIT': hit}
+
+    def list_hits(self, MaxResults, **kwargs):
+        self.backend.sleep(self.backend.mturk_latency_seconds)
+        with self.lock:
+            return {'HITs': list(itertools.islice(self.hits.values(), MaxResults))}
+
+    def submit(self, hit_id: str, worker_id: str, instruction: str):
+        answer = ('<QuestionFormAnswers><Answer><QuestionIdentifier>InputInstructionSingleTurn'
+                  f'</QuestionIdentifier><FreeText>{escape(instruction)}</FreeText></Answer>'
+                  '</QuestionFormAnswers>')
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self.lock:
+            self.assignments[hit_id].append({
+                'AssignmentId': uuid.uuid4().hex[:30].upper(), 'HITId': hit_id,
+                'WorkerId': worker_id, 'AssignmentStatus': 'Submitted', 'AcceptTime': now,
+                'SubmitTime': now, 'Answer': answer})
+
+    def list_assignments_for_hit(self, HITId, AssignmentStatuses, **kwargs):
+        self.backend.sleep(self.backend.mturk_latency_seconds)
+        with self.lock:
+            assignments = [assignment for assignment in self.assignments.get(HITId, [])
+                           if assignment['AssignmentStatus'] in AssignmentStatuses]
+        return {'NumResults': len(assignments), 'Assignments': assignments}
+
+    def approve_assignment(self, AssignmentId, **kwargs):
+        self.backend.sleep(self.backend.mturk_latency_seconds)
+        with self.lock:
+            for assignment in itertools.chain(*self.assignments.values()):
+                if assignment['AssignmentId'] == AssignmentId:
+                    assignment['AssignmentStatus'] = 'Approved'
+        return {}
+
+    def delete_hit(self, HITId):
+        self.backend.sleep(self.backend.mturk_latency_seconds)
+        with self.lock:
+            self.hits.pop(HITId, None)
+            self.assignments.pop(HITId, None)
+        return {}
+
+
+class LocalTableClient:
+
+    def __init__(self, backend: LocalBackend) -> None:
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.entities: Dict[tuple, Dict[str, Any]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        return None
+
+    def create_entity(self, entity):
+        self.backend.sleep(self.backend.azure_latency_seconds)
+        key = (entity['PartitionKey'], entity['RowKey'])
+        with self.lock:
+            if key in self.entities:
+                raise azure_exceptions.ResourceExistsError(f"Entity {key} already exists")
+            self.entities[key] = dict(entity)
+        return {}
+
+    def upsert_entity(self, entity, mode=None):
+        self.backend.sleep(self.backend.azure_latency_seconds)
+        key = (entity['PartitionKey'], entity['RowKey'])
+        with self.lock:
+            self.entities.setdefault(key, {}).update(entity)
+        return {}
+
+    def query_entities(self, query_filter=None, select=None, **kwargs):
+        return self.list_entities(select=select)
+
+    def list_entities(self, select=None, **kwargs):
+        self.backend.sleep(self.backend.azure_latency_seconds)
+        with self.lock:
+            entities = list(self.entities.values())
+        if select is not None:
+            entities = [{column: entity[column] for column in select if column in entity}
+                        for entity in entities]
+        return iter(entities)
+
+
+class LocalContainerClient:
+
+    def __init__(self, backend: LocalBackend, blob_names: List[str]) -> None:
+        self.backend = backend
+        self.blobs = [types.SimpleNamespace(name=name) for name in blob_names]
+
+    def list_blobs(self, name_starts_with='', **kwargs):
+        self.backend.sleep(self.backend.azure_latency_seconds)
+        return (blob for blob in self.blobs if blob.name.startswith(name_starts_with))
+
+
+def synthetic_world_names(blob_prefix: str, count: int) -> List[str]:
+    """Names of @count starting world blobs and their screenshots, as in the container."""
+    names = []
+    for index in range(count):
+        world_prefix = f'{blob_prefix}/{index // 5 + 1}-c{index % 150 + 1}/step-{index % 5 + 2}'
+        names.extend([world_prefix, world_prefix + '_north.png'])
+    return names
+
+
+class Stage:
+    """Workers calling @function on the items of a queue, and passing its results on.
+
+    @function returns the items for the next stage. The time each item waits in the queue
+    and the time @function takes are recorded separately, and the queue depth is sampled by
+    `sample_depth`.
+    """
+
+    def __init__(self, name: str, function: Callable[[Any], Iterable[Any]],
+                 workers: int = 1) -> None:
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.next_stage = None
+        self.service_stats = LatencyStats(name)
+        self.wait_stats = LatencyStats(name)
+        self.depth_samples: List[int] = []
+        self.threads: List[threading.Thread] = []
+
+    def put(self, item: Any):
+        self.queue.put((time.perf_counter(), item))
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'{self.name}-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            queued_at, item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            start_time = time.perf_counter()
+            self.wait_stats.add(start_time - queued_at)
+            try:
+                results = list(self.function(item))
+            except Exception as e:
+                _LOGGER.debug(f"Stage {self.name} failed: {e}")
+                self.service_stats.add_error(e)
+                results = []
+            else:
+                self.service_stats.add(time.perf_counter() - start_time)
+            for result in results:
+                self.next_stage.put(result)
+            self.queue.task_done()
+
+    def sample_depth(self):
+        self.depth_samples.append(self.queue.qsize())
+
+    def join(self):
+        """Waits until the queue is empty, then stops the workers."""
+        self.queue.join()
+        for _ in self.threads:
+            self.queue.put((time.perf_counter(), None))
+        for thread in self.threads:
+            thread.join()
+
+    def queue_summary(self) -> Dict[str, Any]:
+        waits = sorted(self.wait_stats.latencies)
+        mean_service = self.service_stats.summary()['mean']
+        return {
+            'name': self.name,
+            'workers': self.workers,
+            # Items per second the workers can take, to compare with the arrival rate
+            'capacity': self.workers / mean_service if mean_service else None,
+            'max_depth': max(self.depth_samples, default=0),
+            'mean_depth': (sum(self.depth_samples) / len(self.depth_samples)
+                           if self.depth_samples else 0.0),
+            'p95_wait': percentile(waits, 0.95),
+        }
+
+
+class SubmissionScheduler:
+    """Holds each saved turn for its simulated working time, then passes it to the review."""
+
+    def __init__(self, sample_delay: Callable[[], Optional[float]]) -> None:
+        self.name = 'submission'
+        self.sample_delay = sample_delay
+        self.next_stage = None
+        self.pending = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.abandoned_count = 0
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, name='submission', daemon=True)
+
+    def put(self, item: Any):
+        delay = self.sample_delay()
+        with self.condition:
+            if delay is None:
+                self.abandoned_count += 1
+                return
+            heapq.heappush(self.pending, (time.perf_counter() + delay, next(self.counter), item))
+            self.condition.notify()
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        with self.condition:
+            while not (self.stopped and len(self.pending) == 0):
+                if len(self.pending) == 0:
+                    self.condition.wait()
+                    continue
+                due_time = self.pending[0][0]
+                now = time.perf_counter()
+                if due_time > now:
+                    self.condition.wait(due_time - now)
+                    continue
+                _, _, item = heapq.heappop(self.pending)
+                self.next_stage.put(item)
+
+    def join(self):
+        """Waits until every pending turn is submitted."""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+
+class LoadGenerator:
+    """Pipeline of the stages of the collection for synthetic turns, see the module docstring.
+
+    Args:
+        game_storage (SingleTurnGameStorage): storage of the turns, inside its with statement.
+        hit_manager (HITManager): manager that creates and reviews the HITs.
+        renderer (BuilderTemplateRenderer): renderer of the HIT layout.
+        config (dict): environment configuration, with the HIT parameters.
+        sample_delay (callable): working time of each HIT, see `create_delay_sampler`.
+        submit (callable): function called with the hit id, a worker id and an instruction
+            to submit the assignment of a HIT. If None, the review only updates the turn.
+        workers (int): workers of the create_hit and save stages.
+    """
+
+    def __init__(self, game_storage, hit_manager, renderer, config: Dict[str, Any],
+                 sample_delay: Callable[[], Optional[float]],
+                 submit: Optional[Callable[[str, str, str], None]] = None,
+                 workers: int = 4, turn_type: str = 'builder-normal',
+                 hit_type: str = 'test_hit') -> None:
+        self.game_storage = game_storage
+        self.hit_manager = hit_manager
+        self.renderer = renderer
+        self.config = config
+        self.submit = submit
+        self.turn_type = turn_type
+        self.hit_type = hit_type
+        self.submitted = itertools.count()
+
+        self.stages = [
+            Stage('allocate', self.allocate),
+            Stage('render', self.render),
+            Stage('create_hit', self.create_hit, workers=workers),
+            Stage('save', self.save, workers=workers),
+        ]
+        self.scheduler = SubmissionScheduler(sample_delay)
+        self.review_stage = Stage('review', self.review)
+        for stage, next_stage in zip(self.stages, self.stages[1:] + [self.scheduler]):
+            stage.next_stage = next_stage
+        self.scheduler.next_stage = self.review_stage
+        self.elapsed_seconds = 0.0
+
+    def allocate(self, _) -> List[Any]:
+        return self.game_storage.get_open_turns(self.turn_type, 1)
+
+    def render(self, turn) -> List[Any]:
+        return [(turn, self.renderer.render_template_from_turn(
+            self.config.get('azure_sas'), turn))]
+
+    def create_hit(self, turn_and_template) -> List[Any]:
+        turn, template = turn_and_template
+        turn.set_hit_id(self.hit_manager.create_hit(
+            template, hit_type=self.hit_type, **self.config))
+        return [turn]
+
+    def save(self, turn) -> List[Any]:
+        self.game_storage.save_new_turn(turn)
+        return [turn]
+
+    def review(self, turn) -> List[Any]:
+        index = next(self.submitted)
+        worker_id = f'LOADTESTWORKER{index % 50}'
+        instruction = INSTRUCTIONS[index % len(INSTRUCTIONS)]
+        is_qualified = True
+        if self.submit is not None:
+            self.submit(turn.hit_id, worker_id, instruction)
+            assignment = self.hit_manager.complete_open_assignments([turn.hit_id]).get(
+                turn.hit_id)
+            if assignment is None:
+                raise LookupError(f"No submitted assignment found for HIT {turn.hit_id}")
+            worker_id = assignment['WorkerId']
+            # Only parsed by the `InstructionExtractionRule`, not by other verification functions
+            instruction = assignment.get('InputInstruction', instruction)
+            is_qualified = assignment['IsHITQualified']
+
+        turn.update_result_blob_path(
+            container_name=self.config['result_structures_container_name'],
+            blob_subpaths='actionHit')
+        turn.input_instructions = instruction
+        turn.is_qualified = is_qualified
+        turn.worker_id = worker_id
+        self.game_storage.upsert_turn(turn)
+        return []
+
+    def run(self, offsets: Iterable[float], sample_seconds: float = 0.05):
+        """Puts a turn request in the allocation queue at each of the @offsets, in seconds.
+
+        Returns once every turn is reviewed, or abandoned.
+        """
+        stages = self.stages + [self.review_stage]
+        for stage in stages + [self.scheduler]:
+            stage.start()
+        done = threading.Event()
+
+        def sample_depths():
+            while not done.wait(sample_seconds):
+                for stage in stages:
+                    stage.sample_depth()
+        sampler = threading.Thread(target=sample_depths, name='depth-sampler', daemon=True)
+        sampler.start()
+
+        start_time = time.perf_counter()
+        for offset in offsets:
+            delay = start_time + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.stages[0].put(offset)
+        arrivals_seconds = time.perf_counter() - start_time
+        for stage in self.stages + [self.scheduler, self.review_stage]:
+            stage.join()
+        done.set()
+        sampler.join()
+
+        self.elapsed_seconds = time.perf_counter() - start_time
+        for stage in stages:
+            stage.service_stats.elapsed_seconds = self.elapsed_seconds
+        _LOGGER.info(f"Arrivals sent in {arrivals_seconds:.1f} seconds, all stages done in "
+                     f"{self.elapsed_seconds:.1f} seconds")
+
+    def backed_up_stage(self) -> Optional[Stage]:
+        """Stage with the longest waits in its queue, if its queue ever exceeded its workers."""
+        stages = [stage for stage in self.stages + [self.review_stage]
+                  if len(stage.wait_stats.latencies) > 0]
+        if len(stages) == 0:
+            return None
+        stage = max(stages, key=lambda stage: stage.queue_summary()['p95_wait'])
+        if stage.queue_summary()['max_depth'] <= stage.workers:
+            return None
+        return stage
+
+    def report(self) -> str:
+        stages = self.stages + [self.review_stage]
+        lines = [format_summaries([stage.service_stats.summary() for stage in stages],
+                                  label='stage'), '']
+        lines.append(f'{"queue":<36} {"workers":>7} {"max":>6} {"mean":>9} {"p95 wait ms":>12} '
+                     f'{"capacity/s":>10}')
+        for stage in stages:
+            summary = stage.queue_summary()
+            p95_wait, capacity = summary['p95_wait'], summary['capacity']
+            lines.append(
+                f"{summary['name']:<36} {summary['workers']:>7} {summary['max_depth']:>6} "
+                f"{summary['mean_depth']:>9.1f} "
+                + (f'{p95_wait * 1000:12.1f}' if p95_wait is not None else f'{"-":>12}')
+                + (f' {capacity:10.1f}' if capacity is not None else f' {"-":>10}'))
+        lines.append('')
+        lines.append(f'{self.scheduler.abandoned_count} HITs abandoned')
+        backed_up_stage = self.backed_up_stage()
+        if backed_up_stage is None:
+            lines.append('No queue backed up')
+        else:
+            lines.append(f'Queue backs up before {backed_up_stage.name}')
+        return '\n'.join(lines)
+
+
+def main():
+    args = read_args()
+
+    dotenv.load_dotenv(args.env_filepath)
+
+    config = utils.read_config('sandbox', config_filepath=args.config_filepath)
+    # Create hits without qualifiers, as in create_test_hits.py
+    config.pop('qualification_type_id', None)
+    config['hits_table_name'] = args.hits_table_name
+    config['hit_lifetime_seconds'] = 3600
+
+    rng = random.Random(args.seed)
+    submit = None
+    if args.backend == 'local':
+        backend = LocalBackend(
+            synthetic_world_names(config['starting_structures_blob_prefix'],
+                                  args.synthetic_worlds),
+            mturk_latency_seconds=args.local_mturk_latency_ms / 1000,
+            azure_latency_seconds=args.local_azure_latency_ms / 1000, rng=rng)
+        config['cassette'] = backend
+        config['azure_connection_str'] = 'local'
+        config['azure_sas'] = 'local'
+        config['aws_access_key'] = config['aws_secret_key'] = 'local'
+        submit = backend.submit
+    else:
+        config['azure_connection_str'] = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+        config['azure_sas'] = os.getenv('AZURE_STORAGE_SAS')
+        config['aws_access_key'] = os.getenv("AWS_ACCESS_KEY_ID_LIT")
+        config['aws_secret_key'] = os.getenv("AWS_SECRET_ACCESS_KEY_LIT")
+
+    with SingleTurnGameStorage(**config) as game_storage:
+        pipeline = ValidationPipeline(assignment_rules())
+        load_generator = LoadGenerator(
+            game_storage, HITManager(verification_function=pipeline.validate, **config),
+            BuilderTemplateRenderer(args.template_filepath),
+            config, create_delay_sampler(args.submission_distribution,
+                                         args.submission_mean_seconds, args.abandon_fraction,
+                                         rng=rng),
+            submit=submit, workers=args.workers)
+        load_generator.run(arrival_offsets(
+            args.turn_count, args.arrival_rate, args.arrival_process, rng=rng))
+    _LOGGER.info(f"Latency and queueing by stage:\n{load_generator.report()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Script to copy the rows of the hits table to a new table with a different layout.
+
+The rows of the source table, partitioned by game id, are written to the target table
+partitioned by hit type and month, see `hits_table.py`. The month of each row is its
+DateBucket column. Rows saved before that column existed are copied to the partition of
+`LEGACY_DATE_BUCKET`, as their creation month is not known. Rows are created in transactions
+of up to `--batch_size` rows of the same partition, and rows already in the target table are
+skipped, so the script can be stopped and run again until every row is copied.
+
+The migration is online: while it runs, collectors started with
+`--hits_table_name <target> --hits_table_layout hit_type_month
+--legacy_hits_table_name <source>` read from both tables and only write to the target one.
+Once `--verify` reports no missing rows, collectors can stop reading the source table.
+
+    python ./migrate_hits_table.py --config sandbox --target_table_name HitsByTypeMonth
+"""
+import argparse
+import collections
+import dotenv
+import os
+import sys
+
+from typing import Dict, Iterable, List
+
+# Project root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from hits_table import (  # noqa: E402
+    MAX_TRANSACTION_OPERATIONS, create_layout, entity_date_bucket)
+from common import lazy_imports, logger, utils  # noqa: E402
+
+azure_exceptions = lazy_imports.lazy_import('azure.core.exceptions')
+azure_tables = lazy_imports.lazy_import('azure.data.tables')
+
+_LOGGER = logger.get_logger(__name__)
+
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', choices=['production', 'sandbox'], default='sandbox',
+                        help='Environment to use for operations')
+    parser.add_argument('--config_filepath', type=str, default='env_configs.json',
+                        help='Path to json file with environment configuration')
+    parser.add_argument('--env_filepath', type=str, default='.env',
+                        help='Path to .env file with environment variable '
+                             'AZURE_STORAGE_CONNECTION_STRING, in case it is not already set.')
+    parser.add_argument('--source_table_name', type=str, default=None,
+                        help='Table to copy, by default the hits table of the configuration.')
+    parser.add_argument('--target_table_name', type=str, required=True,
+                        help='Table to write, created if it does not exist.')
+    parser.add_argument('--target_layout', choices=['game', 'hit_type_month'],
+                        default='hit_type_month', help='Layout of the target table.')
+    parser.add_argument('--batch_size', type=int, default=MAX_TRANSACTION_OPERATIONS,
+                        help=f'Rows per transaction, at most {MAX_TRANSACTION_OPERATIONS}.')
+    parser.add_argument('--dry_run', action='store_true', default=False,
+                        help='Count the rows to copy without writing them.')
+    parser.add_argument('--verify', action='store_true', default=False,
+                        help='Only report the rows of the source table missing in the target.')
+    args = parser.parse_args()
+    if not 0 < args.batch_size <= MAX_TRANSACTION_OPERATIONS:
+        parser.error(f'--batch_size must be between 1 and {MAX_TRANSACTION_OPERATIONS}')
+    return args
+
+
+def write_batch(table_client, entities: List[Dict], counts: collections.Counter):
+    """Creates @entities, of the same partition, in a single transaction if possible."""
+    try:
+        table_client.submit_transaction([('create', entity) for entity in entities])
+        counts['copied'] += len(entities)
+        return
+    except azure_tables.TableTransactionError:
+        # Some rows were created since the target table was listed, e.g. by a collector
+        pass
+    for entity in entities:
+        try:
+            table_client.create_entity(entity=entity)
+            counts['copied'] += 1
+        except azure_exceptions.ResourceExistsError:
+            counts['skipped'] += 1
+        except azure_exceptions.HttpResponseError as e:
+            _LOGGER.error(f"Error copying row {entity['RowKey']}: {e}")
+            counts['failed'] += 1
+
+
+def migrate_rows(source_entities: Iterable[Dict], target_table_client, layout,
+                 batch_size: int = MAX_TRANSACTION_OPERATIONS,
+                 dry_run: bool = False) -> collections.Counter:
+    """Copies the rows of @source_entities missing in the target table, with @layout.
+
+    Args:
+        source_entities (Iterable[Dict]): entities of a table with `GameIdLayout`.
+        target_table_client (TableClient): client of the table to write.
+        layout: layout of the target table.
+        batch_size (int): maximum number of rows per transaction.
+        dry_run (bool): count the rows to copy without writing them.
+
+    Returns:
+        collections.Counter: number of rows 'copied', 'skipped' as they already existed, and
+        'failed'.
+    """
+    counts = collections.Counter()
+    migrated_hit_ids = {
+        entity['RowKey'] for entity in target_table_client.list_entities(select=['RowKey'])}
+    _LOGGER.info(f"{len(migrated_hit_ids)} rows already in the target table.")
+
+    # Pending rows by target partition, as transactions cannot span partitions
+    batches = collections.defaultdict(list)
+    for entity in source_entities:
+        if entity['RowKey'] in migrated_hit_ids:
+            counts['skipped'] += 1
+            continue
+        if entity.get('HitType') is None:
+            _LOGGER.error(f"Row {entity['RowKey']} without HitType not copied")
+            counts['failed'] += 1
+            continue
+        row = dict(entity, DateBucket=entity_date_bucket(entity))
+        target_entity = layout.to_entity(row)
+        batch = batches[target_entity['PartitionKey']]
+        batch.append(target_entity)
+        if len(batch) >= batch_size:
+            if dry_run:
+                counts['copied'] += len(batch)
+            else:
+                write_batch(target_table_client, batch, counts)
+            del batches[target_entity['PartitionKey']]
+            if counts['copied'] % 10000 < batch_size:
+                _LOGGER.info(f"{counts['copied']} rows copied.")
+
+    for batch in batches.values():
+        if dry_run:
+            counts['copied'] += len(batch)
+        else:
+            write_batch(target_table_client, batch, counts)
+    return counts
+
+
+def missing_hit_ids(source_table_client, target_table_client) -> List[str]:
+    """Hit ids of the rows of the source table that are not in the target table."""
+    target_hit_ids = {
+        entity['RowKey'] for entity in target_table_client.list_entities(select=['RowKey'])}
+    return [entity['RowKey']
+            for entity in source_table_client.list_entities(select=['RowKey'])
+            if entity['RowKey'] not in target_hit_ids]
+
+
+def main():
+    args = read_args()
+
+    dotenv.load_dotenv(args.env_filepath)
+
+    config = utils.read_config(args.config, config_filepath=args.config_filepath)
+    connection_str = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+    source_table_name = args.source_table_name or config['hits_table_name']
+
+    with azure_tables.TableServiceClient.from_connection_string(
+            connection_str) as table_service_client:
+        table_service_client.create_table_if_not_exists(table_name=args.target_table_name)
+
+    with azure_tables.TableClient.from_connection_string(
+            conn_str=connection_str, table_name=source_table_name) as source_table_client, \
+            azure_tables.TableClient.from_connection_string(
+                conn_str=connection_str,
+                table_name=args.target_table_name) as target_table_client:
+        if args.verify:
+            hit_ids = missing_hit_ids(source_table_client, target_table_client)
+            _LOGGER.info(f"{len(hit_ids)} rows of {source_table_name} missing in "
+                         f"{args.target_table_name}: {hit_ids[:20]}")
+            return
+
+        counts = migrate_rows(
+            source_table_client.list_entities(), target_table_client,
+            create_layout(args.target_layout), batch_size=args.batch_size,
+            dry_run=args.dry_run)
+    action = 'to copy' if args.dry_run else 'copied'
+    _LOGGER.info(f"{counts['copied']} rows {action}, {counts['skipped']} already in the "
+                 f"target table, {counts['failed']} failed.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Script to measure the latency and throughput of the Azure and MTurk calls of the collection.
+
+Each operation is called in bursts of `--requests` calls, once for each of the
+`--concurrency` levels, and the p50, p95 and p99 latencies and the calls per second achieved
+are reported, to size the connection pools and rate limits before a campaign. Failed calls,
+e.g. throttled ones, are counted and the first error is reported.
+
+Operations:
+* list_blobs: first page of the listing of the starting structures.
+* query_entities: first page of the recent turns of `--hit_type`, as read by the collector.
+* get_entity: point read of a random row among the first page of the hits table.
+* upsert_entity: write of a small row to `--probe_table_name`, never to the hits table.
+* list_hits: first page of the HITs of the requester.
+* list_assignments_for_hit: submitted assignments of a random HIT among the first page.
+
+The Azure and boto3 clients keep at most 10 connections per host by default, so latencies
+grow with the concurrency above that.
+
+    python ./probe_backends.py --config sandbox --concurrency 1 8 32 --requests 200
+"""
+import argparse
+import contextlib
+import dotenv
+import itertools
+import os
+import random
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+# Project root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from hit_manager import HITManager  # noqa: E402
+from singleturn.singleturn_games_storage import (  # noqa: E402
+    SingleTurnDatasetTurn, SingleTurnGameStorage)
+from common import lazy_imports, logger, utils  # noqa: E402
+from common.latency_stats import LatencyStats, format_summaries  # noqa: E402
+
+azure_tables = lazy_imports.lazy_import('azure.data.tables')
+
+_LOGGER = logger.get_logger(__name__)
+
+AZURE_OPERATIONS = ['list_blobs', 'query_entities', 'get_entity', 'upsert_entity']
+MTURK_OPERATIONS = ['list_hits', 'list_assignments_for_hit']
+
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', choices=['production', 'sandbox'], default='sandbox',
+                        help='Environment to use for operations')
+    parser.add_argument('--config_filepath', type=str, default='env_configs.json',
+                        help='Path to json file with environment configuration')
+    parser.add_argument('--env_filepath', type=str, default='.env',
+                        help='Path to .env file with the Azure and AWS credentials, in case '
+                             'they are not already set.')
+    parser.add_argument('--operations', nargs='+', choices=AZURE_OPERATIONS + MTURK_OPERATIONS,
+                        default=AZURE_OPERATIONS + MTURK_OPERATIONS,
+                        help='Operations to measure.')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16],
+                        help='Numbers of concurrent calls, one burst for each.')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='Calls in each burst.')
+    parser.add_argument('--page_size', type=int, default=100,
+                        help='Results read by the list and query operations.')
+    parser.add_argument('--hit_type', type=str, default='builder-normal',
+                        help='Hit type of the turns read by query_entities.')
+    parser.add_argument('--hits_table_layout', choices=['game', 'hit_type_month'],
+                        default='game', help='Layout of the hits table.')
+    parser.add_argument('--probe_table_name', type=str, default='LatencyProbe',
+                        help='Azure table written by upsert_entity, created if it does not '
+                             'exist.')
+    return parser.parse_args()
+
+
+def run_burst(operation: Callable[[int], Any], request_count: int, concurrency: int,
+              stats: LatencyStats) -> LatencyStats:
+    """Calls @operation with the indexes of @request_count calls, @concurrency at a time."""
+    def call(index):
+        start_time = time.perf_counter()
+        try:
+            operation(index)
+        except Exception as e:
+            stats.add_error(e)
+            return
+        stats.add(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, range(request_count)))
+    stats.elapsed_seconds = time.perf_counter() - start_time
+    return stats
+
+
+def probe(operations: Dict[str, Callable[[int], Any]], concurrency_levels: List[int],
+          request_count: int) -> List[Dict[str, Any]]:
+    """Runs a burst of each operation at each concurrency level, and returns the summaries."""
+    summaries = []
+    for name, operation in operations.items():
+        for concurrency in concurrency_levels:
+            stats = run_burst(operation, request_count, concurrency,
+                              LatencyStats(f'{name} x{concurrency}'))
+            summary = stats.summary()
+            _LOGGER.info(f"{summary['name']}: {summary['count']} calls, "
+                         f"{summary['errors']} errors")
+            if stats.first_error is not None:
+                _LOGGER.warning(f"First error of {summary['name']}: {stats.first_error}")
+            summaries.append(summary)
+    return summaries
+
+
+def create_azure_operations(game_storage, probe_table_client, names: List[str], hit_type: str,
+                            page_size: int) -> Dict[str, Callable[[int], Any]]:
+    operations = {}
+    container_client = game_storage.create_container_client()
+    owner_id = f'{os.getpid()}-{random.randrange(1 << 16)}'
+    # Raw keys of the table, so point reads do not depend on the layout
+    sample_keys = [
+        (entity['PartitionKey'], entity['RowKey']) for entity in itertools.islice(
+            game_storage.table_client.list_entities(select=['PartitionKey', 'RowKey']),
+            page_size)]
+
+    def list_blobs(_):
+        return list(itertools.islice(container_client.list_blobs(
+            name_starts_with=game_storage.starting_structures_blob_prefix,
+            results_per_page=page_size), page_size))
+
+    def query_entities(_):
+        return list(itertools.islice(game_storage.hits_table.rows_by_type(
+            hit_type, select=SingleTurnDatasetTurn.DATABASE_COLUMNS, recent_only=True),
+            page_size))
+
+    def get_entity(_):
+        partition_key, row_key = random.choice(sample_keys)
+        return game_storage.table_client.get_entity(
+            partition_key=partition_key, row_key=row_key)
+
+    def upsert_entity(index):
+        # A few rows per probe, rewritten by the bursts
+        return probe_table_client.upsert_entity(
+            mode=azure_tables.UpdateMode.MERGE, entity={
+                'PartitionKey': 'probe', 'RowKey': f'{owner_id}-{index % 100}',
+                'Payload': 'x' * 256})
+
+    for name, operation in [('list_blobs', list_blobs), ('query_entities', query_entities),
+                            ('get_entity', get_entity), ('upsert_entity', upsert_entity)]:
+        if name not in names:
+            continue
+        if name == 'get_entity' and len(sample_keys) == 0:
+            _LOGGER.warning("Hits table is empty, get_entity skipped")
+            continue
+        operations[name] = operation
+    return operations
+
+
+def create_mturk_operations(hit_manager, names: List[str],
+                            page_size: int) -> Dict[str, Callable[[int], Any]]:
+    operations = {}
+    mturk_client = hit_manager.mturk_client
+    page_size = min(page_size, 100)
+
+    def list_hits(_):
+        return mturk_client.list_hits(MaxResults=page_size)
+
+    if 'list_hits' in names:
+        operations['list_hits'] = list_hits
+    if 'list_assignments_for_hit' in names:
+        hit_ids = [hit['HITId'] for hit in list_hits(0)['HITs']]
+        if len(hit_ids) == 0:
+            _LOGGER.warning("No HITs found, list_assignments_for_hit skipped")
+        else:
+            operations['list_assignments_for_hit'] = \
+                lambda _: mturk_client.list_assignments_for_hit(
+                    HITId=random.choice(hit_ids), AssignmentStatuses=['Submitted'])
+    return operations
+
+
+def main():
+    args = read_args()
+
+    dotenv.load_dotenv(args.env_filepath)
+
+    config = utils.read_config(args.config, config_filepath=args.config_filepath)
+    config['azure_connection_str'] = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+    config['aws_access_key'] = os.getenv("AWS_ACCESS_KEY_ID_LIT")
+    config['aws_secret_key'] = os.getenv("AWS_SECRET_ACCESS_KEY_LIT")
+    config['hits_table_layout'] = args.hits_table_layout
+
+    with contextlib.ExitStack() as stack:
+        operations = {}
+        azure_names = [name for name in args.operations if name in AZURE_OPERATIONS]
+        if len(azure_names) > 0:
+            game_storage = stack.enter_context(SingleTurnGameStorage(**config))
+            probe_table_client = None
+            if 'upsert_entity' in azure_names:
+                with azure_tables.TableServiceClient.from_connection_string(
+                        config['azure_connection_str']) as table_service_client:
+                    table_service_client.create_table_if_not_exists(
+                        table_name=args.probe_table_name)
+                probe_table_client = stack.enter_context(
+                    azure_tables.TableClient.from_connection_string(
+                        conn_str=config['azure_connection_str'],
+                        table_name=args.probe_table_name))
+            operations.update(create_azure_operations(
+                game_storage, probe_table_client, azure_names, args.hit_type, args.page_size))
+
+        mturk_names = [name for name in args.operations if name in MTURK_OPERATIONS]
+        if len(mturk_names) > 0:
+            operations.update(create_mturk_operations(
+                HITManager(**config), mturk_names, args.page_size))
+
+        summaries = probe(operations, args.concurrency, args.requests)
+    _LOGGER.info(f"Latency of each operation by concurrency:\n{format_summaries(summaries)}")
+
+
+if __name__ == '__main__':
+    main()
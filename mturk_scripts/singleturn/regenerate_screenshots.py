@@ -0,0 +1,106 @@
+"""
+Script to render and upload the screenshots of starting worlds that are missing them.
+
+The HIT layout shows the `<step>_north.png` screenshot of the starting world, stored in
+the same blob directory as the step file. Screenshots are rendered with the NumPy
+rasterizer in `utils/voxel_renderer.py`, so the script can run on headless machines.
+"""
+import argparse
+import dotenv
+import os
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Project root and repository root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from blob_listing import iter_blob_names  # noqa: E402
+from singleturn.singleturn_games_storage import SingleTurnGameStorage  # noqa: E402
+from common import utils, logger, voxels  # noqa: E402
+from utils import voxel_renderer  # noqa: E402
+
+_LOGGER = logger.get_logger(__name__)
+
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', choices=['production', 'sandbox'], default='sandbox',
+                        help='Environment to use for operations')
+    parser.add_argument('--config_filepath', type=str, default='env_configs.json',
+                        help='Path to json file with environment configuration')
+    parser.add_argument('--env_filepath', type=str, default='.env',
+                        help='Path to .env file with environment variable '
+                             'AZURE_STORAGE_CONNECTION_STRING, in case it is not already set.')
+    parser.add_argument('--views', type=str, nargs='+', default=['north'],
+                        choices=voxel_renderer.VIEWS, help='Views to render for each step.')
+    parser.add_argument('--scale', type=int, default=16,
+                        help='Side in pixels of each block in the rendered images.')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of concurrent downloads and uploads.')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Render all the screenshots, even if they already exist.')
+    parser.add_argument('--dry_run', action='store_true',
+                        help='Only report the number of missing screenshots.')
+    return parser.parse_args()
+
+
+def find_missing_screenshots(blob_names, views, overwrite=False):
+    """Returns a dictionary from step blob name to the views that have to be rendered."""
+    blob_names = set(blob_names)
+    missing = {}
+    for blob_name in blob_names:
+        if blob_name.endswith('.png'):
+            continue
+        missing_views = [
+            view for view in views
+            if overwrite or f'{blob_name}_{view}.png' not in blob_names]
+        if len(missing_views) > 0:
+            missing[blob_name] = missing_views
+    return missing
+
+
+def render_step_screenshots(container_client, step_blob_name, views, scale):
+    step_data = container_client.download_blob(step_blob_name).readall()
+    grid = voxels.grid_from_step_data(step_data)
+    for view, image in voxel_renderer.render_views(grid, views, scale=scale).items():
+        container_client.upload_blob(
+            f'{step_blob_name}_{view}.png', voxel_renderer.encode_png(image), overwrite=True)
+    return step_blob_name
+
+
+def main():
+    args = read_args()
+
+    dotenv.load_dotenv(args.env_filepath)
+
+    config = utils.read_config(args.config, config_filepath=args.config_filepath)
+    config['azure_connection_str'] = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+
+    game_storage = SingleTurnGameStorage(**config)
+    container_client = game_storage.create_container_client()
+    blob_names = list(iter_blob_names(
+        container_client, game_storage.starting_structures_blob_prefix,
+        max_workers=args.workers))
+
+    missing = find_missing_screenshots(blob_names, args.views, args.overwrite)
+    _LOGGER.info(f"{len(missing)} steps with missing screenshots found.")
+    if args.dry_run:
+        return
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(render_step_screenshots, container_client, step_blob_name,
+                            views, args.scale)
+            for step_blob_name, views in missing.items()]
+        for future in futures:
+            try:
+                _LOGGER.debug(f"Screenshots uploaded for {future.result()}")
+            except Exception as e:
+                _LOGGER.error(f"Error rendering screenshots: {e}")
+    _LOGGER.info(f"Screenshots rendered for {len(missing)} steps.")
+
+
+if __name__ == '__main__':
+    main()
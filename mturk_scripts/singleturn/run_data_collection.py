@@ -8,18 +8,34 @@ the script is executed again, before the assignment expires.
 """
 
 import argparse
+import contextlib
+import functools
+import multiprocessing
 import sys
+import time
 import dotenv
 import os
-import time
 
 # Project root
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 
+from assignment_events import (
+    DirectoryNotificationQueue, NotificationEventSource, PollingEventSource,
+    SQSNotificationQueue)
+from campaigns import SharedClients, load_campaigns
+from cassettes import REPLAY, Cassette
+from collector_checkpoint import CollectorCheckpoint
+from hit_leases import AzureTableLeaseStore, ShardLeaseManager, default_owner_id
 from hit_manager import HITManager
+from release_controller import ReleaseRateController
+from validation_pipeline import ValidationPipeline
+from worker_stats import WorkerStatsStore
 from singleturn.builder_template_renderer import BuilderTemplateRenderer
-from singleturn.singleturn_games_storage import SingleTurnGameStorage, SingleTurnDatasetTurn
-from common import utils, logger
+from singleturn.singleturn_games_storage import SingleTurnGameStorage
+from singleturn.validation_rules import WorldChangesRule, assignment_rules
+from common import lazy_imports, utils, logger
+from common.minhash import InstructionDuplicateIndex
+from common.sampling_profiler import ProfilerHook
 
 dotenv.load_dotenv()
 
@@ -36,134 +52,698 @@ def read_args():
     parser.add_argument('--config_filepath', type=str, default='env_config.json',
                         help='Path to json file with environment configuration')
 
-    parser.add_argument("--hit_count", type=int, required=True,
-                        help="Total number of accepted HITs to be created")
+    parser.add_argument("--hit_count", type=int, default=None,
+                        help="Total number of accepted HITs to be created. Required unless "
+                             "--campaigns_filepath is set.")
+
+    parser.add_argument("--campaigns_filepath", type=str, default=None,
+                        help="Path to a json file with a list of campaigns, each with its "
+                             "environment, hit type, template and hit count, all run by this "
+                             "process with shared MTurk and Azure connections. --config, "
+                             "--hit_count and --template_filepath are then ignored.")
 
     parser.add_argument("--template_filepath", type=str, default='templates/builder_normal.xml',
                         help="Path to the file with the xml/html template to render for each HIT.")
 
-    return parser.parse_args()
-
-
-def validate_assignment(assignment_dict) -> bool:
-    """Asserts whether the assignment should be approved or not.
-
-    The HIT manager will receive the assignment, parse the response and store it
-    into the 'Answer' key of `assignment_dict`. The structure of the dictionary
-    under Answer is dependant on the structure of the layout used to create the
-    HIT.
+    parser.add_argument("--structure_index_filepath", type=str, default=None,
+                        help="Path to the json index created with build_structure_index.py. If "
+                             "set, starting worlds with already used structures are skipped.")
+
+    parser.add_argument("--coverage_balanced", action='store_true',
+                        help="Select first the starting worlds of structures with less turns in "
+                             "the hits table.")
+
+    parser.add_argument("--min_changed_blocks", type=int, default=1,
+                        help="Minimum number of blocks added or removed by the builder for a HIT "
+                             "to be qualified. Use 0 to skip the comparison of the worlds.")
+
+    parser.add_argument("--duplicate_index_filepath", type=str, default=None,
+                        help="Path to the file with the index of collected instructions. If set, "
+                             "instructions too similar to a previous one are not qualified. The "
+                             "file is created from the hits table if it does not exist.")
+
+    parser.add_argument("--duplicate_threshold", type=float, default=0.8,
+                        help="Minimum estimated Jaccard similarity between the character "
+                             "shingles of two instructions to consider them duplicated.")
+
+    parser.add_argument("--worker_stats_filepath", type=str, default=None,
+                        help="Path to the json file with the statistics of each worker. If set, "
+                             "the language and world checks are skipped for most assignments of "
+                             "trusted workers. The file is created if it does not exist.")
+
+    parser.add_argument("--validation_budget_ms", type=float, default=50,
+                        help="Maximum mean milliseconds of the validation rules per assignment. "
+                             "The time and rejections of each rule are logged periodically, "
+                             "with a warning if the mean is above the budget.")
+
+    parser.add_argument("--notification_queue", type=str, default=None,
+                        help="URL of an Amazon SQS queue, or path of a local directory, with "
+                             "the notifications of submitted assignments. If set, only the "
+                             "notified hits are reviewed, instead of polling all open hits.")
+
+    parser.add_argument("--reconcile_seconds", type=float, default=600,
+                        help="Seconds between reviews of all the open hits when "
+                             "--notification_queue is set, in case a notification is lost.")
+
+    parser.add_argument("--checkpoint_filepath", type=str, default=None,
+                        help="Path to the json file with the state of the collection loop, "
+                             "saved after every sweep and restored at start up, so hits "
+                             "created just before a restart are not missed.")
+
+    parser.add_argument("--poll_seconds", type=float, default=None,
+                        help="Minimum seconds between two reviews of the same open hit when "
+                             "polling, by default the wait between sweeps without new "
+                             "assignments. The next review times are kept in the checkpoint.")
+
+    parser.add_argument("--shard_count", type=int, default=1,
+                        help="Number of shards of the open HITs. With more than one shard, "
+                             "each collector only reviews the HITs of the shards it leases, "
+                             "so several collectors can run at the same time.")
+
+    parser.add_argument("--collector_processes", type=int, default=1,
+                        help="Number of local collector processes reviewing the shards of "
+                             "the open HITs. Collectors in other hosts can share the shards "
+                             "with the same --shard_count and --lease_table_name.")
+
+    parser.add_argument("--lease_table_name", type=str, default='HitLeases',
+                        help="Azure table with the leases of the shards.")
+
+    parser.add_argument("--lease_seconds", type=float, default=300,
+                        help="Seconds after which the shards of a collector that stopped "
+                             "renewing its leases are taken over by the others.")
+
+    parser.add_argument("--adaptive_release", action='store_true',
+                        help="Release the --hit_count HITs gradually, keeping open as many "
+                             "as the workers accept before they expire, instead of creating "
+                             "all of them at start up.")
+
+    parser.add_argument("--target_expiration_ratio", type=float, default=0.05,
+                        help="Maximum fraction of the HITs released with --adaptive_release "
+                             "that expire unworked.")
+
+    parser.add_argument("--initial_open_hits", type=int, default=10,
+                        help="Number of open HITs released with --adaptive_release before "
+                             "any acceptance or expiration is observed.")
+
+    parser.add_argument("--republish_expired", action='store_true',
+                        help="Publish again, with new HITs, the turns whose HITs expired "
+                             "without any assignment, at start up and every "
+                             "--republish_seconds.")
+
+    parser.add_argument("--republish_seconds", type=float, default=1800,
+                        help="Seconds between searches of expired turns with "
+                             "--republish_expired.")
+
+    parser.add_argument("--hits_table_name", type=str, default=None,
+                        help="Azure table with the turns, by default the one in the "
+                             "environment configuration.")
+
+    parser.add_argument("--hits_table_layout", choices=['game', 'hit_type_month'],
+                        default='game',
+                        help="Layout of the hits table: partitioned by game id, or by hit type "
+                             "and month, see migrate_hits_table.py.")
+
+    parser.add_argument("--legacy_hits_table_name", type=str, default=None,
+                        help="Azure table being migrated to the hits table. Turns not migrated "
+                             "yet are also read from it, and new turns only written to the "
+                             "hits table.")
+
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record_cassette", type=str, default=None,
+                                help="Path of a file where all the calls to MTurk and to the "
+                                     "Azure tables and containers are recorded, with their "
+                                     "responses and latencies.")
+    cassette_group.add_argument("--replay_cassette", type=str, default=None,
+                                help="Path of a file written with --record_cassette. The "
+                                     "recorded responses are served instead of calling MTurk "
+                                     "and Azure, and the script does not wait between sweeps.")
+
+    parser.add_argument("--replay_latency", action="store_true", default=False,
+                        help="Sleep the recorded latency of each call with --replay_cassette.")
+
+    parser.add_argument("--profile_imports", action="store_true", default=False,
+                        help="Log on exit the time spent importing the SDKs loaded on first "
+                             "use, and the ones that were never needed.")
+
+    parser.add_argument("--profile_dirpath", type=str, default=None,
+                        help="Directory where profiles of the collection loop are written. If "
+                             "set, signal SIGUSR1 captures a sampling profile of the next "
+                             "--profile_seconds, written as folded stacks for flame graphs and "
+                             "as a summary by function.")
+
+    parser.add_argument("--profile_control_filepath", type=str, default=None,
+                        help="File that captures a profile when touched, checked in every "
+                             "sweep. It may contain the duration of the profile in seconds.")
+
+    parser.add_argument("--profile_seconds", type=float, default=30,
+                        help="Default duration of the profiles.")
+
+    args = parser.parse_args()
+    if args.campaigns_filepath is None and args.hit_count is None:
+        parser.error("--hit_count is required without --campaigns_filepath")
+    if args.campaigns_filepath is not None:
+        if (args.shard_count > 1 or args.collector_processes > 1 or
+                args.notification_queue is not None):
+            parser.error("--campaigns_filepath reviews the HITs of all the campaigns in each "
+                         "sweep, and cannot be used with --shard_count, --collector_processes "
+                         "or --notification_queue")
+        if (args.duplicate_index_filepath is not None or
+                args.worker_stats_filepath is not None or args.checkpoint_filepath is not None):
+            parser.error("--duplicate_index_filepath, --worker_stats_filepath and "
+                         "--checkpoint_filepath would be shared by all the campaigns, set them "
+                         "in each campaign of --campaigns_filepath instead")
+        if args.record_cassette is not None or args.replay_cassette is not None:
+            parser.error("Cassettes record a single campaign, and cannot be used with "
+                         "--campaigns_filepath")
+    if args.adaptive_release and (args.shard_count > 1 or args.collector_processes > 1):
+        parser.error("--adaptive_release measures the HITs reviewed by a single collector, "
+                     "and cannot be used with --shard_count or --collector_processes")
+    if args.republish_expired and (args.shard_count > 1 or args.collector_processes > 1):
+        parser.error("--republish_expired would publish the same turns from several "
+                     "collectors, and cannot be used with --shard_count or "
+                     "--collector_processes")
+    if args.collector_processes > 1:
+        args.shard_count = max(args.shard_count, args.collector_processes)
+        if (args.duplicate_index_filepath is not None or
+                args.worker_stats_filepath is not None or args.checkpoint_filepath is not None):
+            parser.error("--duplicate_index_filepath, --worker_stats_filepath and "
+                         "--checkpoint_filepath are saved by a single process, and cannot be "
+                         "used with --collector_processes")
+        if args.record_cassette is not None or args.replay_cassette is not None:
+            parser.error("Cassettes are recorded and replayed by a single process, and cannot "
+                         "be used with --collector_processes")
+    if ((args.record_cassette is not None or args.replay_cassette is not None) and
+            (args.shard_count > 1 or args.notification_queue is not None)):
+        parser.error("Cassettes only record the MTurk, table and blob clients, and cannot be "
+                     "used with the leases of --shard_count or with --notification_queue")
+    return args
+
+
+def load_duplicate_index(game_storage, turn_type, filepath, threshold=0.8):
+    """Loads the instruction index, building it from the hits table the first time."""
+    if os.path.exists(filepath):
+        return InstructionDuplicateIndex.load(filepath, threshold=threshold)
+
+    duplicate_index = InstructionDuplicateIndex(filepath, threshold=threshold)
+    duplicate_index.add_many(game_storage.list_instructions(turn_type))
+    duplicate_index.save()
+    _LOGGER.info(f"Instruction index created with {len(duplicate_index)} instructions.")
+    return duplicate_index
+
+
+def is_sqs_queue_url(notification_queue):
+    return notification_queue.startswith('https://')
+
+
+def create_event_source(config):
+    """Creates the source of hits to review in each sweep, see `assignment_events`."""
+    notification_queue = config.get('notification_queue')
+    if notification_queue is None:
+        return PollingEventSource(poll_seconds=config.get('poll_seconds', 0))
+    if is_sqs_queue_url(notification_queue):
+        queue = SQSNotificationQueue(
+            notification_queue, config['aws_access_key'], config['aws_secret_key'])
+    else:
+        queue = DirectoryNotificationQueue(notification_queue)
+    return NotificationEventSource(queue, reconcile_seconds=config.get('reconcile_seconds', 600))
 
-    Additionally, this function can apply changes to the assignment_dict. The same
-    reference will be returned by `HitManager.complete_open_assignments()`.
 
-    Args:
-        assignment_dict (dictionary): A dictionary representation of the
-            assignment, with at least key 'Answer'.
+def create_hit_manager(config, game_storage, turn_type):
+    """Creates the HIT manager with the validation rules enabled in @config.
 
     Returns:
-        bool: Whether the assignment should be approved.
+        Tuple: the HIT manager, and the instruction index and worker statistics used by
+        the validation, or None if they are not enabled.
     """
-    # Extract input instruction from answer
-    input_instruction = None
-    answer_list = []
-    if not type(assignment_dict['Answer']) is list:
-        # One field found in HIT layout
-        answer_list = [assignment_dict['Answer']]
-    else:
-        # Multiple fields in HIT layout
-        answer_list = assignment_dict['Answer']
-
-    for answer_field in answer_list:
-        if answer_field['QuestionIdentifier'] == 'InputInstructionSingleTurn':
-            input_instruction = answer_field['FreeText']
-            break
+    duplicate_index = None
+    if config.get('duplicate_index_filepath') is not None:
+        duplicate_index = load_duplicate_index(
+            game_storage, turn_type, config['duplicate_index_filepath'],
+            config.get('duplicate_threshold', 0.8))
+    worker_stats = None
+    if config.get('worker_stats_filepath') is not None:
+        worker_stats = WorkerStatsStore.load(config['worker_stats_filepath'])
+    rules = assignment_rules(duplicate_index=duplicate_index, worker_stats=worker_stats)
+    if config.get('min_changed_blocks', 0) > 0:
+        rules.append(WorldChangesRule(
+            game_storage, config['result_structures_container_name'],
+            min_changed_blocks=config['min_changed_blocks'], hit_type=turn_type))
+    pipeline = ValidationPipeline(
+        rules, budget_seconds=config.get('validation_budget_seconds', 0.05))
+    hit_manager = HITManager(
+        templates_dirname='templates', verification_function=pipeline.validate,
+        sweep_verification_function=pipeline.validate_sweep,
+        event_source=create_event_source(config), **config)
+    return hit_manager, duplicate_index, worker_stats
+
+
+def enable_submission_notifications(hit_manager, config):
+    """Sends the submissions of the types of the new HITs to the SQS queue of @config, if any.
+
+    Called whenever HITs are created, as the HIT type ids are only known once a HIT of the
+    type exists, e.g. after the first release with `--adaptive_release`.
+    """
+    notification_queue = config.get('notification_queue')
+    if notification_queue is not None and is_sqs_queue_url(notification_queue):
+        hit_manager.enable_new_notifications(notification_queue)
 
-    # Save the relevant fields for easier access later
-    assignment_dict['InputInstruction'] = input_instruction
 
-    qualified = False
-    if (input_instruction is not None and
-            len(input_instruction.strip()) > 5 and
-            utils.is_english(input_instruction)):
-        qualified = True
-    return qualified
+def create_hits(hit_count, game_storage, hit_manager, renderer, config, turn_type):
+    """Creates HITs for @hit_count new open turns, and saves the turns.
 
+    Returns:
+        List[str]: ids of the new HITs, less than @hit_count if not enough starting worlds
+        were found.
+    """
+    if hit_count <= 0:
+        return []
+    open_turns = game_storage.get_open_turns(turn_type, hit_count)
+    _LOGGER.info(f"Creating hits for turns {len(open_turns)}")
+
+    hit_ids = []
+    for open_turn in open_turns:
+        template = renderer.render_template_from_turn(config['azure_sas'], open_turn)
+        new_hit_id = hit_manager.create_hit(template, hit_type=turn_type, **config)
+        _LOGGER.info(f"Hit created {new_hit_id}",
+                     extra={'hit_id': new_hit_id, 'game_id': open_turn.game_id})
+        open_turn.set_hit_id(new_hit_id)
+
+        game_storage.save_new_turn(open_turn)
+        hit_ids.append(new_hit_id)
+    enable_submission_notifications(hit_manager, config)
+    return hit_ids
+
+
+def republish_expired_turns(game_storage, hit_manager, renderer, config, turn_type):
+    """Creates new HITs for the turns whose HITs expired without any assignment.
+
+    The turns without worker are read from the hits table, and their HITs checked in a
+    single listing of the HITs. The row of each turn is replaced right after its new HIT is
+    created, as in `create_hits`, so an interrupted run leaves no HIT without row and does
+    not publish the same turn again when restarted. The expired HIT is then deleted, so it
+    is not a candidate of the next calls.
 
-def run_hits(hit_count, template_filepath, config, seconds_to_wait=60):
+    Returns:
+        List[str]: ids of the new HITs.
+    """
+    turns = {turn.hit_id: turn for turn in game_storage.list_unworked_turns(turn_type)}
+    if len(turns) == 0:
+        return []
+    expired_hit_ids = hit_manager.get_expired_unworked_hit_ids(turns.keys())
+
+    new_hit_ids = []
+    for hit_id in expired_hit_ids:
+        turn = turns[hit_id]
+        template = renderer.render_template_from_turn(config['azure_sas'], turn)
+        turn.set_hit_id(hit_manager.create_hit(template, hit_type=turn_type, **config))
+        new_hit_ids.append(turn.hit_id)
+        if game_storage.replace_turns({hit_id: turn}) == 0:
+            _LOGGER.error(f"Row of expired HIT {hit_id} not replaced by HIT {turn.hit_id}",
+                          extra={'hit_id': turn.hit_id, 'game_id': turn.game_id})
+            continue
+        _LOGGER.info(f"Turn of expired HIT {hit_id} published again in HIT {turn.hit_id}",
+                     extra={'hit_id': turn.hit_id, 'game_id': turn.game_id})
+        hit_manager.delete_expired_hit(hit_id)
+    if len(new_hit_ids) > 0:
+        _LOGGER.info(f"{len(new_hit_ids)} expired turns published again")
+        enable_submission_notifications(hit_manager, config)
+    return new_hit_ids
 
-    with SingleTurnGameStorage(**config) as game_storage:
-        turn_type = 'builder-normal'
-        open_turns = game_storage.get_open_turns(turn_type, hit_count)
-        _LOGGER.info(f"Creating hits for turns {len(open_turns)}")
 
-        renderer = BuilderTemplateRenderer(template_filepath)
-        hit_manager = HITManager(
-            templates_dirname='templates', verification_function=validate_assignment, **config)
+def create_release_controller(hit_count, release_function, config):
+    """Controller releasing the HITs gradually, see `release_controller`."""
+    return ReleaseRateController(
+        release_function, hit_count,
+        hit_lifetime_seconds=config.get('hit_lifetime_seconds', 3600),
+        assignment_duration_seconds=config.get('assignment_duration_in_seconds', 480),
+        target_expiration_ratio=config.get('target_expiration_ratio', 0.05),
+        initial_open_hits=config.get('initial_open_hits', 10))
 
-        for open_turn in open_turns:
-            template = renderer.render_template_from_turn(config['azure_sas'], open_turn)
-            new_hit_id = hit_manager.create_hit(template, hit_type=turn_type, **config)
-            _LOGGER.info(f"Hit created {new_hit_id}")
-            open_turn.set_hit_id(new_hit_id)
 
-            game_storage.save_new_turn(open_turn)
+def start_campaign(hit_count, template_filepath, config, game_storage, turn_type, hit_manager):
+    """Creates the first HITs of a campaign, or the controller that releases them.
 
+    Returns:
+        Tuple: the collector checkpoint, the release controller and the function publishing
+        again the expired turns, or None if they are not enabled.
+    """
+    renderer = BuilderTemplateRenderer(template_filepath)
+    checkpoint = None
+    if config.get('checkpoint_filepath') is not None:
+        checkpoint = CollectorCheckpoint(config['checkpoint_filepath'])
+        checkpoint.restore(hit_manager)
+
+    republish_function = None
+    if config.get('republish_expired'):
+        republish_function = functools.partial(
+            republish_expired_turns, game_storage, hit_manager, renderer, config, turn_type)
+        republish_function()
+
+    release_controller = None
+    if config.get('adaptive_release'):
+        # The HITs are released in the collection loop
+        release_controller = create_release_controller(
+            hit_count, functools.partial(
+                create_hits, game_storage=game_storage, hit_manager=hit_manager,
+                renderer=renderer, config=config, turn_type=turn_type), config)
+    else:
+        create_hits(hit_count, game_storage, hit_manager, renderer, config, turn_type)
         _LOGGER.info("HITs created successfully, waiting for assignments submissions")
+    return checkpoint, release_controller, republish_function
 
-        wait_for_assignments(config, seconds_to_wait, game_storage, turn_type, hit_manager)
 
+def run_hits(hit_count, template_filepath, config, seconds_to_wait=60):
 
-def wait_for_assignments(config, seconds_to_wait, game_storage, turn_type, hit_manager):
-    while True:
+    with SingleTurnGameStorage(**config) as game_storage:
+        turn_type = 'builder-normal'
+        hit_manager, duplicate_index, worker_stats = create_hit_manager(
+            config, game_storage, turn_type)
+        checkpoint, release_controller, republish_function = start_campaign(
+            hit_count, template_filepath, config, game_storage, turn_type, hit_manager)
+
+        collector_processes = config.get('collector_processes', 1)
+        if collector_processes > 1:
+            session_hits = {
+                hit_id: hit_manager.session_hit_expirations.get(hit_id)
+                for hit_id in hit_manager.session_open_hits}
+            run_collector_processes(collector_processes, config, seconds_to_wait, turn_type,
+                                    session_hits=session_hits)
+        elif config.get('shard_count', 1) > 1:
+            collect_shards(config, seconds_to_wait, turn_type, game_storage=game_storage,
+                           hit_manager=hit_manager, duplicate_index=duplicate_index,
+                           worker_stats=worker_stats, checkpoint=checkpoint)
+        else:
+            wait_for_assignments(config, seconds_to_wait, game_storage, turn_type, hit_manager,
+                                 duplicate_index=duplicate_index, worker_stats=worker_stats,
+                                 checkpoint=checkpoint, release_controller=release_controller,
+                                 republish_function=republish_function)
+
+
+def run_campaigns(campaigns, seconds_to_wait=60):
+    """Runs the @campaigns, see `campaigns.py`, reviewing all of them in each round.
+
+    The campaigns share the MTurk client of each endpoint and its listing of the HITs, and
+    the connections to Azure.
+    """
+    shared_clients = SharedClients()
+    # The results of all the campaigns are saved by game id, so their games share the indexes
+    hit_types = [campaign.hit_type for campaign in campaigns]
+    configs = [dict(shared_clients.add_to_config(campaign.config), game_index_hit_types=hit_types)
+               for campaign in campaigns]
+    # The expired turns are found in the listing of the HITs when each campaign starts
+    shared_clients.refresh_hit_sweeps()
+    with contextlib.ExitStack() as exit_stack:
+        collectors = []
+        for campaign, config in zip(campaigns, configs):
+            _LOGGER.info(f"Starting campaign {campaign.name} with {campaign.hit_count} HITs")
+            game_storage = exit_stack.enter_context(SingleTurnGameStorage(**config))
+            hit_manager, duplicate_index, worker_stats = create_hit_manager(
+                config, game_storage, campaign.hit_type)
+            checkpoint, release_controller, republish_function = start_campaign(
+                campaign.hit_count, campaign.template_filepath, config, game_storage,
+                campaign.hit_type, hit_manager)
+            collectors.append(AssignmentCollector(
+                config, game_storage, campaign.hit_type, hit_manager,
+                duplicate_index=duplicate_index, worker_stats=worker_stats,
+                checkpoint=checkpoint, release_controller=release_controller,
+                republish_function=republish_function, name=campaign.name))
+
+        profiler_hook = create_profiler_hook(campaigns[0].config)
+        while len(collectors) > 0:
+            if profiler_hook is not None:
+                profiler_hook.poll()
+            shared_clients.refresh_hit_sweeps()
+            completed_count = 0
+            for collector in list(collectors):
+                collector_completed_count = collector.sweep()
+                if collector_completed_count is None:
+                    _LOGGER.info(f"Campaign {collector.name} finished")
+                    collectors.remove(collector)
+                else:
+                    completed_count += collector_completed_count
+            if completed_count == 0 and len(collectors) > 0:
+                _LOGGER.info(f"No new assignments, waiting {seconds_to_wait} seconds.")
+                time.sleep(seconds_to_wait)
+
+
+def collect_shards(config, seconds_to_wait, turn_type, game_storage=None, hit_manager=None,
+                   duplicate_index=None, worker_stats=None, checkpoint=None, owner_id=None,
+                   session_hits=None):
+    """Reviews the assignments of the HIT shards leased by this collector.
+
+    Creates its own game storage and HIT manager if they are not given, as it is also the
+    entry point of the local collector processes. Those are given the HITs created at
+    startup by the parent process in @session_hits, their expiration by id, as MTurk may
+    not list them yet. The leases are released on exit.
+    """
+    with AzureTableLeaseStore(config['azure_connection_str'],
+                              config.get('lease_table_name', 'HitLeases')) as lease_store:
+        lease_manager = ShardLeaseManager(
+            lease_store, config['shard_count'], owner_id=owner_id,
+            lease_seconds=config.get('lease_seconds', 300))
+        try:
+            if game_storage is not None:
+                wait_for_assignments(config, seconds_to_wait, game_storage, turn_type,
+                                     hit_manager, duplicate_index=duplicate_index,
+                                     worker_stats=worker_stats, lease_manager=lease_manager,
+                                     checkpoint=checkpoint)
+                return
+
+            with SingleTurnGameStorage(**config) as game_storage:
+                hit_manager, duplicate_index, worker_stats = create_hit_manager(
+                    config, game_storage, turn_type)
+                for hit_id, expiration in (session_hits or {}).items():
+                    hit_manager.session_open_hits.add(hit_id)
+                    if expiration is not None:
+                        hit_manager.session_hit_expirations[hit_id] = expiration
+                wait_for_assignments(config, seconds_to_wait, game_storage, turn_type,
+                                     hit_manager, duplicate_index=duplicate_index,
+                                     worker_stats=worker_stats, lease_manager=lease_manager)
+        finally:
+            lease_manager.release()
+
+
+def run_collector_process(config, seconds_to_wait, turn_type, owner_id, session_hits):
+    """Entry point of a collector process, running `collect_shards` with its own logging."""
+    logger.reset_logging()
+    logger.configure_logging()
+    try:
+        collect_shards(config, seconds_to_wait, turn_type, owner_id=owner_id,
+                       session_hits=session_hits)
+    finally:
+        logger.stop_logging()
+
+
+def run_collector_processes(collector_processes, config, seconds_to_wait, turn_type,
+                            session_hits=None):
+    """Runs `collect_shards` in @collector_processes processes and waits for them.
+
+    The HITs created by this process, @session_hits, are watched by every process until
+    MTurk lists them, each process reviewing those of the shards it leases. Once listed,
+    the HITs closed by a process are no longer listed for the others.
+    """
+    processes = []
+    for process_index in range(collector_processes):
+        owner_id = f'{default_owner_id()}-{process_index}'
+        process = multiprocessing.Process(
+            target=run_collector_process, name=owner_id,
+            args=(config, seconds_to_wait, turn_type),
+            kwargs={'owner_id': owner_id, 'session_hits': session_hits})
+        process.start()
+        processes.append(process)
+    _LOGGER.info(f"Started {collector_processes} collector processes")
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            _LOGGER.error(f"Collector {process.name} exited with code {process.exitcode}")
+
+
+def create_profiler_hook(config):
+    """Hook capturing profiles of this process on demand, or None if not enabled."""
+    if config.get('profile_dirpath') is None:
+        return None
+    profiler_hook = ProfilerHook(
+        config['profile_dirpath'], control_filepath=config.get('profile_control_filepath'),
+        duration_seconds=config.get('profile_seconds', 30))
+    profiler_hook.install()
+    return profiler_hook
+
+
+class AssignmentCollector:
+    """Reviews the open HITs of a hit type and saves their assignments, one sweep at a time.
+
+    Several collectors of different hit types can run in the same process, see
+    `run_campaigns`.
+    """
+
+    def __init__(self, config, game_storage, turn_type, hit_manager, duplicate_index=None,
+                 worker_stats=None, lease_manager=None, checkpoint=None,
+                 release_controller=None, republish_function=None, name=None) -> None:
+        self.config = config
+        self.game_storage = game_storage
+        self.turn_type = turn_type
+        self.hit_manager = hit_manager
+        self.duplicate_index = duplicate_index
+        self.worker_stats = worker_stats
+        self.lease_manager = lease_manager
+        self.checkpoint = checkpoint
+        self.release_controller = release_controller
+        self.republish_function = republish_function
+        self.name = name or turn_type
+        self.next_republish_time = time.monotonic() + config.get('republish_seconds', 1800)
+
+    def sweep(self):
+        """Reviews the open HITs once, and saves the turns of the completed assignments.
+
+        Returns:
+            int: number of completed assignments, or None if no HITs are left to review.
+        """
         # Look for further open hits
-        open_hit_ids = hit_manager.get_open_hit_ids(hit_type=turn_type)
+        open_hit_ids = self.hit_manager.get_open_hit_ids(hit_type=self.turn_type)
+        if self.republish_function is not None and (
+                time.monotonic() >= self.next_republish_time or len(open_hit_ids) == 0):
+            # Also before exiting, so the last expired turns are not left behind
+            open_hit_ids += self.republish_function()
+            self.next_republish_time = (
+                time.monotonic() + self.config.get('republish_seconds', 1800))
+        if self.release_controller is not None:
+            open_hit_ids += self.release_controller.release(len(open_hit_ids))
+            if len(open_hit_ids) == 0 and not self.release_controller.is_done:
+                _LOGGER.error(f"No new HITs could be released for {self.name}. Exiting.")
+                return None
         if len(open_hit_ids) == 0:
-            _LOGGER.warning("No more non-expired hits to review for this type of turn. "
-                                "Exiting script.")
-            break
-
-            # Look for new submitted assignments and review them.
-        completed_assignments = hit_manager.complete_open_assignments(open_hit_ids)
-
-            # If there were assignments completed in the previous function, save the
-            # results into the game storage.
-        if len(completed_assignments) == 0:
-            _LOGGER.info(f"No new assignments, waiting for {seconds_to_wait} seconds.")
-            time.sleep(seconds_to_wait)
-            continue
-
+            _LOGGER.warning(f"No more non-expired hits to review for {self.name}. Exiting.")
+            return None
+
+        if self.lease_manager is not None:
+            # Only review the hits of the shards leased by this collector
+            self.lease_manager.refresh()
+            open_hit_ids = self.lease_manager.filter_hit_ids(open_hit_ids)
+
+        # Look for new submitted assignments and review them.
+        completed_assignments = self.hit_manager.complete_open_assignments(
+            self.hit_manager.hit_ids_to_review(open_hit_ids))
+        if self.release_controller is not None:
+            self.release_controller.record_completed(completed_assignments)
+        if self.checkpoint is not None:
+            self.checkpoint.save(self.hit_manager)
+        if len(completed_assignments) > 0:
+            # Save the results of the assignments completed into the game storage.
+            self.save_assignments(completed_assignments)
+        return len(completed_assignments)
+
+    def save_assignments(self, completed_assignments):
+        hit_turns = self.game_storage.retrieve_turns(
+            completed_assignments.keys(), hit_type=self.turn_type)
         for hit_id, assignment_answers in completed_assignments.items():
-            entity = game_storage.retrieve_turn_entity(hit_id)
-            if entity is None:
-                _LOGGER.error(f'No turn found for HIT {hit_id}')
+            hit_turn = hit_turns.get(hit_id)
+            if hit_turn is None:
+                _LOGGER.error(f'No turn found for HIT {hit_id}', extra={'hit_id': hit_id})
+                continue
 
-            hit_turn = SingleTurnDatasetTurn.from_database_entry(entity)
-
-                # Storing action data path
+            # Storing action data path
             hit_turn.update_result_blob_path(
-                container_name=config['result_structures_container_name'],
+                container_name=self.config['result_structures_container_name'],
                 blob_subpaths='actionHit')
 
-                # Update turn with assignment values after processing Hit
+            # Update turn with assignment values after processing Hit
             hit_turn.input_instructions = assignment_answers['InputInstruction']
             hit_turn.is_qualified = assignment_answers['IsHITQualified']
             hit_turn.worker_id = assignment_answers['WorkerId']
 
-            game_storage.upsert_turn(hit_turn)
-            _LOGGER.info(f"Assignment for hit {hit_id} successfully saved.")
+            self.game_storage.upsert_turn(hit_turn)
+            _LOGGER.info(f"Assignment for hit {hit_id} successfully saved.",
+                         extra={'hit_id': hit_id, 'game_id': hit_turn.game_id})
+
+            if self.worker_stats is not None:
+                self.worker_stats.record_assignment(assignment_answers)
+
+        if self.duplicate_index is not None:
+            self.duplicate_index.save()
+        if self.worker_stats is not None:
+            self.worker_stats.save()
+
+
+def wait_for_assignments(config, seconds_to_wait, game_storage, turn_type, hit_manager,
+                         duplicate_index=None, worker_stats=None, lease_manager=None,
+                         checkpoint=None, release_controller=None, republish_function=None):
+    collector = AssignmentCollector(
+        config, game_storage, turn_type, hit_manager, duplicate_index=duplicate_index,
+        worker_stats=worker_stats, lease_manager=lease_manager, checkpoint=checkpoint,
+        release_controller=release_controller, republish_function=republish_function)
+    # Each collector process captures its own profiles
+    profiler_hook = create_profiler_hook(config)
+    while True:
+        if profiler_hook is not None:
+            profiler_hook.poll()
+        completed_count = collector.sweep()
+        if completed_count is None:
+            break
+        if completed_count == 0:
+            _LOGGER.info(f"No new assignments, waiting up to {seconds_to_wait} seconds.")
+            hit_manager.wait_for_submissions(seconds_to_wait)
 
 
 def main():
 
     args = read_args()
+    if args.profile_imports:
+        lazy_imports.report_at_exit(_LOGGER.info)
+    # Seconds between sweeps without new assignments, replayed runs do not wait
+    seconds_to_wait = 0 if args.replay_cassette is not None else 60
+
+    # Settings of the command line, shared by all the campaigns
+    settings = {}
+    settings['azure_connection_str'] = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
+    settings['azure_sas'] = os.getenv('AZURE_STORAGE_SAS')
+    settings['aws_access_key'] = os.getenv("AWS_ACCESS_KEY_ID_LIT")
+    settings['aws_secret_key'] = os.getenv("AWS_SECRET_ACCESS_KEY_LIT")
+    settings['structure_index_filepath'] = args.structure_index_filepath
+    settings['coverage_balanced'] = args.coverage_balanced
+    settings['min_changed_blocks'] = args.min_changed_blocks
+    settings['duplicate_index_filepath'] = args.duplicate_index_filepath
+    settings['duplicate_threshold'] = args.duplicate_threshold
+    settings['worker_stats_filepath'] = args.worker_stats_filepath
+    settings['validation_budget_seconds'] = args.validation_budget_ms / 1000
+    settings['notification_queue'] = args.notification_queue
+    settings['reconcile_seconds'] = args.reconcile_seconds
+    settings['checkpoint_filepath'] = args.checkpoint_filepath
+    settings['poll_seconds'] = (
+        args.poll_seconds if args.poll_seconds is not None else seconds_to_wait)
+    settings['shard_count'] = args.shard_count
+    settings['collector_processes'] = args.collector_processes
+    settings['lease_table_name'] = args.lease_table_name
+    settings['lease_seconds'] = args.lease_seconds
+    if args.hits_table_name is not None:
+        settings['hits_table_name'] = args.hits_table_name
+    settings['hits_table_layout'] = args.hits_table_layout
+    settings['legacy_hits_table_name'] = args.legacy_hits_table_name
+    settings['adaptive_release'] = args.adaptive_release
+    settings['republish_expired'] = args.republish_expired
+    settings['republish_seconds'] = args.republish_seconds
+    settings['profile_dirpath'] = args.profile_dirpath
+    settings['profile_control_filepath'] = args.profile_control_filepath
+    settings['profile_seconds'] = args.profile_seconds
+    settings['target_expiration_ratio'] = args.target_expiration_ratio
+    settings['initial_open_hits'] = args.initial_open_hits
+
+    if args.campaigns_filepath is not None:
+        run_campaigns(load_campaigns(args.campaigns_filepath, settings,
+                                     config_filepath=args.config_filepath), seconds_to_wait)
+        return
+
     config = utils.read_config(args.config, config_filepath=args.config_filepath)
+    config.update(settings)
 
-    config['azure_connection_str'] = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-    config['azure_sas'] = os.getenv('AZURE_STORAGE_SAS')
-    config['aws_access_key'] = os.getenv("AWS_ACCESS_KEY_ID_LIT")
-    config['aws_secret_key'] = os.getenv("AWS_SECRET_ACCESS_KEY_LIT")
+    if args.record_cassette is not None:
+        config['cassette'] = Cassette(args.record_cassette)
+    elif args.replay_cassette is not None:
+        config['cassette'] = Cassette(
+            args.replay_cassette, mode=REPLAY, replay_latency=args.replay_latency)
 
-    run_hits(args.hit_count, args.template_filepath, config)
+    # The cassette is closed on exit, also if the script is interrupted
+    with config.get('cassette') or contextlib.nullcontext():
+        run_hits(args.hit_count, args.template_filepath, config, seconds_to_wait)
 
 
 if __name__ == '__main__':
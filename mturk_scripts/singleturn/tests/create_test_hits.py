@@ -5,8 +5,10 @@ New blobs may be created if any hit is submitted.
 
 All hits will have turn type "test_hit", stored in field RequesterAnnotation.
 Use corresponding remove_test_hits.py to eliminate all created hits, regardless of their
-review status.
+review status. To create thousands of hits and measure each stage of their creation, use
+`generate_load.py`.
 """
+import argparse
 import dotenv
 import os
 import sys
@@ -29,7 +31,15 @@ from common import utils, logger  # noqa: E402
 _LOGGER = logger.get_logger(__name__)
 
 
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hit_count', type=int, default=3,
+                        help='Number of test hits to create.')
+    return parser.parse_args()
+
+
 def main():
+    args = read_args()
 
     config = utils.read_config("sandbox", config_filepath='../env_configs.json')
     # Create hits without qualifiers
@@ -41,7 +51,7 @@ def main():
     config['aws_access_key'] = os.getenv("AWS_ACCESS_KEY_ID_LIT")
     config['aws_secret_key'] = os.getenv("AWS_SECRET_ACCESS_KEY_LIT")
 
-    hit_count = 3
+    hit_count = args.hit_count
 
     with SingleTurnGameStorage(**config) as game_storage:
         turn_type = 'builder-normal'
@@ -0,0 +1,184 @@
+"""Validation rules of the assignments of single turn builder HITs.
+
+The rules are run by a `ValidationPipeline`, see `validation_pipeline`. The instruction and
+the worker reputation are saved in the assignment dictionary by annotating rules, and read by
+the others, so the keys of the dictionary are the same as with the previous single
+verification function:
+
+* 'InputInstruction': the instruction written by the worker, or None.
+* 'FastPath': whether the worker is trusted and the expensive checks are skipped.
+* 'DuplicateOf': keys of the previous instructions similar to this one.
+* 'ChangedBlocks': number of blocks added or removed by the builder.
+"""
+import os
+import sys
+
+from typing import Any, Dict, List, Optional, Set
+
+# Project root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from validation_pipeline import BatchValidationRule, ValidationRule  # noqa: E402
+from common import logger, utils  # noqa: E402
+
+_LOGGER = logger.get_logger(__name__)
+
+
+class InstructionExtractionRule(ValidationRule):
+    """Saves the instruction of the answer in `assignment_dict['InputInstruction']`.
+
+    The HIT manager parses the response and stores it in the 'Answer' key, as a single
+    field or a list of fields depending on the layout used to create the HIT.
+    """
+
+    name = 'instruction_extraction'
+    cost_seconds = 1e-6
+    annotates = True
+
+    def check(self, assignment_dict: Dict[str, Any]) -> bool:
+        answer_list = assignment_dict['Answer']
+        if not isinstance(answer_list, list):
+            answer_list = [answer_list]
+
+        input_instruction = None
+        for answer_field in answer_list:
+            if answer_field['QuestionIdentifier'] == 'InputInstructionSingleTurn':
+                input_instruction = answer_field['FreeText']
+                break
+        assignment_dict['InputInstruction'] = input_instruction
+        return True
+
+
+class WorkerReputationRule(ValidationRule):
+    """Sets `assignment_dict['FastPath']` for the trusted workers of @worker_stats.
+
+    Args:
+        worker_stats (WorkerStatsStore): statistics of the workers, or None to trust nobody.
+    """
+
+    name = 'worker_reputation'
+    cost_seconds = 1e-6
+    annotates = True
+
+    def __init__(self, worker_stats=None) -> None:
+        self.worker_stats = worker_stats
+
+    def check(self, assignment_dict: Dict[str, Any]) -> bool:
+        assignment_dict['FastPath'] = (
+            self.worker_stats is not None and
+            self.worker_stats.use_fast_path(assignment_dict['WorkerId']))
+        return True
+
+
+class InstructionLengthRule(ValidationRule):
+    """Rejects missing instructions and instructions of @min_length characters or less."""
+
+    name = 'instruction_length'
+    cost_seconds = 1e-6
+
+    def __init__(self, min_length: int = 5) -> None:
+        self.min_length = min_length
+
+    def check(self, assignment_dict: Dict[str, Any]) -> bool:
+        input_instruction = assignment_dict.get('InputInstruction')
+        return input_instruction is not None and len(input_instruction.strip()) > self.min_length
+
+
+class EnglishLanguageRule(ValidationRule):
+    """Rejects the instructions not detected as English, skipped for trusted workers."""
+
+    name = 'english_language'
+    cost_seconds = 0.01
+    skips_fast_path = True
+
+    def check(self, assignment_dict: Dict[str, Any]) -> bool:
+        return utils.is_english(assignment_dict.get('InputInstruction'))
+
+
+class DuplicateInstructionRule(ValidationRule):
+    """Rejects the instructions similar to a previous one of @duplicate_index.
+
+    The keys of the similar instructions are saved in `assignment_dict['DuplicateOf']`, and
+    the new instruction is added to the index. The rule is stateful, so it runs in the sweep
+    after all the others, batch rules included, and only indexes the instructions that passed
+    them.
+
+    Args:
+        duplicate_index (InstructionDuplicateIndex): index of the previous instructions.
+    """
+
+    name = 'duplicate_instruction'
+    cost_seconds = 0.001
+    stateful = True
+
+    def __init__(self, duplicate_index) -> None:
+        self.duplicate_index = duplicate_index
+
+    def check(self, assignment_dict: Dict[str, Any]) -> bool:
+        input_instruction = assignment_dict.get('InputInstruction')
+        if input_instruction is None:
+            return True
+        duplicates = self.duplicate_index.find_duplicates(input_instruction)
+        assignment_dict['DuplicateOf'] = [key for key, _ in duplicates]
+        self.duplicate_index.add(str(assignment_dict.get('HITId')), input_instruction)
+        if len(duplicates) > 0:
+            _LOGGER.info(f"Instruction {input_instruction} duplicated in {duplicates[0][0]}")
+            return False
+        return True
+
+
+class WorldChangesRule(BatchValidationRule):
+    """Rejects the assignments whose builder did not change enough blocks.
+
+    The starting and resulting worlds of all the assignments of a sweep are retrieved in
+    batch. The number of changed blocks is saved in `assignment_dict['ChangedBlocks']`.
+
+    Args:
+        game_storage (SingleTurnGameStorage): storage with the turns of the HITs.
+        result_container_name (str): name of the container with the HIT results.
+        min_changed_blocks (int): minimum number of added plus removed blocks.
+        hit_type (str): type of the HITs, if known, to read their turns from fewer partitions.
+    """
+
+    name = 'world_changes'
+    cost_seconds = 0.1
+    skips_fast_path = True
+
+    def __init__(self, game_storage, result_container_name: str, min_changed_blocks: int = 1,
+                 hit_type: Optional[str] = None) -> None:
+        self.game_storage = game_storage
+        self.result_container_name = result_container_name
+        self.min_changed_blocks = min_changed_blocks
+        self.hit_type = hit_type
+
+    def check_batch(self, assignments: Dict[str, Dict[str, Any]]) -> Set[str]:
+        turns = self.game_storage.retrieve_turns(list(assignments.keys()), hit_type=self.hit_type)
+        changed_blocks = self.game_storage.count_changed_blocks(
+            list(turns.values()), self.result_container_name)
+
+        rejected_hit_ids = set()
+        for hit_id, assignment_dict in assignments.items():
+            assignment_dict['ChangedBlocks'] = changed_blocks.get(hit_id)
+            if (assignment_dict['ChangedBlocks'] is not None and
+                    assignment_dict['ChangedBlocks'] < self.min_changed_blocks):
+                _LOGGER.info(f"Only {assignment_dict['ChangedBlocks']} blocks changed for HIT "
+                             f"{hit_id}", extra={'hit_id': hit_id})
+                rejected_hit_ids.add(hit_id)
+        return rejected_hit_ids
+
+
+def assignment_rules(duplicate_index=None, worker_stats=None) -> List[ValidationRule]:
+    """Rules checked on each assignment when it is submitted, except for the stateful duplicate
+    rule, checked in the sweep after the batch rules.
+
+    Args:
+        duplicate_index (InstructionDuplicateIndex): optional index of previous instructions,
+            to reject the near-duplicate ones.
+        worker_stats (WorkerStatsStore): optional statistics of the workers, to skip the
+            expensive checks for the trusted ones.
+    """
+    rules = [InstructionExtractionRule(), WorkerReputationRule(worker_stats),
+             InstructionLengthRule(), EnglishLanguageRule()]
+    if duplicate_index is not None:
+        rules.append(DuplicateInstructionRule(duplicate_index))
+    return rules
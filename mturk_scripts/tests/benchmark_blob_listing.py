@@ -0,0 +1,128 @@
+"""Measure the listing of a large starting structures container, flat and sharded.
+
+A fake container returns pages of `--page_size` blobs after `--page_latency_ms`, as the
+Azure service does. The same blobs are listed with a single paged `list_blobs`, and with
+`blob_listing.iter_blob_names`, and the time and peak memory of each listing are reported.
+
+    python tests/benchmark_blob_listing.py --games 20000 --workers 16
+"""
+import argparse
+import bisect
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from blob_listing import iter_blob_names  # noqa: E402
+
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--games', type=int, default=20000,
+                        help='Number of game directories in the container.')
+    parser.add_argument('--steps', type=int, default=10,
+                        help='Step files in each game directory, each with a screenshot.')
+    parser.add_argument('--page_size', type=int, default=5000,
+                        help='Blobs in each page of a listing.')
+    parser.add_argument('--page_latency_ms', type=float, default=150,
+                        help='Time to return each page of a listing.')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='Shards listed at the same time.')
+    return parser.parse_args()
+
+
+class LatencyContainerClient:
+    """Sorted blob names, listed in pages that each take @page_latency seconds."""
+
+    def __init__(self, names, page_size, page_latency):
+        self.names = sorted(names)
+        self.page_size = page_size
+        self.page_latency = page_latency
+
+    def _pages(self, names):
+        for start in range(0, len(names), self.page_size):
+            time.sleep(self.page_latency)
+            yield names[start:start + self.page_size]
+
+    def _matching(self, name_starts_with):
+        # Names are sorted, the ones with the prefix are contiguous
+        start = bisect.bisect_left(self.names, name_starts_with)
+        end = bisect.bisect_left(self.names, name_starts_with + '\uffff')
+        return self.names[start:end]
+
+    def list_blobs(self, name_starts_with=''):
+        container = self
+
+        class Pager:
+            def __iter__(self):
+                for page in container._pages(container._matching(name_starts_with)):
+                    for name in page:
+                        yield types.SimpleNamespace(name=name)
+
+            def by_page(self):
+                pages = container._pages(container._matching(name_starts_with))
+
+                class Pages:
+                    continuation_token = None
+
+                    def __iter__(self):
+                        return self
+
+                    def __next__(self):
+                        page = next(pages)
+                        # A token is returned while there are more pages
+                        self.continuation_token = 'next' if len(page) == container.page_size \
+                            else None
+                        return [types.SimpleNamespace(name=name) for name in page]
+                return Pages()
+        return Pager()
+
+    def walk_blobs(self, name_starts_with='', delimiter='/'):
+        items = []
+        for name in self._matching(name_starts_with):
+            remainder = name[len(name_starts_with):]
+            if delimiter not in remainder:
+                items.append(name)
+                continue
+            directory = name_starts_with + remainder.split(delimiter)[0] + delimiter
+            if len(items) == 0 or items[-1] != directory:
+                items.append(directory)
+        for page in self._pages(items):
+            for name in page:
+                yield types.SimpleNamespace(name=name)
+
+
+def measure(name, function):
+    start_time = time.perf_counter()
+    count = function()
+    seconds = time.perf_counter() - start_time
+    # Memory is traced in a second run, tracing slows down the listing threads
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:<10} {count:>9} blobs {seconds:8.2f} s {peak / 2 ** 20:8.1f} MB peak')
+
+
+def main():
+    args = read_args()
+    names = []
+    for game in range(1, args.games + 1):
+        for step in range(2, 2 * args.steps + 2, 2):
+            names.append(f'builder-data/{game}-c{game % 150}/step-{step}')
+            names.append(f'builder-data/{game}-c{game % 150}/step-{step}_north.png')
+    container_client = LatencyContainerClient(
+        names, args.page_size, args.page_latency_ms / 1000)
+
+    measure('flat', lambda: len([
+        blob.name for blob in container_client.list_blobs(name_starts_with='builder-data')
+        if not blob.name.endswith('.png')]))
+    measure('sharded', lambda: sum(1 for _ in iter_blob_names(
+        container_client, 'builder-data', ['.png'], max_workers=args.workers)))
+
+
+if __name__ == '__main__':
+    main()
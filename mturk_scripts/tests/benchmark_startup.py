@@ -0,0 +1,80 @@
+"""Measure the cold start time of the collection entry points.
+
+Each module is imported in a new interpreter several times with `python -X importtime`,
+and the median wall time is reported together with the slowest packages of the last run.
+
+    python tests/benchmark_startup.py --repeats 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from typing import Dict, List, Tuple
+
+MTURK_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ENTRY_POINTS = [
+    'common.delete_hits',
+    'hit_manager',
+    'game_storage',
+    'singleturn.singleturn_games_storage',
+    'singleturn.run_data_collection',
+]
+
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='Number of interpreters started for each module.')
+    parser.add_argument('--top', type=int, default=5,
+                        help='Number of slowest packages shown for each module.')
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS,
+                        help='Modules to import, relative to the mturk_scripts directory.')
+    return parser.parse_args()
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Returns the cumulative import microseconds of each top level package."""
+    package_times: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        package_times[package] = max(package_times.get(package, 0), int(cumulative))
+    return package_times
+
+
+def measure_startup(module_name: str, repeats: int) -> Tuple[List[float], str]:
+    wall_times = []
+    stderr = ''
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+            cwd=MTURK_SCRIPTS_DIR, capture_output=True, text=True, check=True)
+        wall_times.append(time.perf_counter() - start_time)
+        stderr = process.stderr
+    return wall_times, stderr
+
+
+def main():
+    args = read_args()
+    for module_name in args.modules:
+        wall_times, stderr = measure_startup(module_name, args.repeats)
+        print(f'{module_name}: median {statistics.median(wall_times) * 1000:.0f} ms, '
+              f'min {min(wall_times) * 1000:.0f} ms over {args.repeats} runs')
+        package_times = parse_importtime(stderr)
+        # The interpreter start up and the packages of this repository are not reported
+        for package in ('site', 'encodings', module_name.split('.')[0]):
+            package_times.pop(package, None)
+        slowest_packages = sorted(package_times.items(), key=lambda item: -item[1])
+        for package, cumulative in slowest_packages[:args.top]:
+            print(f'    {cumulative / 1000:8.1f} ms  {package}')
+
+
+if __name__ == '__main__':
+    main()
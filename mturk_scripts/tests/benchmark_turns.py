@@ -0,0 +1,103 @@
+"""Measure the hydration of hits table rows into turns and back.
+
+Synthetic rows similar to the hits table are converted to turns one by one, in bulk and
+in columnar form, and back to database entries. The time and the memory allocated by each
+form are reported.
+
+    python tests/benchmark_turns.py --rows 1000000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from singleturn.singleturn_games_storage import (  # noqa: E402
+    SingleTurnDatasetColumns, SingleTurnDatasetTurn)
+
+CONTAINER_NAME = 'mturk-vw'
+
+
+def read_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='Number of synthetic rows.')
+    parser.add_argument('--starting_worlds', type=int, default=5000,
+                        help='Number of distinct starting worlds in the rows.')
+    parser.add_argument('--trace_memory', action='store_true', default=False,
+                        help='Measure allocated memory, which makes every form slower.')
+    return parser.parse_args()
+
+
+def create_rows(row_count, starting_world_count):
+    rows = []
+    for i in range(row_count):
+        world_index = i % starting_world_count
+        rows.append({
+            'PartitionKey': f'game-{i}',
+            'RowKey': f'3V7ICJJAZA{i:020d}',
+            'HitType': 'builder-normal',
+            'InitializedWorldStructureId': f'c{world_index % 150}',
+            'InitializedWorldPath':
+                f'{CONTAINER_NAME}/builder-data/{world_index}-c{world_index % 150}/step-2',
+            'IsHITQualified': True,
+            'WorkerId': f'A{i % 700:012d}',
+            'ActionDataPath': f'mturk-single-turn/builder-data/actionHit/game-{i}',
+            'InputInstruction': 'Place a red block on top of the blue one',
+        })
+    return rows
+
+
+def measure(name, function, trace_memory):
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start_time
+    memory = ''
+    if trace_memory:
+        current_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory = f', {current_bytes / 2 ** 20:8.1f} MiB'
+    print(f'{name:<46} {seconds:7.2f} s{memory}')
+    return result
+
+
+def main():
+    args = read_args()
+    rows = create_rows(args.rows, args.starting_worlds)
+    print(f'{args.rows} rows, {args.starting_worlds} starting worlds')
+
+    turns = measure(
+        'from_database_entry per row',
+        lambda: [SingleTurnDatasetTurn.from_database_entry(row) for row in rows],
+        args.trace_memory)
+    measure(
+        'to_database_entry per turn',
+        lambda turns=turns: [turn.to_database_entry(CONTAINER_NAME) for turn in turns],
+        args.trace_memory)
+    del turns
+
+    turns = measure(
+        'from_database_entries',
+        lambda: SingleTurnDatasetTurn.from_database_entries(rows), args.trace_memory)
+    measure(
+        'to_database_entries',
+        lambda turns=turns: SingleTurnDatasetTurn.to_database_entries(turns, CONTAINER_NAME),
+        args.trace_memory)
+    del turns
+
+    columns = measure(
+        'SingleTurnDatasetColumns',
+        lambda: SingleTurnDatasetColumns.from_database_entries(rows), args.trace_memory)
+    measure(
+        'SingleTurnDatasetColumns.to_database_entries',
+        lambda: columns.to_database_entries(CONTAINER_NAME), args.trace_memory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Test the sources of hits with new submitted assignments."""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from assignment_events import (  # noqa: E402
+    DirectoryNotificationQueue, NotificationEventSource, create_notification_message)
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class NotificationEventSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.queue = DirectoryNotificationQueue(self.temporary_dir.name, poll_seconds=0.01)
+        self.clock = FakeClock()
+        self.event_source = NotificationEventSource(
+            self.queue, reconcile_seconds=600, clock=self.clock)
+
+    def tearDown(self):
+        self.temporary_dir.cleanup()
+
+    def test_directory_queue_consumes_messages(self):
+        self.queue.publish(create_notification_message('hit-1', 'assignment-1'))
+        self.queue.publish(create_notification_message('hit-2', 'assignment-2'))
+        messages = self.queue.receive(timeout=0)
+        self.assertEqual([message.body['Events'][0]['HITId'] for message in messages],
+                         ['hit-1', 'hit-2'])
+        self.assertEqual(self.queue.receive(timeout=0), [])
+        for message in messages:
+            self.queue.delete(message.receipt)
+        self.assertEqual(os.listdir(self.temporary_dir.name), [])
+
+    def test_directory_queue_returns_messages_not_deleted(self):
+        self.queue.visibility_seconds = 0
+        self.queue.publish(create_notification_message('hit-1'))
+        self.assertEqual([message.receive_count for message in self.queue.receive(timeout=0)],
+                         [1])
+        self.assertEqual([message.receive_count for message in self.queue.receive(timeout=0)],
+                         [2])
+
+    def test_only_notified_hits_reviewed_between_reconciliations(self):
+        open_hit_ids = ['hit-1', 'hit-2', 'hit-3']
+        # The first sweep reviews all open hits
+        self.assertEqual(self.event_source.hit_ids_to_review(open_hit_ids), open_hit_ids)
+        self.assertEqual(self.event_source.hit_ids_to_review(open_hit_ids), [])
+
+        self.queue.publish(create_notification_message('hit-2'))
+        self.queue.publish(create_notification_message('hit-of-other-type'))
+        self.assertEqual(self.event_source.hit_ids_to_review(open_hit_ids), ['hit-2'])
+
+        self.clock.now += 600
+        self.assertEqual(self.event_source.hit_ids_to_review(open_hit_ids), open_hit_ids)
+
+    def test_consumers_leave_messages_of_other_hits(self):
+        self.queue.visibility_seconds = 0
+        other_event_source = NotificationEventSource(
+            DirectoryNotificationQueue(self.temporary_dir.name, visibility_seconds=0),
+            reconcile_seconds=600, clock=self.clock)
+        self.event_source.hit_ids_to_review(['hit-1'])
+        other_event_source.hit_ids_to_review(['hit-2'])
+
+        self.queue.publish(create_notification_message('hit-1'))
+        self.queue.publish(create_notification_message('hit-2'))
+        # The first consumer receives both messages, and only deletes the one of its hit
+        self.assertEqual(self.event_source.hit_ids_to_review(['hit-1']), ['hit-1'])
+        self.assertEqual(other_event_source.hit_ids_to_review(['hit-2']), ['hit-2'])
+        self.assertEqual(self.event_source.hit_ids_to_review(['hit-1']), [])
+        self.assertEqual(os.listdir(self.temporary_dir.name), [])
+
+    def test_messages_of_hits_not_open_dropped(self):
+        self.queue.visibility_seconds = 0
+        self.event_source.max_receive_count = 2
+        self.event_source.hit_ids_to_review(['hit-1'])
+        self.queue.publish(create_notification_message('closed-hit'))
+
+        self.assertEqual(self.event_source.hit_ids_to_review(['hit-1']), [])
+        self.assertEqual(len(os.listdir(self.temporary_dir.name)), 1)
+        self.assertEqual(self.event_source.hit_ids_to_review(['hit-1']), [])
+        self.assertEqual(os.listdir(self.temporary_dir.name), [])
+
+    def test_wait_returns_on_notification(self):
+        self.event_source.hit_ids_to_review(['hit-1'])
+        self.queue.publish(create_notification_message('hit-1'))
+        start_time = time.monotonic()
+        self.event_source.wait(30)
+        self.assertLess(time.monotonic() - start_time, 5)
+        self.assertEqual(self.event_source.hit_ids_to_review(['hit-1']), ['hit-1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,7 +8,7 @@ from unittest import mock
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 
-from game_storage import AzureGameStorage  # noqa: E402
+from game_storage import AzureGameStorage, create_shared_transport  # noqa: E402
 
 
 @mock.patch("game_storage.TableClient")
@@ -127,5 +127,14 @@ class TestAzureGameStorage(unittest.TestCase):
         self.assertRaises(NotImplementedError, failing_function)
 
 
+class SharedTransportTest(unittest.TestCase):
+
+    def test_pool_sized_for_concurrent_requests(self):
+        transport = create_shared_transport(pool_maxsize=32)
+
+        for url in ('https://account.blob.core.windows.net', 'http://127.0.0.1:10000'):
+            self.assertEqual(transport.session.get_adapter(url)._pool_maxsize, 32)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,155 @@
+"""Test the sharded listing of the blobs of a container."""
+
+import itertools
+import os
+import sys
+import threading
+import types
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from blob_listing import iter_blob_names, shard_prefixes, walk_directories  # noqa: E402
+
+
+class PagesFake:
+
+    def __init__(self, names, page_size):
+        self.pages = [names[i:i + page_size] for i in range(0, len(names), page_size)]
+        self.continuation_token = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if len(self.pages) == 0:
+            raise StopIteration
+        page = self.pages.pop(0)
+        self.continuation_token = 'next' if len(self.pages) > 0 else None
+        return iter([types.SimpleNamespace(name=name) for name in page])
+
+
+class PagerFake:
+    """Paged iterator of blobs, as returned by `list_blobs`."""
+
+    def __init__(self, names, page_size):
+        self.names = names
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter([types.SimpleNamespace(name=name) for name in self.names])
+
+    def by_page(self):
+        return PagesFake(self.names, self.page_size)
+
+
+class ContainerClientFake:
+    """Container with the paged `list_blobs` and the `walk_blobs` of the Azure client."""
+
+    def __init__(self, names, page_size=100):
+        self.names = sorted(names)
+        self.page_size = page_size
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def list_blobs(self, name_starts_with=''):
+        with self.lock:
+            self.calls.append(('list_blobs', name_starts_with))
+        return PagerFake([name for name in self.names if name.startswith(name_starts_with)],
+                         self.page_size)
+
+    def walk_blobs(self, name_starts_with='', delimiter='/'):
+        with self.lock:
+            self.calls.append(('walk_blobs', name_starts_with))
+        items = []
+        for name in self.names:
+            if not name.startswith(name_starts_with):
+                continue
+            remainder = name[len(name_starts_with):]
+            if delimiter in remainder:
+                directory = name_starts_with + remainder.split(delimiter)[0] + delimiter
+                if len(items) == 0 or items[-1].name != directory:
+                    items.append(types.SimpleNamespace(name=directory, prefix=directory))
+            else:
+                items.append(types.SimpleNamespace(name=name))
+        return iter(items)
+
+    def call_count(self, method):
+        return len([call for call in self.calls if call[0] == method])
+
+
+def create_blob_names(game_count):
+    names = ['builder-data/index.json', 'builder-data-old/1-c1/step-2', 'other/1-c1/step-2']
+    for game in range(1, game_count + 1):
+        for step in range(2, 8, 2):
+            names.append(f'builder-data/{game}-c{game % 150}/step-{step}')
+            names.append(f'builder-data/{game}-c{game % 150}/step-{step}_north.png')
+    return names
+
+
+class BlobListingTest(unittest.TestCase):
+
+    def test_small_listing_is_not_sharded(self):
+        container_client = ContainerClientFake(create_blob_names(5), page_size=100)
+
+        names = list(iter_blob_names(container_client, 'builder-data', ['.png']))
+
+        self.assertEqual(len(names), 17)
+        self.assertEqual(container_client.calls, [('list_blobs', 'builder-data')])
+
+    def test_large_listing_yields_every_blob_once(self):
+        blob_names = create_blob_names(300)
+        container_client = ContainerClientFake(blob_names, page_size=50)
+
+        names = list(iter_blob_names(container_client, 'builder-data', max_workers=4))
+
+        self.assertEqual(sorted(names),
+                         sorted(name for name in blob_names if name.startswith('builder-data')))
+        self.assertEqual(container_client.call_count('walk_blobs'), 3)
+        self.assertGreater(container_client.call_count('list_blobs'), 10)
+
+    def test_excluded_suffixes_are_filtered_while_listing(self):
+        container_client = ContainerClientFake(create_blob_names(300), page_size=50)
+
+        names = list(iter_blob_names(container_client, 'builder-data/', ['.png']))
+
+        self.assertEqual(len(names), 300 * 3 + 1)
+        self.assertFalse(any(name.endswith('.png') for name in names))
+
+    def test_shard_prefixes_partition_directories(self):
+        directories = [f'builder-data/{game}-c{game % 150}/' for game in range(1, 1001)]
+
+        prefixes = shard_prefixes(directories, 16)
+
+        for directory in directories:
+            self.assertEqual(
+                len([prefix for prefix in prefixes if directory.startswith(prefix)]), 1)
+        self.assertGreaterEqual(len(prefixes), 16)
+        self.assertLess(len(prefixes), 200)
+
+    def test_walk_descends_to_game_directories(self):
+        container_client = ContainerClientFake(create_blob_names(20))
+
+        directories, blob_names = walk_directories(container_client, 'builder-data',
+                                                   min_directories=10)
+
+        # The prefix also selects the directories of other prefixes starting like it
+        self.assertEqual(len(directories), 21)
+        self.assertIn('builder-data/7-c7/', directories)
+        self.assertIn('builder-data-old/1-c1/', directories)
+        self.assertEqual(blob_names, ['builder-data/index.json'])
+
+    def test_stopping_early_does_not_list_remaining_shards(self):
+        container_client = ContainerClientFake(create_blob_names(300), page_size=50)
+
+        names = iter_blob_names(container_client, 'builder-data', max_workers=1,
+                                shard_count=50, queue_size=1)
+        # Past the first page of the listing, into the first shard
+        self.assertEqual(len(list(itertools.islice(names, 60))), 60)
+        names.close()
+
+        self.assertLess(container_client.call_count('list_blobs'), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
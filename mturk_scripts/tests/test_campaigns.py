@@ -0,0 +1,82 @@
+"""Test the campaign configuration and the clients shared by the campaigns."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from campaigns import SharedClients, load_campaigns  # noqa: E402
+
+ENVIRONMENTS = {
+    'production': {'mturk_endpoint': 'https://production', 'reward': '0.80'},
+    'sandbox': {'mturk_endpoint': 'https://sandbox', 'reward': '0.80'},
+}
+
+
+class CampaignsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temporary_dir.cleanup)
+        self.config_filepath = self.write_json('env_configs.json', ENVIRONMENTS)
+
+    def write_json(self, filename, content):
+        filepath = os.path.join(self.temporary_dir.name, filename)
+        with open(filepath, 'w') as json_file:
+            json.dump(content, json_file)
+        return filepath
+
+    def test_campaign_config(self):
+        filepath = self.write_json('campaigns.json', [
+            {'environment': 'production', 'hit_count': 100},
+            {'environment': 'sandbox', 'hit_type': 'builder-other', 'hit_count': 5,
+             'template_filepath': 'templates/other.xml', 'reward': '0.10'},
+        ])
+
+        campaigns = load_campaigns(filepath, {'min_changed_blocks': 1, 'reward': '0.50'},
+                                   config_filepath=self.config_filepath)
+
+        self.assertEqual([campaign.name for campaign in campaigns],
+                         ['production/builder-normal', 'sandbox/builder-other'])
+        self.assertEqual(campaigns[0].config['reward'], '0.50')
+        self.assertEqual(campaigns[1].config['reward'], '0.10')
+        self.assertEqual(campaigns[1].config['mturk_endpoint'], 'https://sandbox')
+        self.assertEqual(campaigns[1].config['min_changed_blocks'], 1)
+        self.assertEqual(campaigns[1].template_filepath, 'templates/other.xml')
+        self.assertNotIn('hit_count', campaigns[1].config)
+
+    def test_same_hit_type_and_endpoint(self):
+        filepath = self.write_json('campaigns.json', [
+            {'environment': 'sandbox', 'hit_count': 1},
+            {'environment': 'production', 'hit_count': 1},
+            {'environment': 'sandbox', 'hit_count': 1, 'template_filepath': 'other.xml'},
+        ])
+
+        with self.assertRaises(ValueError):
+            load_campaigns(filepath, {}, config_filepath=self.config_filepath)
+
+    @mock.patch('hit_manager.boto3.client')
+    @mock.patch('campaigns.create_shared_transport')
+    def test_clients_shared_by_endpoint(self, create_transport_mock, boto3_client_mock):
+        boto3_client_mock.side_effect = lambda **kwargs: mock.MagicMock()
+        shared_clients = SharedClients()
+        configs = [
+            dict(ENVIRONMENTS[environment], aws_access_key='key', aws_secret_key='secret')
+            for environment in ('production', 'sandbox', 'production')]
+
+        configs = [shared_clients.add_to_config(config) for config in configs]
+
+        self.assertIs(configs[0]['mturk_client'], configs[2]['mturk_client'])
+        self.assertIs(configs[0]['hit_sweep'], configs[2]['hit_sweep'])
+        self.assertIsNot(configs[0]['mturk_client'], configs[1]['mturk_client'])
+        self.assertEqual(boto3_client_mock.call_count, 2)
+        create_transport_mock.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
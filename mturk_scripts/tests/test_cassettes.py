@@ -0,0 +1,164 @@
+"""Test recording and replaying the calls to the MTurk and Azure clients."""
+
+import datetime
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from cassettes import REPLAY, Cassette, CassetteMissError  # noqa: E402
+from hit_manager import HITManager  # noqa: E402
+
+EXPIRATION = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+ANSWER = ('<QuestionFormAnswers><Answer><QuestionIdentifier>InputInstruction'
+          '</QuestionIdentifier><FreeText>Place a block</FreeText></Answer>'
+          '</QuestionFormAnswers>')
+
+
+class ClientFake:
+    """Client with the kinds of responses of the MTurk and Azure clients."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def list_hits(self, MaxResults):
+        self.calls += 1
+        return {'HITs': [{'HITId': 'hit-1', 'Expiration': EXPIRATION}]}
+
+    def list_assignments_for_hit(self, HITId, AssignmentStatuses):
+        self.calls += 1
+        if HITId == 'throttled':
+            raise ClientError({'Error': {'Code': 'Throttling', 'Message': 'Slow down'}},
+                              'ListAssignmentsForHIT')
+        return {'NumResults': 1, 'Assignments': [{
+            'AssignmentId': f'assignment-{HITId}', 'WorkerId': 'worker',
+            'SubmitTime': EXPIRATION, 'Answer': ANSWER}]}
+
+    def approve_assignment(self, **kwargs):
+        self.calls += 1
+        return {}
+
+    def delete_hit(self, HITId):
+        self.calls += 1
+        return {}
+
+    def query_entities(self, query_filter, select=None):
+        self.calls += 1
+        return (row for row in [{'RowKey': 'hit-1'}, {'RowKey': 'hit-2'}])
+
+    def download_blob(self, blob_name):
+        self.calls += 1
+        return mock.Mock(readall=lambda: b'{"worldEndingState": {}}')
+
+
+class CassetteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.directory.name, 'sweep.jsonl.gz')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self):
+        fake_client = ClientFake()
+        with Cassette(self.filepath) as cassette:
+            client = cassette.client('mturk', lambda: fake_client)
+            responses = [
+                client.list_hits(MaxResults=99),
+                client.list_assignments_for_hit(HITId='hit-1', AssignmentStatuses=['Submitted']),
+                list(client.query_entities(query_filter="HitType eq 'builder-normal'")),
+                client.download_blob('builder-data/1-c1/step-2').readall(),
+            ]
+            with self.assertRaises(ClientError):
+                client.list_assignments_for_hit(
+                    HITId='throttled', AssignmentStatuses=['Submitted'])
+        return fake_client, responses
+
+    def test_replay_serves_recorded_responses(self):
+        fake_client, recorded = self.record()
+        cassette = Cassette(self.filepath, mode=REPLAY, shift_times=False)
+        client = cassette.client('mturk', lambda: self.fail('Client created in replay'))
+
+        replayed = [
+            client.list_hits(MaxResults=99),
+            client.list_assignments_for_hit(HITId='hit-1', AssignmentStatuses=['Submitted']),
+            list(client.query_entities(query_filter="HitType eq 'builder-normal'")),
+            client.download_blob('builder-data/1-c1/step-2').readall(),
+        ]
+
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(replayed[0]['HITs'][0]['Expiration'], EXPIRATION)
+        self.assertEqual(fake_client.calls, 5)
+        with self.assertRaises(ClientError) as context:
+            client.list_assignments_for_hit(HITId='throttled', AssignmentStatuses=['Submitted'])
+        self.assertEqual(context.exception.response['Error']['Code'], 'Throttling')
+        with self.assertRaises(CassetteMissError):
+            client.list_hits(MaxResults=99)
+
+    def test_unmatched_calls_get_responses_of_the_same_method(self):
+        self.record()
+        cassette = Cassette(self.filepath, mode=REPLAY)
+        client = cassette.client('mturk', None)
+
+        response = client.list_hits(MaxResults=10)
+
+        self.assertEqual(response['HITs'][0]['HITId'], 'hit-1')
+        self.assertEqual(cassette.counts['unmatched'], 1)
+
+    def test_replay_shifts_times_since_recording(self):
+        self.record()
+        cassette = Cassette(self.filepath, mode=REPLAY)
+        cassette.time_shift = datetime.timedelta(days=2)
+        client = cassette.client('mturk', None)
+
+        expiration = client.list_hits(MaxResults=99)['HITs'][0]['Expiration']
+
+        self.assertEqual(expiration, EXPIRATION + datetime.timedelta(days=2))
+
+    def test_replay_interrupted_recording(self):
+        cassette = Cassette(self.filepath, flush_seconds=0)
+        client = cassette.client('mturk', ClientFake)
+        client.list_hits(MaxResults=99)
+        client.delete_hit(HITId='hit-1')
+        # The process crashed before closing the cassette, with a line partially written
+        cassette.cassette_file.write('{"service":')
+        cassette.cassette_file.flush()
+
+        replayed = Cassette(self.filepath, mode=REPLAY, shift_times=False)
+
+        self.assertEqual(replayed.method_counts(),
+                         {'mturk.list_hits': 1, 'mturk.delete_hit': 1})
+        self.assertEqual(cassette.method_counts(), replayed.method_counts())
+        # The recorded calls are only kept in the file
+        self.assertEqual(cassette.interactions, [])
+        cassette.close()
+
+    @mock.patch('hit_manager.boto3.client')
+    def test_replay_hit_manager_sweep(self, boto3_client_mock):
+        boto3_client_mock.return_value = ClientFake()
+        with Cassette(self.filepath) as cassette:
+            hit_manager = HITManager('sandbox', 'access_key', 'secret_key', cassette=cassette)
+            recorded = hit_manager.complete_open_assignments(['hit-1'])
+        boto3_client_mock.reset_mock()
+
+        cassette = Cassette(self.filepath, mode=REPLAY, shift_times=False)
+        hit_manager = HITManager('sandbox', 'access_key', 'secret_key', cassette=cassette)
+        replayed = hit_manager.complete_open_assignments(['hit-1'])
+
+        boto3_client_mock.assert_not_called()
+        self.assertEqual(json.dumps(replayed, default=str), json.dumps(recorded, default=str))
+        self.assertEqual(cassette.method_counts(), {
+            'mturk.list_assignments_for_hit': 1, 'mturk.approve_assignment': 1,
+            'mturk.delete_hit': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
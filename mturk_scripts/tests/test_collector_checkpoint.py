@@ -0,0 +1,66 @@
+"""Test saving and restoring the state of the collection loop."""
+
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from assignment_events import PollingEventSource  # noqa: E402
+from collector_checkpoint import CollectorCheckpoint  # noqa: E402
+from hit_manager import HITManager  # noqa: E402
+
+
+@mock.patch('hit_manager.boto3.client')
+class CollectorCheckpointTest(unittest.TestCase):
+
+    def create_hit_manager(self):
+        return HITManager(mturk_endpoint='sandbox', aws_access_key='access_key',
+                          aws_secret_key='secret_key',
+                          event_source=PollingEventSource(poll_seconds=60))
+
+    def test_restore_session_hits_and_poll_times(self, boto3_client_mock):
+        mturk_client = boto3_client_mock.return_value
+        mturk_client.create_hit.side_effect = [
+            {'HIT': {'HITId': 'hit-1'}}, {'HIT': {'HITId': 'hit-2'}}]
+        hit_manager = self.create_hit_manager()
+        hit_manager.create_hit('template', hit_lifetime_seconds=3600)
+        hit_manager.create_hit('template', hit_lifetime_seconds=3600)
+        self.assertEqual(hit_manager.hit_ids_to_review(['hit-1', 'hit-2']), ['hit-1', 'hit-2'])
+        hit_manager.processed_assignment_ids.append('assignment-0')
+
+        with tempfile.TemporaryDirectory() as temporary_dir:
+            checkpoint = CollectorCheckpoint(os.path.join(temporary_dir, 'checkpoint.json'))
+            checkpoint.save(hit_manager)
+
+            restarted_hit_manager = self.create_hit_manager()
+            self.assertTrue(checkpoint.restore(restarted_hit_manager))
+
+        # The hits are not listed by mturk yet, but they are known from the checkpoint
+        mturk_client.list_hits.return_value = {'HITs': []}
+        open_hit_ids = restarted_hit_manager.get_open_hit_ids('builder-normal')
+        self.assertEqual(set(open_hit_ids), {'hit-1', 'hit-2'})
+        # Reviewed less than poll_seconds ago
+        self.assertEqual(restarted_hit_manager.hit_ids_to_review(open_hit_ids), [])
+        self.assertIn('assignment-0', restarted_hit_manager.processed_assignment_ids)
+
+    def test_expired_session_hits_dropped(self, boto3_client_mock):
+        mturk_client = boto3_client_mock.return_value
+        mturk_client.list_hits.return_value = {'HITs': []}
+        hit_manager = self.create_hit_manager()
+        hit_manager.session_open_hits.add('hit-1')
+        hit_manager.session_hit_expirations['hit-1'] = (
+            datetime.datetime.now() - datetime.timedelta(seconds=1)).timestamp()
+        self.assertEqual(hit_manager.get_open_hit_ids('builder-normal'), [])
+
+    def test_missing_checkpoint(self, _):
+        checkpoint = CollectorCheckpoint('does_not_exist.json')
+        self.assertFalse(checkpoint.restore(self.create_hit_manager()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Test weighted sampling of structures by number of turns."""
+
+import collections
+import os
+import random
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from common.coverage_sampler import CoverageSampler, FenwickTree  # noqa: E402
+
+
+class FenwickTreeTest(unittest.TestCase):
+
+    def test_prefix_sums_and_updates(self):
+        weights = [1.0, 2.0, 0.0, 4.0, 3.0]
+        tree = FenwickTree(weights)
+        for i in range(len(weights) + 1):
+            self.assertAlmostEqual(tree.prefix_sum(i), sum(weights[:i]))
+
+        tree.add(2, 5.0)
+        self.assertAlmostEqual(tree.total(), 15.0)
+        self.assertAlmostEqual(tree.prefix_sum(3), 8.0)
+
+    def test_find(self):
+        tree = FenwickTree([1.0, 2.0, 0.0, 4.0])
+        self.assertEqual(tree.find(0.5), 0)
+        self.assertEqual(tree.find(1.0), 1)
+        self.assertEqual(tree.find(2.9), 1)
+        # Index 2 has no weight and is never returned
+        self.assertEqual(tree.find(3.0), 3)
+        self.assertEqual(tree.find(6.9), 3)
+
+
+class CoverageSamplerTest(unittest.TestCase):
+
+    def test_under_covered_structures_drawn_first(self):
+        sampler = CoverageSampler(
+            {'c1': 50, 'c2': 50, 'c3': 0}, exponent=2.0, rng=random.Random(0))
+        draws = collections.Counter(sampler.sample() for _ in range(1000))
+        self.assertGreater(draws['c3'], 990)
+
+    def test_increment_balances_counts(self):
+        sampler = CoverageSampler(
+            {'c1': 5, 'c2': 0, 'c3': 0}, exponent=4.0, rng=random.Random(0))
+        for _ in range(12):
+            sampler.increment(sampler.sample())
+        counts = [sampler.count(structure_id) for structure_id in ['c1', 'c2', 'c3']]
+        self.assertEqual(sum(counts), 17)
+        self.assertLessEqual(max(counts) - min(counts), 2)
+
+    def test_excluded_structures_not_drawn(self):
+        sampler = CoverageSampler(
+            {'c1': 0, 'c2': 0, 'c3': 9}, exponent=2.0, rng=random.Random(0))
+        sampler.exclude('c1')
+        sampler.increment('c1', 99)
+        self.assertEqual({sampler.sample() for _ in range(100)}, {'c2', 'c3'})
+        sampler.exclude('c2')
+        sampler.exclude('c3')
+        self.assertIsNone(sampler.sample())
+
+        sampler.restore()
+
+        # c1 is back with the weight of its new count
+        self.assertAlmostEqual(sampler.tree.total(), 1 + 1 / 100 + 1 / 10000)
+
+    def test_empty_sampler(self):
+        self.assertIsNone(CoverageSampler({}).sample())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Test the stages of the synthetic load generator with the local stand-ins."""
+
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from hit_manager import HITManager  # noqa: E402
+from singleturn.builder_template_renderer import BuilderTemplateRenderer  # noqa: E402
+from singleturn.generate_load import (  # noqa: E402
+    TEST_TEMPLATE_FILEPATH, LoadGenerator, LocalBackend, arrival_offsets,
+    create_delay_sampler, synthetic_world_names)
+from singleturn.singleturn_games_storage import SingleTurnGameStorage  # noqa: E402
+
+
+class LoadGeneratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = LocalBackend(synthetic_world_names('test-builder-data', 50),
+                                    rng=random.Random(0))
+        self.config = {
+            'hits_table_name': 'LoadTestHits', 'azure_connection_str': 'local',
+            'azure_sas': 'local', 'starting_structures_container_name': 'mturk-vw',
+            'starting_structures_blob_prefix': 'test-builder-data',
+            'result_structures_container_name': 'mturk-single-turn',
+            'mturk_endpoint': 'local', 'aws_access_key': 'local', 'aws_secret_key': 'local',
+            'cassette': self.backend,
+        }
+
+    def run_load(self, turn_count, sample_delay, **kwargs):
+        with SingleTurnGameStorage(**self.config) as game_storage:
+            load_generator = LoadGenerator(
+                game_storage, HITManager(**self.config),
+                BuilderTemplateRenderer(TEST_TEMPLATE_FILEPATH), self.config, sample_delay,
+                submit=self.backend.submit, **kwargs)
+            load_generator.run(arrival_offsets(turn_count, 1000, 'constant'),
+                               sample_seconds=0.001)
+        return load_generator
+
+    def test_arrival_offsets(self):
+        constant = list(arrival_offsets(4, 2.0, 'constant'))
+        poisson = list(arrival_offsets(2000, 100.0, 'poisson', rng=random.Random(0)))
+
+        self.assertEqual(constant, [0.0, 0.5, 1.0, 1.5])
+        self.assertEqual(len(poisson), 2000)
+        self.assertEqual(poisson, sorted(poisson))
+        self.assertAlmostEqual(poisson[-1], 20.0, delta=2.0)
+
+    def test_delay_sampler_abandons_fraction(self):
+        sample_delay = create_delay_sampler('lognormal', 10.0, abandon_fraction=0.25,
+                                            rng=random.Random(0))
+        delays = [sample_delay() for _ in range(4000)]
+        submitted = [delay for delay in delays if delay is not None]
+
+        self.assertAlmostEqual(len(submitted) / len(delays), 0.75, delta=0.03)
+        self.assertAlmostEqual(sum(submitted) / len(submitted), 10.0, delta=1.5)
+        self.assertEqual(create_delay_sampler('constant', 2.0)(), 2.0)
+
+    def test_turns_go_through_every_stage(self):
+        load_generator = self.run_load(20, create_delay_sampler('constant', 0.01))
+
+        table = self.backend.tables['table:LoadTestHits']
+        self.assertEqual(len(table.entities), 20)
+        self.assertTrue(all(entity['InputInstruction'] != 'NA'
+                            for entity in table.entities.values()))
+        for stage in load_generator.stages + [load_generator.review_stage]:
+            self.assertEqual(stage.service_stats.summary()['count'], 20, stage.name)
+            self.assertEqual(stage.service_stats.error_count, 0, stage.name)
+        # Reviewed HITs are deleted
+        self.assertEqual(len(self.backend.mturk_client.hits), 0)
+        self.assertIn('review', load_generator.report())
+
+    def test_abandoned_hits_are_not_reviewed(self):
+        load_generator = self.run_load(10, create_delay_sampler('constant', 0.0, 1.0))
+
+        self.assertEqual(load_generator.scheduler.abandoned_count, 10)
+        self.assertEqual(load_generator.review_stage.service_stats.summary()['count'], 0)
+        self.assertEqual(len(self.backend.mturk_client.hits), 10)
+
+    def test_slow_stage_backs_up(self):
+        load_generator = LoadGenerator(None, None, None, self.config, lambda: None)
+        load_generator.stages[2].function = lambda item: (time.sleep(0.005), [item])[1]
+        for stage in load_generator.stages:
+            if stage.name != 'create_hit':
+                stage.function = lambda item: [item]
+        load_generator.stages[2].workers = 1
+
+        load_generator.run(arrival_offsets(40, 2000, 'constant'), sample_seconds=0.001)
+
+        self.assertEqual(load_generator.backed_up_stage().name, 'create_hit')
+        self.assertIn('Queue backs up before create_hit', load_generator.report())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Test the colors of the blocks drawn by the grid visualization."""
+
+import os
+import sys
+import unittest
+
+from unittest import mock
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from utils import grid_visualization  # noqa: E402
+
+AIR = (0, 0, 0, 0)
+
+
+class GridVisualizationTest(unittest.TestCase):
+
+    def draw_colors(self, voxel):
+        """Face colors by (x, z, height) of the blocks of @voxel drawn on a mocked axes."""
+        ax = mock.MagicMock()
+        grid_visualization._draw_grid(ax, voxel)
+        return ax.voxels.call_args.kwargs['facecolors']
+
+    def test_known_blocks_colored(self):
+        voxel = np.zeros((1, 2, 2), dtype=np.int8)
+        voxel[0, 0, 1] = 3
+
+        colors = self.draw_colors(voxel)
+
+        self.assertEqual(tuple(colors[0, 1, 0]), (1, 0, 0, 1))
+        self.assertEqual(tuple(colors[0, 0, 0]), AIR)
+
+    def test_unknown_blocks_drawn_as_air(self):
+        voxel = np.array([[[-1, 7], [-2, 1]]], dtype=np.int8)
+
+        colors = self.draw_colors(voxel)
+
+        # Negative ids would be the last colors of the lookup table
+        self.assertEqual(tuple(colors[0, 0, 0]), AIR)
+        self.assertEqual(tuple(colors[0, 1, 0]), AIR)
+        self.assertEqual(tuple(colors[1, 0, 0]), AIR)
+        self.assertEqual(tuple(colors[1, 1, 0]), (0, 0, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Test the leases of the shards of open HITs between several collectors."""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from hit_leases import InMemoryLeaseStore, Lease, ShardLeaseManager  # noqa: E402
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ShardLeaseManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = InMemoryLeaseStore()
+        self.clock = FakeClock()
+
+    def create_manager(self, owner_id, shard_count=4):
+        return ShardLeaseManager(self.store, shard_count, owner_id=owner_id,
+                                 lease_seconds=60, clock=self.clock)
+
+    def test_single_collector_owns_all_shards(self):
+        manager = self.create_manager('a')
+        self.assertEqual(manager.refresh(), {0, 1, 2, 3})
+        hit_ids = [f'hit{i}' for i in range(20)]
+        self.assertEqual(manager.filter_hit_ids(hit_ids), hit_ids)
+
+    def test_new_collector_gets_fair_share(self):
+        manager_a = self.create_manager('a')
+        manager_b = self.create_manager('b')
+        manager_a.refresh()
+        # The second collector only registers, all shards are still leased
+        self.assertEqual(manager_b.refresh(), set())
+        self.assertEqual(len(manager_a.refresh()), 2)
+        self.assertEqual(len(manager_b.refresh()), 2)
+        self.assertEqual(manager_a.owned_shards & manager_b.owned_shards, set())
+
+        hit_ids = [f'hit{i}' for i in range(50)]
+        hits_a = manager_a.filter_hit_ids(hit_ids)
+        hits_b = manager_b.filter_hit_ids(hit_ids)
+        self.assertEqual(sorted(hits_a + hits_b), sorted(hit_ids))
+
+    def test_expired_leases_taken_over(self):
+        manager_a = self.create_manager('a')
+        manager_b = self.create_manager('b')
+        manager_a.refresh()
+        manager_b.refresh()
+        manager_a.refresh()
+        manager_b.refresh()
+
+        # Collector a stops renewing its leases
+        self.clock.now += 30
+        self.assertEqual(len(manager_b.refresh()), 2)
+        self.clock.now += 45
+        self.assertEqual(manager_b.refresh(), {0, 1, 2, 3})
+
+    def test_release(self):
+        manager_a = self.create_manager('a')
+        manager_b = self.create_manager('b')
+        manager_a.refresh()
+        manager_a.release()
+        self.assertEqual(manager_b.refresh(), {0, 1, 2, 3})
+
+    def test_concurrent_write_rejected(self):
+        previous = self.store.try_write(Lease('shard-0', 'a', 10), None)
+        self.assertIsNotNone(self.store.try_write(Lease('shard-0', 'b', 20), previous))
+        self.assertIsNone(self.store.try_write(Lease('shard-0', 'c', 20), previous))
+        self.assertIsNone(self.store.try_write(Lease('shard-0', 'c', 20), None))
+
+
+if __name__ == '__main__':
+    unittest.main()
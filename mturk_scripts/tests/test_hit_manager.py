@@ -11,7 +11,7 @@ from unittest import mock
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 
-from hit_manager import HITManager  # noqa: E402
+from hit_manager import HITManager, HitSweep  # noqa: E402
 
 
 class MturkClientFake(mock.MagicMock):
@@ -20,12 +20,17 @@ class MturkClientFake(mock.MagicMock):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.hits = {}
+        self.assignments = {}
 
-    def list_hits(self, *args, **kwargs):
+    def list_hits(self, MaxResults=100, NextToken=None):
+        """Pages of @MaxResults HITs, the token being the index of the first HIT of the page."""
+        start = int(NextToken or 0)
+        hits = list(self.hits.values())[start:start + MaxResults]
+        end = start + len(hits)
         return {
-            'NextToken': '',
-            'NumResults': len(self.hits),
-            'HITs': [hit for hit in self.hits.values()]
+            'NextToken': str(end) if end < len(self.hits) else '',
+            'NumResults': len(hits),
+            'HITs': hits
         }
 
     def create_hit(
@@ -66,6 +71,31 @@ class MturkClientFake(mock.MagicMock):
             'RequesterAnnotation': json.dumps({'hit_type': hit_type}),
         }
 
+    def create_mock_assignment(
+            self, hit_id, assignment_id, worker_id: str = 'worker',
+            instruction: str = 'Place a red block on top of the tower'):
+        """Creates a submitted assignment with a single free text answer."""
+        answer = (
+            '<QuestionFormAnswers><Answer>'
+            '<QuestionIdentifier>InputInstructionSingleTurn</QuestionIdentifier>'
+            f'<FreeText>{instruction}</FreeText>'
+            '</Answer></QuestionFormAnswers>')
+        self.assignments.setdefault(hit_id, []).append({
+            'AssignmentId': assignment_id,
+            'WorkerId': worker_id,
+            'HITId': hit_id,
+            'AssignmentStatus': 'Submitted',
+            'Answer': answer,
+        })
+
+    def list_assignments_for_hit(self, HITId, *args, **kwargs):
+        assignments = self.assignments.get(HITId, [])
+        return {
+            'NextToken': '',
+            'NumResults': len(assignments),
+            'Assignments': assignments,
+        }
+
 
 @mock.patch('hit_manager.boto3.client')
 class HitManagerTest(unittest.TestCase):
@@ -139,6 +169,131 @@ class HitManagerTest(unittest.TestCase):
         hit_ids = hit_manager.get_open_hit_ids(self.HIT_TYPE)
         self.assertEqual(set(hit_ids), set(expected_hit_ids))
 
+    def test_sweep_verification_before_closing(self, boto3_client_mock: mock.MagicMock):
+        """The sweep verification receives all assignments before any of them is closed."""
+        fake_mturk_client = MturkClientFake()
+        boto3_client_mock.return_value = fake_mturk_client
+        for hit_id in range(3):
+            fake_mturk_client.create_mock_hit(hit_id, hit_type=self.HIT_TYPE)
+        fake_mturk_client.create_mock_assignment(0, 'assignment-0')
+        fake_mturk_client.create_mock_assignment(2, 'assignment-2')
+
+        def sweep_verification_function(assignments):
+            fake_mturk_client.approve_assignment.assert_not_called()
+            self.assertEqual(set(assignments.keys()), {0, 2})
+            assignments[2]['IsHITQualified'] = False
+
+        hit_manager = HITManager(
+            mturk_endpoint="sandbox",
+            aws_access_key=self.AWS_ACCESS_KEY,
+            aws_secret_key=self.AWS_SECRET_KEY,
+            verification_function=lambda assignment_dict: True,
+            sweep_verification_function=sweep_verification_function,
+        )
+        results = hit_manager.complete_open_assignments([0, 1, 2])
+
+        self.assertTrue(results[0]['IsHITQualified'])
+        self.assertFalse(results[2]['IsHITQualified'])
+        self.assertEqual(results[2]['AssignmentId'], 'assignment-2')
+        self.assertEqual(fake_mturk_client.approve_assignment.call_count, 2)
+        self.assertEqual(fake_mturk_client.delete_hit.call_count, 2)
+
+    def test_open_hits_of_all_pages(self, boto3_client_mock: mock.MagicMock):
+        fake_mturk_client = MturkClientFake()
+        boto3_client_mock.return_value = fake_mturk_client
+        for hit_id in range(7):
+            fake_mturk_client.create_mock_hit(hit_id, hit_type=self.HIT_TYPE)
+        hit_manager = HITManager(
+            mturk_endpoint="sandbox",
+            aws_access_key=self.AWS_ACCESS_KEY,
+            aws_secret_key=self.AWS_SECRET_KEY,
+            max_hits=3,
+        )
+
+        with mock.patch.object(fake_mturk_client, 'list_hits',
+                               wraps=fake_mturk_client.list_hits) as list_hits_mock:
+            open_hit_ids = hit_manager.get_open_hit_ids(self.HIT_TYPE)
+
+        self.assertEqual(sorted(open_hit_ids), list(range(7)))
+        self.assertEqual(list_hits_mock.call_count, 3)
+
+    def test_session_hits_closed_by_other_process(self, boto3_client_mock: mock.MagicMock):
+        fake_mturk_client = MturkClientFake()
+        boto3_client_mock.return_value = fake_mturk_client
+        hit_manager = HITManager(
+            mturk_endpoint="sandbox",
+            aws_access_key=self.AWS_ACCESS_KEY,
+            aws_secret_key=self.AWS_SECRET_KEY,
+        )
+        # HITs created by the parent process, the first one not listed by MTurk yet
+        now = datetime.datetime.now().timestamp()
+        for hit_id in (0, 1):
+            hit_manager.session_open_hits.add(hit_id)
+            hit_manager.session_hit_expirations[hit_id] = now + 3600
+        fake_mturk_client.create_mock_hit(1, hit_type=self.HIT_TYPE, hit_lifetime_seconds=3600)
+
+        self.assertEqual(sorted(hit_manager.get_open_hit_ids(self.HIT_TYPE)), [0, 1])
+        fake_mturk_client.create_mock_hit(0, hit_type=self.HIT_TYPE, hit_lifetime_seconds=3600)
+        self.assertEqual(sorted(hit_manager.get_open_hit_ids(self.HIT_TYPE)), [0, 1])
+        # Another collector process closes both HITs
+        fake_mturk_client.hits.clear()
+
+        self.assertEqual(hit_manager.get_open_hit_ids(self.HIT_TYPE), [])
+        self.assertEqual(hit_manager.session_open_hits, set())
+
+    def test_expired_unworked_hits(self, boto3_client_mock: mock.MagicMock):
+        """Only expired HITs without pending nor submitted assignments are returned."""
+        fake_mturk_client = MturkClientFake()
+        boto3_client_mock.return_value = fake_mturk_client
+        expired_creation_time = datetime.datetime.now() - datetime.timedelta(hours=2)
+        fake_mturk_client.create_mock_hit(
+            0, hit_type=self.HIT_TYPE, creation_time=expired_creation_time,
+            assignments_available=1)
+        fake_mturk_client.create_mock_hit(
+            1, hit_type=self.HIT_TYPE, creation_time=expired_creation_time,
+            assignments_pending=1)
+        fake_mturk_client.create_mock_hit(
+            2, hit_type=self.HIT_TYPE, creation_time=expired_creation_time,
+            status='Reviewable')
+        fake_mturk_client.create_mock_assignment(2, 'assignment-2')
+        fake_mturk_client.create_mock_hit(
+            3, hit_type=self.HIT_TYPE, hit_lifetime_seconds=3600, assignments_available=1)
+
+        hit_manager = HITManager(
+            mturk_endpoint="sandbox",
+            aws_access_key=self.AWS_ACCESS_KEY,
+            aws_secret_key=self.AWS_SECRET_KEY,
+        )
+
+        self.assertEqual(hit_manager.get_expired_unworked_hit_ids([0, 1, 2, 3, 'unlisted']), [0])
+
+    def test_shared_hit_sweep(self, boto3_client_mock: mock.MagicMock):
+        """HIT managers of several types read their open HITs from a single listing."""
+        fake_mturk_client = MturkClientFake()
+        fake_mturk_client.create_mock_hit(0, hit_type=self.HIT_TYPE)
+        fake_mturk_client.create_mock_hit(1, hit_type='builder_other')
+        fake_mturk_client.create_mock_hit(2, hit_type=self.HIT_TYPE)
+        hit_sweep = HitSweep(fake_mturk_client)
+        hit_managers = [
+            HITManager(
+                mturk_endpoint="sandbox",
+                aws_access_key=self.AWS_ACCESS_KEY,
+                aws_secret_key=self.AWS_SECRET_KEY,
+                mturk_client=fake_mturk_client,
+                hit_sweep=hit_sweep,
+            ) for _ in range(2)]
+
+        with mock.patch.object(fake_mturk_client, 'list_hits',
+                               wraps=fake_mturk_client.list_hits) as list_hits_mock:
+            hit_sweep.refresh()
+            open_hit_ids = hit_managers[0].get_open_hit_ids(self.HIT_TYPE)
+            other_open_hit_ids = hit_managers[1].get_open_hit_ids('builder_other')
+
+        self.assertEqual(sorted(open_hit_ids), [0, 2])
+        self.assertEqual(other_open_hit_ids, [1])
+        self.assertEqual(list_hits_mock.call_count, 1)
+        boto3_client_mock.assert_not_called()
+
 
 if __name__ == '__main__':
     unittest.main()
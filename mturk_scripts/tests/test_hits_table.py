@@ -0,0 +1,293 @@
+"""Test the layouts of the hits table, the reads during a migration and the migration."""
+
+import datetime
+import os
+import re
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from hits_table import GameIdLayout, HitTypeMonthLayout, HitsTable  # noqa: E402
+from singleturn.migrate_hits_table import migrate_rows  # noqa: E402
+from singleturn.singleturn_games_storage import SingleTurnGameStorage  # noqa: E402
+from common import lazy_imports  # noqa: E402
+
+azure_exceptions = lazy_imports.lazy_import('azure.core.exceptions')
+azure_tables = lazy_imports.lazy_import('azure.data.tables')
+
+COMPARISON = re.compile(r"(\w+) (eq|ne|ge|gt|le|lt) ('(?:[^']|'')*'|true|false)")
+OPERATORS = {'eq': '==', 'ne': '!=', 'ge': '>=', 'gt': '>', 'le': '<=', 'lt': '<'}
+
+
+def evaluate_filter(query_filter, row):
+    """Evaluates the comparisons of strings and booleans, `and`, `or` and parentheses."""
+    def to_python(match):
+        column, operator, value = match.groups()
+        if value in ('true', 'false'):
+            return f"(row.get({column!r}) {OPERATORS[operator]} {value.capitalize()})"
+        return f"((row.get({column!r}) or '') {OPERATORS[operator]} {value})"
+    return eval(COMPARISON.sub(to_python, query_filter), {'row': row})
+
+
+class TableClientFake:
+    """Table client with the rows in memory, by partition and row key."""
+
+    def __init__(self) -> None:
+        self.rows = {}
+        self.queries = []
+        self.transactions = []
+
+    def _project(self, row, select):
+        if select is None:
+            return dict(row)
+        return {column: row.get(column) for column in select}
+
+    def list_entities(self, select=None):
+        self.queries.append(None)
+        return iter([self._project(row, select) for row in self.rows.values()])
+
+    def query_entities(self, query_filter, select=None, **kwargs):
+        self.queries.append(query_filter)
+        # Unmatched quotes or parentheses would fail here
+        return iter([self._project(row, select) for row in self.rows.values()
+                     if evaluate_filter(query_filter, row)])
+
+    def get_entity(self, partition_key, row_key, select=None):
+        if (partition_key, row_key) not in self.rows:
+            raise azure_exceptions.ResourceNotFoundError('Not found')
+        return self._project(self.rows[(partition_key, row_key)], select)
+
+    def create_entity(self, entity):
+        key = (entity['PartitionKey'], entity['RowKey'])
+        if key in self.rows:
+            raise azure_exceptions.ResourceExistsError('Exists')
+        self.rows[key] = dict(entity)
+
+    def upsert_entity(self, entity, mode=None):
+        key = (entity['PartitionKey'], entity['RowKey'])
+        self.rows.setdefault(key, {}).update(entity)
+
+    def delete_entity(self, partition_key, row_key):
+        self.rows.pop((partition_key, row_key), None)
+
+    def submit_transaction(self, operations):
+        self.transactions.append(operations)
+        assert len({entity['PartitionKey'] for _, entity in operations}) == 1
+        # Transactions are atomic, and fail if a row to create exists or one to delete does not
+        for operation, entity in operations:
+            exists = (entity['PartitionKey'], entity['RowKey']) in self.rows
+            if exists != (operation == 'delete'):
+                raise azure_tables.TableTransactionError(message='Transaction failed')
+        for operation, entity in operations:
+            if operation == 'create':
+                self.create_entity(entity)
+            else:
+                self.delete_entity(entity['PartitionKey'], entity['RowKey'])
+
+
+def create_row(game_index, hit_id, hit_type='builder-normal', date_bucket=None):
+    row = {
+        'PartitionKey': f'game-{game_index}',
+        'RowKey': hit_id,
+        'HitType': hit_type,
+        'InitializedWorldStructureId': 'c1',
+        'InitializedWorldPath': 'mturk-vw/builder-data/1-c1/step-2',
+        'IsHITQualified': True,
+        'InputInstruction': 'NA',
+        'WorkerId': 'NA',
+        'ActionDataPath': 'NA',
+    }
+    if date_bucket is not None:
+        row['DateBucket'] = date_bucket
+    return row
+
+
+class HitsTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.layout = HitTypeMonthLayout(
+            clock=lambda: datetime.datetime(2022, 8, 10, tzinfo=datetime.timezone.utc))
+
+    def test_layout_round_trip(self):
+        row = create_row(3, 'hit-3', date_bucket='2022-06')
+        entity = self.layout.to_entity(row)
+
+        self.assertEqual(entity['PartitionKey'], 'builder-normal|2022-06')
+        self.assertEqual(entity['GameId'], 'game-3')
+        self.assertEqual(self.layout.to_row(entity), row)
+        self.assertEqual(self.layout.to_entity(create_row(4, 'hit-4'))['PartitionKey'],
+                         'builder-normal|2022-08')
+
+    def test_rows_by_type_are_range_scans(self):
+        table_client = TableClientFake()
+        hits_table = HitsTable(table_client, self.layout)
+        hits_table.create(create_row(1, 'hit-1', date_bucket='2021-12'))
+        hits_table.create(create_row(2, 'hit-2', date_bucket='2022-08'))
+        hits_table.create(create_row(3, 'hit-3', 'clarifying-question'))
+
+        rows = list(hits_table.rows_by_type('builder-normal', select=['PartitionKey']))
+        recent_rows = list(hits_table.rows_by_type(
+            'builder-normal', select=['PartitionKey'], recent_only=True))
+
+        self.assertEqual(sorted(row['PartitionKey'] for row in rows), ['game-1', 'game-2'])
+        self.assertEqual([row['PartitionKey'] for row in recent_rows], ['game-2'])
+        self.assertNotIn('HitType', table_client.queries[0])
+
+    def test_rows_by_hit_ids_reads_recent_partitions_first(self):
+        table_client = TableClientFake()
+        hits_table = HitsTable(table_client, self.layout)
+        for i in range(20):
+            hits_table.create(create_row(i, f'hit-{i}', date_bucket='2022-07'))
+        hits_table.create(create_row(20, 'hit-20', date_bucket='2021-01'))
+
+        rows = hits_table.rows_by_hit_ids(
+            [f'hit-{i}' for i in range(21)], hit_type='builder-normal')
+
+        self.assertEqual(len(rows), 21)
+        self.assertEqual(rows['hit-20']['PartitionKey'], 'game-20')
+        # Two chunks in each of the two recent partitions, then the missing hit everywhere
+        self.assertEqual(len(table_client.queries), 5)
+        self.assertTrue(all(query.startswith('PartitionKey eq')
+                            for query in table_client.queries[:4]))
+
+    def test_dual_read_during_migration(self):
+        legacy_client = TableClientFake()
+        legacy_table = HitsTable(legacy_client, GameIdLayout())
+        for i in range(3):
+            legacy_client.create_entity(create_row(i, f'hit-{i}'))
+        table_client = TableClientFake()
+        hits_table = HitsTable(table_client, self.layout, legacy_table=legacy_table)
+        # hit-2 was already migrated and then updated
+        updated_row = create_row(2, 'hit-2', date_bucket='2022-08')
+        updated_row['InputInstruction'] = 'Place a red block'
+        hits_table.upsert(updated_row)
+        hits_table.create(create_row(3, 'hit-3'))
+
+        rows = list(hits_table.rows_by_type('builder-normal', select=['InputInstruction']))
+        rows_by_hit_id = hits_table.rows_by_hit_ids(
+            ['hit-1', 'hit-2', 'hit-3'], hit_type='builder-normal')
+
+        self.assertEqual(sorted(row['RowKey'] for row in rows),
+                         ['hit-0', 'hit-1', 'hit-2', 'hit-3'])
+        self.assertEqual(rows_by_hit_id['hit-1']['PartitionKey'], 'game-1')
+        self.assertEqual(rows_by_hit_id['hit-2']['InputInstruction'], 'Place a red block')
+        self.assertEqual(len(legacy_client.rows), 3)
+
+    def test_migration_is_idempotent(self):
+        source_client = TableClientFake()
+        for i in range(5):
+            source_client.create_entity(create_row(i, f'hit-{i}', date_bucket='2022-07'))
+        source_client.create_entity(create_row(5, 'hit-5', 'clarifying-question', '2022-07'))
+        target_client = TableClientFake()
+        # Written by a collector before the migration started
+        HitsTable(target_client, self.layout).create(
+            create_row(0, 'hit-0', date_bucket='2022-07'))
+
+        counts = migrate_rows(
+            source_client.list_entities(), target_client, self.layout, batch_size=2)
+        counts_again = migrate_rows(source_client.list_entities(), target_client, self.layout)
+
+        self.assertEqual(counts['copied'], 5)
+        self.assertEqual(counts['skipped'], 1)
+        self.assertEqual([len(operations) for operations in target_client.transactions],
+                         [2, 2, 1])
+        self.assertEqual(counts_again['copied'], 0)
+        self.assertEqual(counts_again['skipped'], 6)
+        self.assertIn(('builder-normal|2022-07', 'hit-3'), target_client.rows)
+
+    def test_storage_last_game_index_reads_recent_partitions(self):
+        game_storage = SingleTurnGameStorage(
+            hits_table_name='HitsTable', azure_connection_str='connection',
+            starting_structures_container_name='mturk-vw',
+            starting_structures_blob_prefix='builder-data',
+            hits_table_layout='hit_type_month')
+        game_storage.hits_table_layout = self.layout
+        game_storage.table_client = TableClientFake()
+        game_storage.hits_table.create(create_row(7, 'hit-7', date_bucket='2022-01'))
+
+        self.assertEqual(game_storage.get_last_game_index(), 7)
+        game_storage.hits_table.create(create_row(9, 'hit-9', date_bucket='2022-08'))
+        self.assertEqual(game_storage.get_last_game_index(), 9)
+        turn = game_storage.retrieve_turns(['hit-9'], hit_type='builder-normal')['hit-9']
+        self.assertEqual(turn.date_bucket, '2022-08')
+        self.assertEqual(turn.to_database_entry('mturk-vw')['DateBucket'], '2022-08')
+
+    def test_legacy_rows_bucketed_before_every_month(self):
+        source_client = TableClientFake()
+        # Created before game 9, and completed in the last month
+        source_client.create_entity(create_row(8, 'hit-8'))
+        game_storage = SingleTurnGameStorage(
+            hits_table_name='HitsTable', azure_connection_str='connection',
+            starting_structures_container_name='mturk-vw',
+            starting_structures_blob_prefix='builder-data',
+            hits_table_layout='hit_type_month')
+        game_storage.hits_table_layout = self.layout
+        game_storage.table_client = TableClientFake()
+        game_storage.hits_table.create(create_row(9, 'hit-9', date_bucket='2022-07'))
+
+        migrate_rows(source_client.list_entities(), game_storage.table_client, self.layout)
+
+        self.assertIn(('builder-normal|0000-00', 'hit-8'), game_storage.table_client.rows)
+        self.layout.clock = lambda: datetime.datetime(
+            2022, 9, 10, tzinfo=datetime.timezone.utc)
+        self.assertEqual(game_storage.get_last_game_index(), 9)
+
+    def test_replace_rows_in_transactions_by_partition(self):
+        table_client = TableClientFake()
+        hits_table = HitsTable(table_client, self.layout)
+        replacements = []
+        for i in range(60):
+            row = create_row(i, f'hit-{i}', date_bucket='2022-07')
+            hits_table.create(row)
+            replacements.append((row, dict(row, RowKey=f'new-hit-{i}')))
+        row = create_row(60, 'hit-60', date_bucket='2022-08')
+        hits_table.create(row)
+        replacements.append((row, dict(row, RowKey='new-hit-60')))
+
+        self.assertEqual(hits_table.replace_rows(replacements), 61)
+
+        self.assertEqual([len(operations) for operations in table_client.transactions],
+                         [100, 20, 2])
+        self.assertEqual(sorted(key[1] for key in table_client.rows),
+                         sorted(f'new-hit-{i}' for i in range(61)))
+
+    def test_replace_rows_again(self):
+        table_client = TableClientFake()
+        hits_table = HitsTable(table_client, self.layout)
+        rows = [create_row(i, f'hit-{i}', date_bucket='2022-07') for i in range(2)]
+        for row in rows:
+            hits_table.create(row)
+        replacements = [(row, dict(row, RowKey=f'new-{row["RowKey"]}')) for row in rows]
+        hits_table.replace_rows(replacements[:1])
+
+        # The transaction fails on the row already deleted, and is written one by one
+        self.assertEqual(hits_table.replace_rows(replacements), 2)
+
+        self.assertEqual(sorted(key[1] for key in table_client.rows), ['new-hit-0', 'new-hit-1'])
+
+    def test_storage_replaces_unworked_turns(self):
+        game_storage = SingleTurnGameStorage(
+            hits_table_name='HitsTable', azure_connection_str='connection',
+            starting_structures_container_name='mturk-vw',
+            starting_structures_blob_prefix='builder-data',
+            hits_table_layout='hit_type_month')
+        game_storage.hits_table_layout = self.layout
+        game_storage.table_client = TableClientFake()
+        game_storage.hits_table.create(create_row(1, 'hit-1', date_bucket='2022-06'))
+        game_storage.hits_table.create(dict(
+            create_row(2, 'hit-2', date_bucket='2022-06'), WorkerId='worker'))
+
+        turns = game_storage.list_unworked_turns('builder-normal')
+        self.assertEqual([turn.hit_id for turn in turns], ['hit-1'])
+        turns[0].set_hit_id('new-hit-1')
+        self.assertEqual(game_storage.replace_turns({'hit-1': turns[0]}), 1)
+
+        rows = game_storage.hits_table.rows_by_hit_ids(['hit-1', 'new-hit-1', 'hit-2'])
+        self.assertEqual(sorted(rows), ['hit-2', 'new-hit-1'])
+        self.assertEqual(rows['new-hit-1']['PartitionKey'], 'game-1')
+        self.assertEqual(rows['new-hit-1']['DateBucket'], '2022-06')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Test deferred imports of modules and attributes."""
+
+import os
+import sys
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from common import lazy_imports  # noqa: E402
+
+# Small standard library module not imported by the tests or their dependencies
+_MODULE_NAME = 'colorsys'
+
+
+class LazyImportsTest(unittest.TestCase):
+
+    def setUp(self):
+        sys.modules.pop(_MODULE_NAME, None)
+        lazy_imports._IMPORT_SECONDS.pop(_MODULE_NAME, None)
+
+    def test_module_imported_on_first_attribute_access(self):
+        colorsys = lazy_imports.lazy_import(_MODULE_NAME)
+        self.assertNotIn(_MODULE_NAME, sys.modules)
+        self.assertIn(_MODULE_NAME, lazy_imports.import_report())
+
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn(_MODULE_NAME, sys.modules)
+        self.assertIn(_MODULE_NAME, lazy_imports._IMPORT_SECONDS)
+
+    def test_attribute_imported_when_called(self):
+        rgb_to_hsv = lazy_imports.lazy_attribute(_MODULE_NAME, 'rgb_to_hsv')
+        self.assertNotIn(_MODULE_NAME, sys.modules)
+        self.assertEqual(rgb_to_hsv(0.0, 0.0, 1.0), (2 / 3, 1.0, 1.0))
+
+    def test_already_imported_module_returned(self):
+        self.assertIs(lazy_imports.lazy_import('os'), os)
+
+    def test_patch_attribute_of_lazy_module(self):
+        colorsys = lazy_imports.lazy_import(_MODULE_NAME)
+        with mock.patch.object(colorsys, 'rgb_to_hsv', return_value='patched'):
+            self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), 'patched')
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
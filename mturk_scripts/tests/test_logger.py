@@ -0,0 +1,36 @@
+"""Test json log formatting."""
+
+import json
+import logging
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from common.logger import JsonFormatter  # noqa: E402
+
+
+class JsonFormatterTest(unittest.TestCase):
+
+    def create_record(self, **extra):
+        record = logging.LogRecord(
+            name='hit_manager', level=logging.INFO, pathname=__file__, lineno=1,
+            msg='Assignment %s closed.', args=('A1',), exc_info=None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_line_with_extra_fields(self):
+        line = JsonFormatter().format(self.create_record(hit_id='H1', game_id='game-3'))
+        self.assertNotIn('\n', line)
+        entry = json.loads(line)
+        self.assertEqual(entry['message'], 'Assignment A1 closed.')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['logger'], 'hit_manager')
+        self.assertEqual(entry['hit_id'], 'H1')
+        self.assertEqual(entry['game_id'], 'game-3')
+        self.assertNotIn('worker_id', entry)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Test near-duplicate detection of instructions."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from common.minhash import InstructionDuplicateIndex, shingles  # noqa: E402
+
+
+class InstructionDuplicateIndexTest(unittest.TestCase):
+
+    INSTRUCTIONS = [
+        'Place three red blocks on top of the blue tower.',
+        'Remove the green blocks from the left side of the structure.',
+        'Build a purple wall of four blocks next to the yellow column.',
+    ]
+
+    def create_index(self):
+        index = InstructionDuplicateIndex()
+        index.add_many((f'hit-{i}', text) for i, text in enumerate(self.INSTRUCTIONS))
+        return index
+
+    def test_shingles_normalization(self):
+        self.assertEqual(shingles('Red  BLOCK!', size=4), shingles('red block', size=4))
+        self.assertEqual(shingles('', size=4), [])
+
+    def test_near_duplicates_found(self):
+        index = self.create_index()
+        duplicates = index.find_duplicates('place three red blocks on top of the blue tower')
+        self.assertEqual([key for key, _ in duplicates], ['hit-0'])
+        self.assertGreater(duplicates[0][1], 0.8)
+
+    def test_different_instruction_not_found(self):
+        index = self.create_index()
+        self.assertEqual(
+            index.find_duplicates('Destroy the orange roof and add a door to the house.'), [])
+        self.assertEqual(index.find_duplicates(None), [])
+
+    def test_save_and_load(self):
+        index = self.create_index()
+        with tempfile.TemporaryDirectory() as dirname:
+            filepath = os.path.join(dirname, 'index.npz')
+            index.save(filepath)
+            loaded_index = InstructionDuplicateIndex.load(filepath)
+
+        self.assertEqual(len(loaded_index), len(self.INSTRUCTIONS))
+        self.assertIn('hit-2', loaded_index)
+        duplicates = loaded_index.find_duplicates(self.INSTRUCTIONS[2])
+        self.assertEqual(duplicates, [('hit-2', 1.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Test the latency statistics and the bursts of the backend probe."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from singleturn.probe_backends import create_mturk_operations, probe, run_burst  # noqa: E402
+from common.latency_stats import LatencyStats, format_summaries, percentile  # noqa: E402
+
+
+class LatencyStatsTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        values = [float(i) for i in range(1, 101)]
+
+        self.assertEqual(percentile(values, 0.50), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile(values, 1.0), 100.0)
+        self.assertEqual(percentile([3.0], 0.95), 3.0)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_summary(self):
+        stats = LatencyStats('query_entities')
+        for seconds in [0.01, 0.02, 0.03, 0.04]:
+            stats.add(seconds)
+        stats.add_error(ValueError('throttled'))
+        stats.elapsed_seconds = 2.0
+
+        summary = stats.summary()
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['p50'], 0.02)
+        self.assertEqual(summary['ops_per_second'], 2.0)
+        self.assertEqual(stats.first_error, 'ValueError: throttled')
+        self.assertIn('query_entities', format_summaries([summary]))
+
+
+class ProbeTest(unittest.TestCase):
+
+    def test_burst_runs_calls_concurrently(self):
+        running = []
+        max_running = []
+        lock = threading.Lock()
+
+        def operation(index):
+            with lock:
+                running.append(index)
+                max_running.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(index)
+            if index == 7:
+                raise RuntimeError('ThrottlingException')
+
+        stats = run_burst(operation, 20, 4, LatencyStats('operation'))
+
+        self.assertEqual(len(stats.latencies), 19)
+        self.assertEqual(stats.error_count, 1)
+        self.assertLessEqual(max(max_running), 4)
+        self.assertGreater(max(max_running), 1)
+        self.assertGreater(stats.summary()['ops_per_second'], 0)
+
+    def test_probe_every_concurrency_level(self):
+        operation = mock.MagicMock()
+        summaries = probe({'list_hits': operation}, [1, 2], 5)
+
+        self.assertEqual([summary['name'] for summary in summaries],
+                         ['list_hits x1', 'list_hits x2'])
+        self.assertEqual(operation.call_count, 10)
+
+    def test_mturk_operations_sample_open_hits(self):
+        hit_manager = mock.MagicMock()
+        hit_manager.mturk_client.list_hits.return_value = {'HITs': [{'HITId': 'hit-1'}]}
+
+        operations = create_mturk_operations(
+            hit_manager, ['list_hits', 'list_assignments_for_hit'], page_size=500)
+        operations['list_assignments_for_hit'](0)
+
+        hit_manager.mturk_client.list_hits.assert_called_with(MaxResults=100)
+        hit_manager.mturk_client.list_assignments_for_hit.assert_called_with(
+            HITId='hit-1', AssignmentStatuses=['Submitted'])
+
+
+if __name__ == '__main__':
+    unittest.main()
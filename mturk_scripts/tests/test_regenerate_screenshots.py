@@ -0,0 +1,77 @@
+"""Test the script rendering the missing screenshots of the starting worlds."""
+
+import json
+import os
+import sys
+import types
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from singleturn import regenerate_screenshots  # noqa: E402
+
+CONFIG_FILEPATH = os.path.join(
+    os.path.dirname(__file__), '..', 'singleturn', 'env_configs.json')
+
+
+class ContainerClientFake:
+    """Container without pages, with step files of a single block."""
+
+    def __init__(self, blob_names):
+        self.blobs = {name: b'' for name in blob_names}
+        self.uploaded = []
+
+    def list_blobs(self, name_starts_with=''):
+        return [types.SimpleNamespace(name=name) for name in sorted(self.blobs)
+                if name.startswith(name_starts_with)]
+
+    def download_blob(self, blob_name):
+        step_data = json.dumps({'worldEndingState': {'blocks': [[0, 0, 0, 3]]}})
+        return types.SimpleNamespace(readall=lambda: step_data.encode())
+
+    def upload_blob(self, blob_name, data, overwrite=False):
+        self.uploaded.append(blob_name)
+        self.blobs[blob_name] = data
+
+
+class RegenerateScreenshotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.container_client = ContainerClientFake([
+            'test-builder-data/1-c1/step-2', 'test-builder-data/1-c1/step-2_north.png',
+            'test-builder-data/1-c1/step-4', 'test-builder-data/2-c3/step-2'])
+        game_storage = mock.MagicMock(starting_structures_blob_prefix='test-builder-data')
+        game_storage.create_container_client.return_value = self.container_client
+        patcher = mock.patch.object(
+            regenerate_screenshots, 'SingleTurnGameStorage', return_value=game_storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_script(self, *args):
+        argv = ['regenerate_screenshots.py', '--config_filepath', CONFIG_FILEPATH,
+                '--env_filepath', os.devnull, *args]
+        with mock.patch.object(sys, 'argv', argv):
+            regenerate_screenshots.main()
+
+    def test_dry_run(self):
+        with self.assertLogs(regenerate_screenshots._LOGGER, level='INFO') as logs:
+            self.run_script('--dry_run')
+
+        self.assertIn('2 steps with missing screenshots found.', logs.output[0])
+        self.assertEqual(self.container_client.uploaded, [])
+
+    def test_render_missing_screenshots(self):
+        self.run_script('--views', 'north', 'top', '--scale', '2')
+
+        self.assertEqual(sorted(self.container_client.uploaded), [
+            'test-builder-data/1-c1/step-2_top.png',
+            'test-builder-data/1-c1/step-4_north.png', 'test-builder-data/1-c1/step-4_top.png',
+            'test-builder-data/2-c3/step-2_north.png', 'test-builder-data/2-c3/step-2_top.png'])
+        png = self.container_client.blobs['test-builder-data/2-c3/step-2_north.png']
+        self.assertTrue(png.startswith(b'\x89PNG'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Test the adaptive release of HITs with simulated acceptances and expirations."""
+
+import datetime
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from release_controller import ReleaseRateController  # noqa: E402
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ReleaseRateControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.released_hit_ids = []
+
+    def release_hits(self, count):
+        hit_ids = [f'hit{len(self.released_hit_ids) + i}' for i in range(count)]
+        self.released_hit_ids.extend(hit_ids)
+        return hit_ids
+
+    def create_controller(self, total_hits=100, **kwargs):
+        return ReleaseRateController(
+            self.release_hits, total_hits, hit_lifetime_seconds=3600,
+            assignment_duration_seconds=300, initial_open_hits=10, clock=self.clock,
+            **kwargs)
+
+    def assignment(self, accept_delay, submit_delay=60):
+        accepted_at = self.clock.now + accept_delay
+        return {
+            'AcceptTime': datetime.datetime.fromtimestamp(accepted_at),
+            'SubmitTime': datetime.datetime.fromtimestamp(accepted_at + submit_delay),
+        }
+
+    def test_release_tops_up_to_target(self):
+        controller = self.create_controller(total_hits=25)
+
+        self.assertEqual(len(controller.release(0)), 10)
+        self.assertEqual(controller.release(10), [])
+        self.assertEqual(len(controller.release(4)), 6)
+        self.assertEqual(len(controller.release(0)), 9)
+        self.assertTrue(controller.is_done)
+        self.assertEqual(controller.release(0), [])
+
+    def test_fast_acceptances_raise_target(self):
+        controller = self.create_controller()
+        hit_ids = controller.release(0)
+
+        # All the HITs are accepted two minutes after release
+        self.clock.now += 600
+        controller.record_completed({hit_id: self.assignment(-480) for hit_id in hit_ids})
+        new_hit_ids = controller.release(0)
+
+        self.assertEqual(controller.open_target, 12)
+        self.assertEqual(len(new_hit_ids), 12)
+        stats = controller.stats()
+        self.assertEqual(stats['median_accept_seconds'], 120)
+        self.assertEqual(stats['median_submit_seconds'], 60)
+        self.assertEqual(stats['expiration_ratio'], 0.0)
+        self.assertEqual(stats['accepted_per_hour'], 60)
+
+    def test_target_capped_by_acceptance_rate(self):
+        controller = self.create_controller(max_open_hits=200)
+        controller.open_target = 150
+        hit_ids = controller.release(0)
+
+        # Only 10 HITs accepted in an hour, 5 of them can be accepted in half a lifetime
+        self.clock.now += 3600
+        controller.record_completed({hit_id: self.assignment(-3000) for hit_id in hit_ids[:10]})
+
+        self.assertEqual(controller.target_open_hits(), 5)
+        self.assertEqual(controller.release(140), [])
+
+    def test_expirations_cut_target(self):
+        controller = self.create_controller()
+        controller.open_target = 40
+        hit_ids = controller.release(0)
+
+        self.clock.now += 1800
+        controller.record_completed({hit_id: self.assignment(-1200) for hit_id in hit_ids[:30]})
+        # The other 10 HITs expire unworked
+        self.clock.now += 3600 + 300
+        controller.release(0)
+
+        self.assertEqual(controller.open_target, 20)
+        self.assertEqual(controller.stats()['expiration_ratio'], 0.25)
+        # Assignments of HITs already counted as expired are ignored
+        controller.record_completed({hit_ids[35]: self.assignment(-60)})
+        self.assertEqual(controller.stats()['expiration_ratio'], 0.25)
+
+    def test_assignments_of_other_runs_are_ignored(self):
+        controller = self.create_controller()
+        controller.release(0)
+
+        controller.record_completed({'previous-hit': self.assignment(-60)})
+
+        self.assertEqual(len(controller.outcomes), 0)
+        self.assertEqual(len(controller.pending_hits), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+"""Test the collection steps of run_data_collection with the clients replaced by fakes."""
+
+import datetime
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from campaigns import Campaign  # noqa: E402
+from hit_manager import HITManager  # noqa: E402
+from singleturn import run_data_collection  # noqa: E402
+from singleturn.singleturn_games_storage import SingleTurnDatasetTurn  # noqa: E402
+from common import logger  # noqa: E402
+
+
+def create_turn(game_index, hit_id):
+    turn = SingleTurnDatasetTurn(
+        f'game-{game_index}', 'builder-normal', 'c1', 'builder-data', '1-c1', 'step-2')
+    turn.set_hit_id(hit_id)
+    return turn
+
+
+class GameStorageFake:
+    """Hits table with the turns by hit id."""
+
+    def __init__(self, turns) -> None:
+        self.turns = {turn.hit_id: turn for turn in turns}
+
+    def list_unworked_turns(self, turn_type):
+        return [create_turn(turn.game_id.split('-')[1], hit_id)
+                for hit_id, turn in self.turns.items()]
+
+    def replace_turns(self, turns):
+        for previous_hit_id, turn in turns.items():
+            self.turns.pop(previous_hit_id, None)
+            self.turns[turn.hit_id] = turn
+        return len(turns)
+
+
+class RepublishExpiredTurnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.game_storage = GameStorageFake([create_turn(i, f'hit-{i}') for i in range(3)])
+        self.hit_manager = mock.MagicMock()
+        self.hit_manager.get_expired_unworked_hit_ids.side_effect = list
+
+    def republish(self):
+        return run_data_collection.republish_expired_turns(
+            self.game_storage, self.hit_manager, mock.MagicMock(), {'azure_sas': 'sas'},
+            'builder-normal')
+
+    def test_rows_replaced_as_hits_are_created(self):
+        self.hit_manager.create_hit.side_effect = ['new-hit-0', 'new-hit-1', RuntimeError]
+
+        with self.assertRaises(RuntimeError):
+            self.republish()
+
+        # The HITs created before the failure have their rows
+        self.assertEqual(sorted(self.game_storage.turns), ['hit-2', 'new-hit-0', 'new-hit-1'])
+        self.assertEqual(self.game_storage.turns['new-hit-1'].game_id, 'game-1')
+
+        # Once restarted, the HITs of the replaced rows are not expired
+        self.hit_manager.get_expired_unworked_hit_ids.side_effect = lambda hit_ids: [
+            hit_id for hit_id in hit_ids if not hit_id.startswith('new-')]
+        self.hit_manager.create_hit.side_effect = ['new-hit-2']
+        self.assertEqual(self.republish(), ['new-hit-2'])
+        self.assertEqual(sorted(self.game_storage.turns),
+                         ['new-hit-0', 'new-hit-1', 'new-hit-2'])
+
+    def test_expired_hits_deleted(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        hits = {f'hit-{i}': {'HITId': f'hit-{i}', 'Expiration': now - datetime.timedelta(hours=1)}
+                for i in range(3)}
+        mturk_client = mock.MagicMock()
+        mturk_client.list_hits.side_effect = lambda **kwargs: {'HITs': list(hits.values())}
+        mturk_client.list_assignments_for_hit.return_value = {'NumResults': 0}
+
+        def create_hit(**kwargs):
+            hit_id = f'new-hit-{len(hits)}'
+            hits[hit_id] = {'HITId': hit_id, 'Expiration': now + datetime.timedelta(hours=1)}
+            return {'HIT': hits[hit_id]}
+        mturk_client.create_hit.side_effect = create_hit
+        mturk_client.delete_hit.side_effect = lambda HITId: hits.pop(HITId)
+        self.hit_manager = HITManager('sandbox', 'key', 'secret', mturk_client=mturk_client)
+
+        self.assertEqual(len(self.republish()), 3)
+
+        # Only the new HITs are left, and the next sweep has nothing to publish again
+        self.assertEqual(sorted(hits), sorted(self.game_storage.turns))
+        self.assertEqual(self.republish(), [])
+        self.assertEqual(mturk_client.create_hit.call_count, 3)
+
+
+class AdaptiveReleaseTest(unittest.TestCase):
+
+    @mock.patch.object(run_data_collection, 'BuilderTemplateRenderer')
+    def test_notifications_enabled_with_first_release(self, _):
+        mturk_client = mock.MagicMock()
+        mturk_client.create_hit.side_effect = [
+            {'HIT': {'HITId': f'hit-{i}', 'HITTypeId': 'hit-type'}} for i in range(4)]
+        hit_manager = HITManager('sandbox', 'key', 'secret', mturk_client=mturk_client)
+        game_storage = mock.MagicMock()
+        game_storage.get_open_turns.side_effect = lambda turn_type, count: [
+            create_turn(i, None) for i in range(count)]
+        config = {'adaptive_release': True, 'initial_open_hits': 2, 'azure_sas': 'sas',
+                  'notification_queue': 'https://sqs.us-east-1.amazonaws.com/1/queue'}
+
+        _, release_controller, _ = run_data_collection.start_campaign(
+            4, 'template.xml', config, game_storage, 'builder-normal', hit_manager)
+
+        mturk_client.create_hit.assert_not_called()
+        release_controller.release(0)
+        release_controller.release(0)
+        mturk_client.update_notification_settings.assert_called_once()
+        self.assertEqual(
+            mturk_client.update_notification_settings.call_args.kwargs['HITTypeId'], 'hit-type')
+
+
+class RunCampaignsTest(unittest.TestCase):
+
+    @mock.patch('campaigns.create_shared_transport')
+    @mock.patch('campaigns.create_mturk_client')
+    def test_hits_listed_before_campaigns_start(self, create_mturk_client_mock, _):
+        create_mturk_client_mock.return_value.list_hits.return_value = {
+            'HITs': [{'HITId': 'expired-hit'}]}
+        config = {'mturk_endpoint': 'sandbox', 'aws_access_key': 'key',
+                  'aws_secret_key': 'secret'}
+        campaigns = [Campaign(hit_type, hit_type, 'template.xml', 1, config)
+                     for hit_type in ('builder-normal', 'builder-hard')]
+        listed_hit_ids = []
+
+        def start_campaign(hit_count, template_filepath, config, *args):
+            listed_hit_ids.append(list(config['hit_sweep'].hits))
+            return None, None, None
+
+        with mock.patch.multiple(
+                run_data_collection, SingleTurnGameStorage=mock.MagicMock(),
+                create_hit_manager=mock.Mock(return_value=(mock.Mock(), None, None)),
+                start_campaign=start_campaign, create_profiler_hook=mock.Mock(return_value=None),
+                AssignmentCollector=mock.Mock(**{'return_value.sweep.return_value': None})):
+            run_data_collection.run_campaigns(campaigns)
+
+        # Both campaigns can republish their expired HITs, from a single listing
+        self.assertEqual(listed_hit_ids, [['expired-hit'], ['expired-hit']])
+        create_mturk_client_mock.assert_called_once()
+
+
+def run_collector_process_to_file(log_filepath):
+    """Runs a collector process whose logs are written to @log_filepath."""
+    with open(log_filepath, 'w') as sys.stderr:
+        run_data_collection.run_collector_process(
+            {}, 0, 'builder-normal', owner_id='owner-0', session_hits=None)
+
+
+class CollectorProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        # Logging of the parent process with a queue, as with LOGQUEUE=TRUE
+        logger.reset_logging()
+        logger.configure_logging(use_queue=True)
+        self.addCleanup(logger.configure_logging)
+        self.addCleanup(logger.reset_logging)
+        self.addCleanup(logger.stop_logging)
+
+    def test_logs_of_forked_process_written(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log_filepath = os.path.join(directory, 'collector.log')
+            with mock.patch.object(
+                    run_data_collection, 'collect_shards', side_effect=lambda *args, **kwargs:
+                    logging.getLogger('collector').warning('Collecting shards')):
+                process = multiprocessing.get_context('fork').Process(
+                    target=run_collector_process_to_file, args=(log_filepath,))
+                process.start()
+                process.join()
+
+            self.assertEqual(process.exitcode, 0)
+            with open(log_filepath) as log_file:
+                self.assertIn('Collecting shards', log_file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
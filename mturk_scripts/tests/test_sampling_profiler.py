@@ -0,0 +1,109 @@
+"""Test the sampling profiler and the hook that starts it."""
+
+import collections
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from common.sampling_profiler import (  # noqa: E402
+    ProfilerHook, SamplingProfiler, function_samples, summarize, write_folded)
+
+
+def busy_wait(stop_event):
+    while not stop_event.is_set():
+        sum(range(1000))
+
+
+class SamplingProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+
+    def profile_files(self):
+        return sorted(os.listdir(self.output_dir.name))
+
+    def test_capture_samples_other_threads(self):
+        stop_event = threading.Event()
+        worker = threading.Thread(target=busy_wait, args=(stop_event,), name='busy')
+        worker.start()
+        profiler = SamplingProfiler(self.output_dir.name, interval_seconds=0.001)
+        try:
+            stacks, sample_count, _ = profiler.capture(0.2)
+        finally:
+            stop_event.set()
+            worker.join()
+
+        busy_stacks = [stack for stack in stacks if stack[0] == 'busy']
+        self.assertGreater(sample_count, 10)
+        self.assertTrue(all(stack[-1][2] in ('busy_wait', 'is_set') for stack in busy_stacks))
+        self.assertFalse(any(stack[0] == threading.current_thread().name for stack in stacks))
+
+    def test_folded_stacks_and_summary(self):
+        stacks = collections.Counter({
+            ('MainThread', ('a.py', 1, 'main'), ('a.py', 5, 'sweep')): 6,
+            ('MainThread', ('a.py', 1, 'main'), ('b.py', 3, 'wait;all')): 4,
+        })
+        filepath = os.path.join(self.output_dir.name, 'profile.folded')
+
+        write_folded(stacks, filepath)
+        with open(filepath) as folded_file:
+            lines = folded_file.read().splitlines()
+
+        self.assertEqual(lines, [
+            'MainThread;main (a.py:1);sweep (a.py:5) 6',
+            'MainThread;main (a.py:1);wait:all (b.py:3) 4'])
+        self.assertEqual(function_samples(stacks)[('a.py', 1, 'main')], [0, 10])
+        self.assertEqual(function_samples(stacks)[('a.py', 5, 'sweep')], [6, 6])
+        summary = summarize(stacks, 10, 0.05)
+        self.assertIn('5.0 ms per sample', summary)
+        self.assertIn('100.0  main (a.py:1)', summary)
+
+    def test_control_file_starts_one_profile(self):
+        control_filepath = os.path.join(self.output_dir.name, 'profile.now')
+        with open(control_filepath, 'w') as control_file:
+            control_file.write('')
+        # Left from a previous run
+        profiler_hook = ProfilerHook(self.output_dir.name, control_filepath=control_filepath,
+                                     signal_number=None)
+        self.assertFalse(profiler_hook.poll())
+        self.assertIsNone(profiler_hook.profiler.thread)
+
+        with open(control_filepath, 'w') as control_file:
+            control_file.write('0.05')
+        os.utime(control_filepath, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        self.assertTrue(profiler_hook.poll())
+        self.assertFalse(profiler_hook.poll())
+        profiler_hook.profiler.thread.join()
+
+        self.assertEqual([os.path.splitext(name)[1] for name in self.profile_files()],
+                         ['.folded', '.txt', '.now'])
+
+    @unittest.skipUnless(hasattr(signal, 'SIGUSR1'), 'SIGUSR1 not available')
+    def test_signal_starts_profile(self):
+        previous_handler = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous_handler)
+        profiler_hook = ProfilerHook(self.output_dir.name, duration_seconds=0.05)
+        profiler_hook.install()
+
+        # Received while the main thread holds the lock of the profiler
+        with profiler_hook.profiler.lock:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            # The handler runs in the main thread before the next bytecodes
+            time.sleep(0.01)
+        self.assertIsNone(profiler_hook.profiler.thread)
+        self.assertTrue(profiler_hook.poll())
+        self.assertFalse(profiler_hook.poll())
+        profiler_hook.profiler.thread.join()
+
+        self.assertEqual(len(self.profile_files()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+"""Test SingleTurnGameStorage queries with the azure table client mocked."""
+
+import os
+import re
+import sys
+import types
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from singleturn.singleturn_games_storage import (  # noqa: E402
+    SingleTurnDatasetColumns, SingleTurnDatasetTurn, SingleTurnGameStorage)
+from common.coverage_sampler import CoverageSampler  # noqa: E402
+
+
+class TableClientFake(mock.MagicMock):
+    """Table client that evaluates `or` filters of RowKey comparisons."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.rows = {}
+        self.queries = []
+
+    def query_entities(self, query_filter, select=None, **kwargs):
+        self.queries.append(query_filter)
+        row_keys = re.findall(r"RowKey eq '([^']*)'", query_filter)
+        assert len(row_keys) <= SingleTurnGameStorage.MAX_FILTER_COMPARISONS
+        return iter([
+            {column: self.rows[row_key].get(column) for column in select}
+            for row_key in row_keys if row_key in self.rows])
+
+
+class SingleTurnGameStorageTest(unittest.TestCase):
+
+    def create_row(self, game_index, hit_id):
+        return {
+            'PartitionKey': f'game-{game_index}',
+            'RowKey': hit_id,
+            'HitType': 'builder-normal',
+            'InitializedWorldStructureId': 'c1',
+            'InitializedWorldPath': 'mturk-vw/builder-data/1-c1/step-2',
+            'IsHITQualified': True,
+            'InputInstruction': 'Place a red block',
+            'WorkerId': 'worker',
+            'ActionDataPath': 'NA',
+            'SomeLargeColumn': 'not needed',
+        }
+
+    def test_retrieve_turns_in_chunks(self):
+        game_storage = SingleTurnGameStorage(
+            hits_table_name='HitsTable', azure_connection_str='connection',
+            starting_structures_container_name='mturk-vw',
+            starting_structures_blob_prefix='builder-data')
+        game_storage.table_client = TableClientFake()
+        for i in range(40):
+            game_storage.table_client.rows[f'hit-{i}'] = self.create_row(i, f'hit-{i}')
+
+        hit_ids = [f'hit-{i}' for i in range(40)] + ['missing-hit']
+        turns = game_storage.retrieve_turns(hit_ids)
+
+        self.assertEqual(len(game_storage.table_client.queries), 3)
+        self.assertEqual(set(turns.keys()), {f'hit-{i}' for i in range(40)})
+        self.assertEqual(turns['hit-7'].game_id, 'game-7')
+        self.assertEqual(turns['hit-7'].starting_world_id, 'builder-data/1-c1/step-2')
+        self.assertEqual(turns['hit-7'].input_instructions, 'Place a red block')
+
+    def test_retrieve_turns_with_point_reads(self):
+        game_storage = SingleTurnGameStorage(
+            hits_table_name='HitsTable', azure_connection_str='connection',
+            starting_structures_container_name='mturk-vw',
+            starting_structures_blob_prefix='builder-data')
+        game_storage.table_client = mock.MagicMock()
+        game_storage.table_client.get_entity.return_value = self.create_row(3, 'hit-3')
+
+        turns = game_storage.retrieve_turns(['hit-3'], game_ids={'hit-3': 'game-3'})
+
+        game_storage.table_client.get_entity.assert_called_once()
+        game_storage.table_client.query_entities.assert_not_called()
+        self.assertEqual(turns['hit-3'].game_id, 'game-3')
+
+    def create_storage_with_blobs(self, blob_names):
+        """Game storage with a starting structures container with @blob_names."""
+        game_storage = SingleTurnGameStorage(
+            hits_table_name='HitsTable', azure_connection_str='connection',
+            starting_structures_container_name='mturk-vw',
+            starting_structures_blob_prefix='builder-data')
+        game_storage.table_client = mock.MagicMock()
+        game_storage.table_client.query_entities.return_value = iter([])
+        container_client = mock.MagicMock()
+        container_client.list_blobs.side_effect = lambda name_starts_with: [
+            types.SimpleNamespace(name=name) for name in blob_names
+            if name.startswith(name_starts_with)]
+        game_storage.create_container_client = mock.Mock(return_value=container_client)
+        return game_storage, container_client
+
+    def test_open_turns_skip_worlds_with_missing_screenshots(self):
+        game_storage, container_client = self.create_storage_with_blobs([
+            'builder-data/1-c1/step-2', 'builder-data/1-c1/step-2_north.png',
+            'builder-data/1-c1/step-4', 'builder-data/2-c2/step-2',
+            'builder-data/2-c2/step-2_north.png'])
+
+        # The world without screenshot is selected first
+        with mock.patch('random.sample', side_effect=lambda blobs, count: sorted(
+                blobs, key=lambda name: name != 'builder-data/1-c1/step-4')[:count]):
+            turns = game_storage.get_open_turns('builder-normal', 2)
+
+        self.assertEqual(sorted(turn.starting_world_id for turn in turns),
+                         ['builder-data/1-c1/step-2', 'builder-data/2-c2/step-2'])
+        self.assertEqual([turn.game_id for turn in turns], ['game-1', 'game-2'])
+        # The replacement was drawn from the same listing, which also had the screenshots
+        self.assertEqual(container_client.list_blobs.call_count, 1)
+
+    def test_open_turns_short_of_replacements(self):
+        game_storage, _ = self.create_storage_with_blobs([
+            'builder-data/1-c1/step-2', 'builder-data/1-c1/step-2_north.png',
+            'builder-data/1-c1/step-4', 'builder-data/2-c2/step-2'])
+
+        turns = game_storage.get_open_turns('builder-normal', 3)
+
+        # Only one of the three worlds has its screenshot, and there are no replacements
+        self.assertEqual([turn.starting_world_id for turn in turns],
+                         ['builder-data/1-c1/step-2'])
+
+    def test_open_turns_indexed_after_games_of_other_hit_types(self):
+        game_storage, _ = self.create_storage_with_blobs([
+            'builder-data/1-c1/step-2', 'builder-data/1-c1/step-2_north.png'])
+        game_storage.game_index_hit_types = ['builder-normal', 'builder-hard']
+        game_indexes = {'builder-normal': 4, 'builder-hard': 9}
+        game_storage.table_client.query_entities.side_effect = lambda query_filter, select: iter([
+            {'PartitionKey': f'game-{game_index}', 'RowKey': f'hit-{game_index}'}
+            for hit_type, game_index in game_indexes.items() if hit_type in query_filter])
+
+        turns = game_storage.get_open_turns('builder-normal', 1)
+
+        # The results of both hit types are saved in the same directory by game id
+        self.assertEqual([turn.game_id for turn in turns], ['game-10'])
+
+    def test_coverage_sampling_skips_structures_without_worlds(self):
+        game_storage, _ = self.create_storage_with_blobs([
+            'builder-data/1-c1/step-2', 'builder-data/1-c1/step-4'])
+        game_storage.coverage_balanced = True
+        game_storage.coverage_sampler = CoverageSampler({'c1': 5, 'c2': 0, 'c3': 0})
+
+        drawn_structure_ids = []
+        sample = game_storage.coverage_sampler.sample
+
+        def record_sample():
+            drawn_structure_ids.append(sample())
+            return drawn_structure_ids[-1]
+        game_storage.coverage_sampler.sample = record_sample
+
+        starting_world_ids = game_storage.select_start_worlds_ids(
+            game_count=2, turn_type='builder-normal')
+
+        self.assertEqual(sorted(starting_world_ids),
+                         ['builder-data/1-c1/step-2', 'builder-data/1-c1/step-4'])
+        # c2 and c3 have no worlds listed and are never drawn, despite their weight, and c1
+        # is drawn once per round
+        self.assertEqual(drawn_structure_ids, ['c1', None, 'c1'])
+        self.assertEqual(game_storage.coverage_sampler.count('c1'), 7)
+
+    def test_missing_assets_list_uncached_directories(self):
+        game_storage, container_client = self.create_storage_with_blobs([
+            'builder-data/1-c1/step-2', 'builder-data/3-c3/step-6',
+            'builder-data/3-c3/step-6_north.png'])
+
+        missing_assets = game_storage.missing_starting_world_assets(
+            ['builder-data/1-c1/step-2', 'builder-data/3-c3/step-6'])
+        game_storage.missing_starting_world_assets(['builder-data/3-c3/step-6'])
+
+        self.assertEqual(missing_assets,
+                         {'builder-data/1-c1/step-2': ['builder-data/1-c1/step-2_north.png']})
+        self.assertEqual(sorted(call.kwargs['name_starts_with']
+                                for call in container_client.list_blobs.call_args_list),
+                         ['builder-data/1-c1/', 'builder-data/3-c3/'])
+
+    def test_result_grids_list_each_turn_directory(self):
+        game_storage, container_client = self.create_storage_with_blobs([
+            'builder-data/actionHit/game-1/step-1',
+            'builder-data/actionHit/game-1/step-2',
+            'builder-data/actionHit/game-12/step-1',
+            'builder-data/actionHit/game-2/step-1'])
+        container_client.download_blob.side_effect = lambda name: mock.Mock(
+            readall=mock.Mock(return_value=b'{"worldEndingState": {"blocks": [[0, 0, 0, 3]]}}'))
+        turns = []
+        for i in (1, 2, 3):
+            turns.append(SingleTurnDatasetTurn(
+                f'game-{i}', 'builder-normal', 'c1', 'builder-data', '1-c1', 'step-2'))
+            turns[-1].hit_id = f'hit-{i}'
+
+        result_grids = game_storage.load_result_grids(turns, 'mturk-single-turn')
+
+        self.assertEqual(set(result_grids.keys()), {'hit-1', 'hit-2'})
+        # Neither the directory of game 12 nor the whole actionHit directory are listed
+        self.assertEqual(sorted(call.kwargs['name_starts_with']
+                                for call in container_client.list_blobs.call_args_list),
+                         [f'builder-data/actionHit/game-{i}/' for i in (1, 2, 3)])
+        self.assertEqual(sorted(call.args[0]
+                                for call in container_client.download_blob.call_args_list),
+                         ['builder-data/actionHit/game-1/step-2',
+                          'builder-data/actionHit/game-2/step-1'])
+
+
+class SingleTurnDatasetTurnTest(unittest.TestCase):
+
+    ROWS = [
+        {'PartitionKey': 'game-1', 'RowKey': 'hit-1', 'HitType': 'builder-normal',
+         'InitializedWorldStructureId': 'c1', 'InitializedWorldPath': 'mturk-vw/data/1-c1/step-2',
+         'IsHITQualified': True, 'WorkerId': 'worker', 'InputInstruction': 'Place a block',
+         'ActionDataPath': 'mturk-single-turn/data/actionHit/game-1'},
+        {'PartitionKey': 'game-2', 'RowKey': 'hit-2', 'HitType': 'builder-normal',
+         'InitializedWorld': 'mturk-vw/data/1-c1/step-4.png'},
+        {'PartitionKey': 'game-3', 'RowKey': 'hit-3', 'HitType': 'builder-normal',
+         'InitializedWorldPath': 'invalid/path'},
+    ]
+
+    def assert_same_turns(self, turn, expected_turn):
+        for field in SingleTurnDatasetColumns.FIELDS + ('screenshot_step_view',):
+            self.assertEqual(getattr(turn, field), getattr(expected_turn, field), field)
+
+    def test_bulk_hydration_matches_single_rows(self):
+        turns = SingleTurnDatasetTurn.from_database_entries(self.ROWS)
+        self.assertEqual(len(turns), 2)
+        for turn, row in zip(turns, self.ROWS):
+            self.assert_same_turns(turn, SingleTurnDatasetTurn.from_database_entry(row))
+
+    def test_columns_round_trip(self):
+        columns = SingleTurnDatasetColumns.from_database_entries(self.ROWS)
+        self.assertEqual(len(columns), 2)
+        self.assertEqual(columns.starting_step, ['step-2', 'step-4'])
+        turns = SingleTurnDatasetTurn.from_database_entries(self.ROWS)
+        for turn, expected_turn in zip(columns, turns):
+            self.assert_same_turns(turn, expected_turn)
+
+        entries = columns.to_database_entries('mturk-vw')
+        self.assertEqual(entries, [turn.to_database_entry('mturk-vw') for turn in turns])
+
+    def test_turns_have_no_dict(self):
+        turn = SingleTurnDatasetTurn.from_database_entry(self.ROWS[0])
+        self.assertFalse(hasattr(turn, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Test canonical hashing of voxel grids and the index of starting worlds."""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from common import voxels  # noqa: E402
+from common.structure_hashing import StructureHashIndex, structure_hash  # noqa: E402
+
+
+class StructureHashTest(unittest.TestCase):
+
+    def create_grid(self):
+        """An L shaped structure with two colors, which has no rotational symmetry."""
+        grid = np.zeros(voxels.BUILD_ZONE_SIZE, dtype=np.int8)
+        grid[0, 2, 2] = 1
+        grid[0, 3, 2] = 1
+        grid[0, 4, 2] = 1
+        grid[0, 4, 3] = 2
+        grid[1, 2, 2] = 3
+        return grid
+
+    def test_hash_invariant_to_horizontal_translation(self):
+        grid = self.create_grid()
+        translated_grid = np.roll(grid, shift=(3, 4), axis=(1, 2))
+        self.assertEqual(structure_hash(grid), structure_hash(translated_grid))
+
+    def test_hash_invariant_to_yaw_rotation(self):
+        grid = self.create_grid()
+        for rotations in range(1, 4):
+            rotated_grid = np.rot90(grid, k=rotations, axes=(1, 2))
+            self.assertEqual(structure_hash(grid), structure_hash(rotated_grid))
+
+    def test_hash_depends_on_height_and_colors(self):
+        grid = self.create_grid()
+        lifted_grid = np.roll(grid, shift=1, axis=0)
+        recolored_grid = grid.copy()
+        recolored_grid[0, 4, 3] = 5
+        mirrored_grid = grid[:, ::-1, :]
+
+        self.assertNotEqual(structure_hash(grid), structure_hash(lifted_grid))
+        self.assertNotEqual(structure_hash(grid), structure_hash(recolored_grid))
+        self.assertNotEqual(structure_hash(grid), structure_hash(mirrored_grid))
+
+
+class StructureHashIndexTest(unittest.TestCase):
+
+    def test_sample_unique_skips_duplicated_structures(self):
+        index = StructureHashIndex({
+            'builder-data/1-c1/step-2': 'a',
+            'builder-data/2-c1/step-4': 'a',
+            'builder-data/3-c2/step-2': 'b',
+            'builder-data/4-c3/step-2': 'c',
+        })
+        candidates = list(index.blob_hashes.keys()) + ['builder-data/5-c4/step-2']
+
+        selected = index.sample_unique(candidates, count=10)
+        self.assertEqual(len(selected), 4)
+        selected_hashes = [index.hash_of(blob_name) for blob_name in selected]
+        self.assertEqual(selected_hashes.count('a'), 1)
+        # Blobs not in the index are always selectable
+        self.assertIn('builder-data/5-c4/step-2', selected)
+
+    def test_sample_unique_excludes_issued_structures(self):
+        index = StructureHashIndex({'x': 'a', 'y': 'b', 'z': 'c'})
+        selected = index.sample_unique(['x', 'y', 'z'], count=3, exclude_hashes={'a', 'b'})
+        self.assertEqual(selected, ['z'])
+
+
+if __name__ == '__main__':
+    unittest.main()
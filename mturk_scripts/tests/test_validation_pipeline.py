@@ -0,0 +1,183 @@
+"""Test the order, short-circuit and statistics of the validation pipeline."""
+
+import os
+import sys
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from validation_pipeline import (  # noqa: E402
+    BatchValidationRule, ValidationPipeline, ValidationRule)
+from singleturn.validation_rules import assignment_rules  # noqa: E402
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRule(ValidationRule):
+    """Rejects the assignments whose key @name is set, advancing the clock @seconds."""
+
+    def __init__(self, name, seconds, clock, cost_seconds=0.001, annotates=False,
+                 stateful=False, skips_fast_path=False) -> None:
+        self.name = name
+        self.seconds = seconds
+        self.clock = clock
+        self.cost_seconds = cost_seconds
+        self.annotates = annotates
+        self.stateful = stateful
+        self.skips_fast_path = skips_fast_path
+        self.checked = []
+
+    def check(self, assignment_dict):
+        self.clock.now += self.seconds
+        self.checked.append(assignment_dict['HITId'])
+        return not assignment_dict.get(self.name)
+
+
+class FakeBatchRule(BatchValidationRule):
+
+    name = 'batch'
+    skips_fast_path = True
+
+    def __init__(self) -> None:
+        self.checked = []
+
+    def check_batch(self, assignments):
+        self.checked.append(sorted(assignments.keys()))
+        return {hit_id for hit_id, assignment_dict in assignments.items()
+                if assignment_dict.get(self.name)}
+
+
+class ValidationPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_first_failed_rule_stops_validation(self):
+        cheap = FakeRule('cheap', 0.001, self.clock, cost_seconds=0.001)
+        expensive = FakeRule('expensive', 0.1, self.clock, cost_seconds=0.1)
+        pipeline = ValidationPipeline([expensive, cheap], clock=self.clock)
+
+        self.assertTrue(pipeline.validate({'HITId': 0}))
+        rejected = {'HITId': 1, 'cheap': True}
+        self.assertFalse(pipeline.validate(rejected))
+
+        self.assertEqual(rejected['RejectedBy'], 'cheap')
+        self.assertEqual(cheap.checked, [0, 1])
+        self.assertEqual(expensive.checked, [0])
+        self.assertEqual(pipeline.stats['cheap'].rejected, 1)
+        self.assertAlmostEqual(pipeline.stats['expensive'].seconds, 0.1)
+        self.assertAlmostEqual(pipeline.mean_assignment_seconds(), 0.051)
+
+    def test_measured_rejection_rate_reorders_rules(self):
+        rare = FakeRule('rare', 0.001, self.clock, cost_seconds=0.001)
+        frequent = FakeRule('frequent', 0.002, self.clock, cost_seconds=0.002)
+        annotation = FakeRule('annotation', 0.01, self.clock, cost_seconds=0.01,
+                              annotates=True)
+        pipeline = ValidationPipeline([frequent, rare, annotation], min_samples=5,
+                                      reorder_every=10, clock=self.clock)
+        self.assertEqual([rule.name for rule in pipeline.rules],
+                         ['annotation', 'rare', 'frequent'])
+
+        for hit_id in range(10):
+            pipeline.validate({'HITId': hit_id, 'frequent': hit_id % 2 == 0})
+
+        # 2 ms per rejection of half the assignments is cheaper than 1 ms with none
+        self.assertEqual([rule.name for rule in pipeline.rules],
+                         ['annotation', 'frequent', 'rare'])
+        self.assertIn('annotation', pipeline.report().splitlines()[1])
+
+    def test_stateful_rules_run_after_batch_rules(self):
+        cheap = FakeRule('cheap', 0.001, self.clock, cost_seconds=0.001)
+        indexing = FakeRule('indexing', 0.0, self.clock, cost_seconds=0.0, stateful=True)
+        expensive = FakeRule('expensive', 0.1, self.clock, cost_seconds=0.1)
+        batch_rule = FakeBatchRule()
+        pipeline = ValidationPipeline([indexing, batch_rule, expensive, cheap], min_samples=1,
+                                      reorder_every=1, clock=self.clock)
+        assignments = {hit_id: {'HITId': hit_id, 'indexing': hit_id == 4,
+                                'expensive': hit_id < 2, 'batch': hit_id == 2}
+                       for hit_id in range(5)}
+        for assignment_dict in assignments.values():
+            assignment_dict['IsHITQualified'] = pipeline.validate(assignment_dict)
+        self.assertEqual(indexing.checked, [])
+
+        pipeline.validate_sweep(assignments)
+
+        # Cheaper than the others, the rule still sees only the assignments that passed them
+        self.assertEqual([rule.name for rule in pipeline.rules], ['cheap', 'expensive'])
+        self.assertEqual(indexing.checked, [3, 4])
+        self.assertEqual([hit_id for hit_id, assignment_dict in assignments.items()
+                          if assignment_dict['IsHITQualified']], [3])
+        self.assertEqual(assignments[4]['RejectedBy'], 'indexing')
+        self.assertEqual(pipeline.stats['indexing'].skipped, 3)
+        self.assertIn('indexing', pipeline.report())
+
+    def test_batch_rule_checks_qualified_assignments(self):
+        rule = FakeRule('rule', 0.001, self.clock)
+        batch_rule = FakeBatchRule()
+        pipeline = ValidationPipeline([rule, batch_rule], clock=self.clock)
+        assignments = {
+            0: {'HITId': 0},
+            1: {'HITId': 1, 'rule': True},
+            2: {'HITId': 2, 'FastPath': True},
+            3: {'HITId': 3, 'batch': True},
+        }
+        for assignment_dict in assignments.values():
+            assignment_dict['IsHITQualified'] = pipeline.validate(assignment_dict)
+
+        pipeline.validate_sweep(assignments)
+
+        self.assertEqual(batch_rule.checked, [[0, 3]])
+        self.assertEqual([hit_id for hit_id, assignment_dict in assignments.items()
+                          if assignment_dict['IsHITQualified']], [0, 2])
+        self.assertEqual(assignments[3]['RejectedBy'], 'batch')
+        self.assertEqual(pipeline.stats['batch'].skipped, 2)
+
+    def test_budget_warning(self):
+        slow = FakeRule('slow', 0.1, self.clock)
+        pipeline = ValidationPipeline([slow], budget_seconds=0.05, report_every=2,
+                                      clock=self.clock)
+        with mock.patch('validation_pipeline._LOGGER') as logger_mock:
+            pipeline.validate({'HITId': 0})
+            logger_mock.warning.assert_not_called()
+            pipeline.validate({'HITId': 1})
+        logger_mock.warning.assert_called_once()
+
+    def test_single_turn_rules(self):
+        worker_stats = mock.MagicMock()
+        worker_stats.use_fast_path.side_effect = lambda worker_id: worker_id == 'trusted'
+        duplicate_index = mock.MagicMock()
+        duplicate_index.find_duplicates.return_value = []
+        pipeline = ValidationPipeline(assignment_rules(duplicate_index, worker_stats))
+
+        def assignment(worker_id, instruction):
+            return {'HITId': 'hit', 'WorkerId': worker_id, 'Answer': [
+                {'QuestionIdentifier': 'InputInstructionSingleTurn', 'FreeText': instruction}]}
+
+        short = assignment('worker', 'Put')
+        self.assertFalse(pipeline.validate(short))
+        self.assertEqual(short['RejectedBy'], 'instruction_length')
+        trusted = assignment('trusted', 'Place a red block on top of the tower')
+        self.assertTrue(pipeline.validate(trusted))
+        self.assertTrue(trusted['FastPath'])
+        self.assertEqual(pipeline.stats['english_language'].skipped, 1)
+        duplicate_index.add.assert_not_called()
+
+        trusted['IsHITQualified'] = True
+        pipeline.validate_sweep({'hit': trusted})
+        self.assertTrue(trusted['IsHITQualified'])
+        self.assertEqual(trusted['DuplicateOf'], [])
+        duplicate_index.add.assert_called_once_with(
+            'hit', 'Place a red block on top of the tower')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Test the NumPy renderer of the starting world screenshots."""
+
+import os
+import struct
+import sys
+import unittest
+import zlib
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from utils import voxel_renderer  # noqa: E402
+
+RED = (255, 0, 0)
+BACKGROUND = voxel_renderer.BACKGROUND_COLOR
+
+
+def fixture_grid():
+    """Grid of (height, x, z) 2x3x3, with a red block at the north west corner of the floor
+    and a blue block behind it to the east, at the south side."""
+    grid = np.zeros((2, 3, 3), dtype=np.int8)
+    grid[0, 0, 0] = 3
+    grid[0, 1, 2] = 1
+    return grid
+
+
+class VoxelRendererTest(unittest.TestCase):
+
+    def test_north_view(self):
+        image = voxel_renderer.render_view(fixture_grid(), 'north', scale=1, draw_edges=False)
+
+        self.assertEqual(image.shape, (2, 3, 3))
+        # Looking south the west side is on the right, and the floor at the bottom
+        self.assertEqual(tuple(image[1, 2]), RED)
+        # The farthest block is darkened by half
+        self.assertEqual(tuple(image[1, 1]), (0, 0, 127))
+        self.assertEqual(tuple(image[0, 0]), BACKGROUND)
+
+    def test_top_view(self):
+        image = voxel_renderer.render_view(fixture_grid(), 'top', scale=1, draw_edges=False)
+
+        # North at the top and east to the right, the floor is the farthest layer
+        self.assertEqual(image.shape, (3, 3, 3))
+        self.assertEqual(tuple(image[0, 0]), (127, 0, 0))
+        self.assertEqual(tuple(image[2, 1]), (0, 0, 127))
+        self.assertEqual(np.count_nonzero(np.any(image != BACKGROUND, axis=2)), 2)
+
+    def test_edges_and_png(self):
+        image = voxel_renderer.render_view(fixture_grid(), 'north', scale=4)
+        self.assertEqual(image.shape, (8, 12, 3))
+        # Outline of the red block, and its color inside
+        self.assertEqual(tuple(image[4, 8]), voxel_renderer.EDGE_COLOR)
+        self.assertEqual(tuple(image[5, 9]), RED)
+
+        png = voxel_renderer.encode_png(image)
+
+        self.assertTrue(png.startswith(b'\x89PNG\r\n\x1a\n'))
+        width, height = struct.unpack('>II', png[16:24])
+        self.assertEqual((width, height), (12, 8))
+        idat_length = struct.unpack('>I', png[33:37])[0]
+        scanlines = np.frombuffer(zlib.decompress(png[41:41 + idat_length]), dtype=np.uint8)
+        np.testing.assert_array_equal(scanlines.reshape(8, 37)[:, 1:].reshape(8, 12, 3), image)
+
+    def test_unknown_view(self):
+        with self.assertRaises(ValueError):
+            voxel_renderer.render_view(fixture_grid(), 'up')
+
+
+if __name__ == '__main__':
+    unittest.main()
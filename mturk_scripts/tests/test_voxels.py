@@ -0,0 +1,51 @@
+"""Test conversion of VoxelWorld files into grids and the comparison of grids."""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from common import voxels  # noqa: E402
+
+
+class VoxelsTest(unittest.TestCase):
+
+    def test_grid_from_step_data(self):
+        step_data = {'worldEndingState': {'blocks': [[0, 0, 0, 3], [-5, -1, -5, 1], [9, 9, 9, 2]]}}
+        grid = voxels.grid_from_step_data(step_data)
+        self.assertEqual(grid.shape, voxels.BUILD_ZONE_SIZE)
+        self.assertEqual(grid[1, 5, 5], 3)
+        self.assertEqual(grid[0, 0, 0], 1)
+        # Block outside the build zone is ignored
+        self.assertEqual(np.count_nonzero(grid), 2)
+
+    def test_grid_from_empty_step_data(self):
+        grid = voxels.grid_from_step_data('{"worldEndingState": {"blocks": []}}')
+        self.assertEqual(np.count_nonzero(grid), 0)
+
+    def test_grid_diff(self):
+        start_grid = np.zeros(voxels.BUILD_ZONE_SIZE, dtype=np.int8)
+        start_grid[0, 0, 0] = 1
+        start_grid[0, 1, 0] = 2
+        end_grid = start_grid.copy()
+        end_grid[0, 0, 0] = 0  # removed
+        end_grid[0, 1, 0] = 3  # color changed
+        end_grid[1, 1, 0] = 4  # added
+
+        added, removed = voxels.grid_diff(start_grid, end_grid)
+        self.assertEqual(set(map(tuple, np.argwhere(added))), {(0, 1, 0), (1, 1, 0)})
+        self.assertEqual(set(map(tuple, np.argwhere(removed))), {(0, 0, 0), (0, 1, 0)})
+
+    def test_diff_sizes(self):
+        start_grids = np.zeros((3,) + voxels.BUILD_ZONE_SIZE, dtype=np.int8)
+        end_grids = start_grids.copy()
+        end_grids[1, 0, 0, 0] = 1
+        end_grids[2, 0, :, 0] = 2
+        np.testing.assert_array_equal(voxels.diff_sizes(start_grids, end_grids), [0, 1, 11])
+
+
+if __name__ == '__main__':
+    unittest.main()
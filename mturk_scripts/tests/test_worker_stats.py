@@ -0,0 +1,72 @@
+"""Test the statistics of workers and their persistence."""
+
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+
+from worker_stats import WorkerStatsStore  # noqa: E402
+
+
+class WorkerStatsStoreTest(unittest.TestCase):
+
+    def create_assignment(self, worker_id, is_qualified=True, duplicate_of=None,
+                          submit_seconds=60):
+        accept_time = datetime.datetime(2022, 10, 1, 12, 0, 0)
+        return {
+            'WorkerId': worker_id,
+            'IsHITQualified': is_qualified,
+            'DuplicateOf': duplicate_of or [],
+            'AcceptTime': accept_time,
+            'SubmitTime': accept_time + datetime.timedelta(seconds=submit_seconds),
+        }
+
+    def test_record_assignments(self):
+        store = WorkerStatsStore()
+        store.record_assignment(self.create_assignment('w1', submit_seconds=30))
+        store.record_assignment(self.create_assignment('w1', submit_seconds=90))
+        store.record_assignment(self.create_assignment(
+            'w1', is_qualified=False, duplicate_of=['hit-1'], submit_seconds=40))
+
+        worker_stats = store.get('w1')
+        self.assertEqual(worker_stats.qualified, 2)
+        self.assertEqual(worker_stats.unqualified, 1)
+        self.assertAlmostEqual(worker_stats.duplicate_rate, 1 / 3)
+        self.assertEqual(worker_stats.median_submit_seconds, 40)
+
+    def test_trusted_workers(self):
+        store = WorkerStatsStore(trusted_min_assignments=3, audit_rate=0.0)
+        for _ in range(3):
+            store.record_assignment(self.create_assignment('good'))
+            store.record_assignment(self.create_assignment('bad', is_qualified=False))
+        store.record_assignment(self.create_assignment('new'))
+
+        self.assertTrue(store.use_fast_path('good'))
+        self.assertFalse(store.use_fast_path('bad'))
+        self.assertFalse(store.use_fast_path('new'))
+        self.assertFalse(store.use_fast_path('unknown'))
+
+    def test_save_and_load(self):
+        store = WorkerStatsStore()
+        store.record_assignment(self.create_assignment('w1'))
+        store.record_assignment(self.create_assignment('w2', is_qualified=False))
+        with tempfile.TemporaryDirectory() as dirname:
+            filepath = os.path.join(dirname, 'worker_stats.json')
+            store.save(filepath)
+            loaded_store = WorkerStatsStore.load(filepath)
+
+        self.assertEqual(len(loaded_store), 2)
+        self.assertEqual(loaded_store.get('w1').qualified, 1)
+        self.assertEqual(loaded_store.get('w2').unqualified, 1)
+        self.assertEqual(loaded_store.get('w1').submit_seconds, [60])
+
+    def test_load_missing_file(self):
+        store = WorkerStatsStore.load('non_existent_worker_stats.json')
+        self.assertEqual(len(store), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
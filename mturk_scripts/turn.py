@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List
 
 
 class Turn:
@@ -6,7 +6,15 @@ class Turn:
 
     Contains all the data necessary to keep track of a turn, and maps its attributes
     into the database schema.
+
+    Attributes are declared in `__slots__`, as analysis scripts keep millions of turns in
+    memory. Subclasses must declare their own attributes in `__slots__` as well.
     """
+    __slots__ = (
+        'game_id', 'turn_type', 'initialized_structure_id', 'hit_id', 'worker_id',
+        'is_qualified', 'result_blob_path', 'input_instructions',
+    )
+
     def __init__(
             self, game_id: str, turn_type: str,
             initialized_structure_id: str) -> None:
@@ -40,5 +48,11 @@ class Turn:
     def from_database_entry(cls, row: Dict[str, Any]):
         raise NotImplementedError
 
+    @classmethod
+    def from_database_entries(cls, rows: Iterable[Dict[str, Any]]) -> List['Turn']:
+        """Creates the turns of many rows. Rows that cannot be parsed are skipped."""
+        turns = (cls.from_database_entry(row) for row in rows)
+        return [turn for turn in turns if turn is not None]
+
     def to_database_entry(self, starting_structures_container_name: str) -> Dict[str, Any]:
         raise NotImplementedError
@@ -0,0 +1,239 @@
+"""Validation of the submitted assignments with pluggable rules, cheapest first.
+
+Each rule checks one property of an assignment, e.g. the length or the language of the
+instruction, and the first rule that fails disqualifies the assignment without running the
+rest. Rules that need all the assignments of a sweep at once, e.g. to download their worlds
+in batch, are `BatchValidationRule`s, run after the others on the assignments still
+qualified.
+
+Rules are run in increasing order of their cost divided by their rejection rate, which
+minimizes the expected cost of a short-circuited chain of independent checks. Both are
+measured while validating, starting from the declared `cost_seconds` of each rule, and the
+order is updated every `reorder_every` assignments. Rules that only annotate the assignment
+for the others, with `annotates` set, always run first. Rules that update their own state with
+each check, with `stateful` set, are run by `validate_sweep` after the batch rules, in the given
+order, so that their state only depends on the assignments that passed all the other rules.
+
+>>> pipeline = ValidationPipeline([InstructionLengthRule(), EnglishLanguageRule()])
+>>> hit_manager = HITManager(verification_function=pipeline.validate,
+...                          sweep_verification_function=pipeline.validate_sweep, **config)
+
+The evaluations, rejections and time of each rule are logged every `report_every`
+assignments, with a warning if the mean time per assignment is above `budget_seconds`.
+"""
+import time
+
+from typing import Any, Dict, List, Optional, Set
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+
+class ValidationRule:
+    """Check of a single assignment.
+
+    Attributes:
+        name (str): name of the rule in the reports and in `assignment_dict['RejectedBy']`.
+        cost_seconds (float): expected time of a check, until it is measured.
+        annotates (bool): whether the rule sets keys of the assignment read by other
+            rules. These rules never reject, and run first.
+        stateful (bool): whether the check updates the state of the rule, e.g. an index of
+            the previous assignments. These rules run after the batch rules, and are never
+            reordered.
+        skips_fast_path (bool): whether the rule is skipped for the assignments with
+            `assignment_dict['FastPath']` set.
+    """
+
+    name = 'rule'
+    cost_seconds = 0.001
+    annotates = False
+    stateful = False
+    skips_fast_path = False
+
+    def check(self, assignment_dict: Dict[str, Any]) -> bool:
+        """Whether @assignment_dict passes the rule. It may add keys to the dictionary."""
+        raise NotImplementedError
+
+
+class BatchValidationRule(ValidationRule):
+    """Check of all the assignments of a sweep at once."""
+
+    def check_batch(self, assignments: Dict[str, Dict[str, Any]]) -> Set[str]:
+        """Returns the HIT ids of the assignments of @assignments that fail the rule."""
+        raise NotImplementedError
+
+
+class RuleStats:
+    """Evaluations, rejections and time of a rule."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.evaluated = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.seconds = 0.0
+
+    @property
+    def mean_seconds(self) -> Optional[float]:
+        return self.seconds / self.evaluated if self.evaluated > 0 else None
+
+    @property
+    def rejection_rate(self) -> float:
+        """Fraction of the evaluated assignments rejected, smoothed for few evaluations."""
+        return (self.rejected + 1) / (self.evaluated + 2)
+
+
+class ValidationPipeline:
+    """Runs the rules on each assignment until one fails, see the module documentation.
+
+    Args:
+        rules (list): `ValidationRule`s and `BatchValidationRule`s, in any order.
+        budget_seconds (float): maximum mean time of the rules per assignment.
+        min_samples (int): evaluations of a rule before its measured time replaces the
+            declared one.
+        reorder_every (int): assignments between two updates of the order of the rules.
+        report_every (int): assignments between two reports in the log.
+        clock (callable): returns the current time in seconds.
+    """
+
+    def __init__(self, rules: List[ValidationRule], budget_seconds: float = 0.05,
+                 min_samples: int = 20, reorder_every: int = 50, report_every: int = 200,
+                 clock=time.perf_counter) -> None:
+        self.rules = [rule for rule in rules
+                      if not isinstance(rule, BatchValidationRule) and not rule.stateful]
+        self.batch_rules = [rule for rule in rules if isinstance(rule, BatchValidationRule)]
+        self.stateful_rules = [rule for rule in rules
+                               if not isinstance(rule, BatchValidationRule) and rule.stateful]
+        self.budget_seconds = budget_seconds
+        self.min_samples = min_samples
+        self.reorder_every = reorder_every
+        self.report_every = report_every
+        self.clock = clock
+        self.stats = {rule.name: RuleStats(rule.name) for rule in rules}
+        self.assignment_count = 0
+        self.reorder()
+
+    def expected_seconds(self, rule: ValidationRule) -> float:
+        stats = self.stats[rule.name]
+        if stats.evaluated < self.min_samples:
+            return rule.cost_seconds
+        return stats.mean_seconds
+
+    def reorder(self):
+        """Sorts the rules by expected time per rejection, with the annotating ones first."""
+        def rank(rule):
+            return (not rule.annotates,
+                    self.expected_seconds(rule) / self.stats[rule.name].rejection_rate)
+        self.rules.sort(key=rank)
+        self.batch_rules.sort(key=rank)
+
+    def _run(self, rule: ValidationRule, function, argument):
+        started_at = self.clock()
+        result = function(argument)
+        self.stats[rule.name].seconds += self.clock() - started_at
+        return result
+
+    def validate(self, assignment_dict: Dict[str, Any]) -> bool:
+        """Runs the rules on @assignment_dict until one fails, the `verification_function`
+        of the `HITManager`.
+
+        The name of the failed rule is saved in `assignment_dict['RejectedBy']`.
+        """
+        assignment_dict['RejectedBy'] = None
+        qualified = True
+        for rule in self.rules:
+            stats = self.stats[rule.name]
+            if rule.skips_fast_path and assignment_dict.get('FastPath'):
+                stats.skipped += 1
+                continue
+            passed = self._run(rule, rule.check, assignment_dict)
+            stats.evaluated += 1
+            if not passed:
+                stats.rejected += 1
+                assignment_dict['RejectedBy'] = rule.name
+                qualified = False
+                break
+        if not qualified:
+            # Batch and stateful rules are not run on the assignments rejected here
+            for rule in self.batch_rules + self.stateful_rules:
+                self.stats[rule.name].skipped += 1
+
+        self.assignment_count += 1
+        if self.assignment_count % self.reorder_every == 0:
+            self.reorder()
+        if self.assignment_count % self.report_every == 0:
+            self.log_report()
+        return qualified
+
+    def validate_sweep(self, assignments: Dict[str, Dict[str, Any]]):
+        """Runs the batch rules, then the stateful ones, on the qualified @assignments, the
+        `sweep_verification_function` of the `HITManager`.
+
+        Assignments that fail a rule are not qualified, and not checked by the next ones.
+        """
+        pending = {hit_id: assignment_dict for hit_id, assignment_dict in assignments.items()
+                   if assignment_dict.get('IsHITQualified')}
+        qualified_count = len(pending)
+        for rule in self.batch_rules:
+            stats = self.stats[rule.name]
+            checked = {}
+            for hit_id, assignment_dict in pending.items():
+                if rule.skips_fast_path and assignment_dict.get('FastPath'):
+                    stats.skipped += 1
+                else:
+                    checked[hit_id] = assignment_dict
+            if len(checked) == 0:
+                continue
+            rejected_hit_ids = self._run(rule, rule.check_batch, checked)
+            stats.evaluated += len(checked)
+            stats.rejected += len(rejected_hit_ids)
+            for hit_id in rejected_hit_ids:
+                pending[hit_id]['IsHITQualified'] = False
+                pending[hit_id]['RejectedBy'] = rule.name
+                del pending[hit_id]
+
+        for rule in self.stateful_rules:
+            stats = self.stats[rule.name]
+            stats.skipped += qualified_count - len(pending)
+            for hit_id, assignment_dict in list(pending.items()):
+                if rule.skips_fast_path and assignment_dict.get('FastPath'):
+                    stats.skipped += 1
+                    continue
+                passed = self._run(rule, rule.check, assignment_dict)
+                stats.evaluated += 1
+                if not passed:
+                    stats.rejected += 1
+                    assignment_dict['IsHITQualified'] = False
+                    assignment_dict['RejectedBy'] = rule.name
+                    del pending[hit_id]
+
+    def mean_assignment_seconds(self) -> Optional[float]:
+        """Mean time of all the rules per validated assignment."""
+        if self.assignment_count == 0:
+            return None
+        return sum(stats.seconds for stats in self.stats.values()) / self.assignment_count
+
+    def report(self) -> str:
+        """Table with the evaluations, rejections and time of each rule, in running order."""
+        lines = [f'{"rule":<24} {"evaluated":>9} {"rejected":>8} {"skipped":>7} '
+                 f'{"mean ms":>8} {"total s":>8}']
+        for rule in self.rules + self.batch_rules + self.stateful_rules:
+            stats = self.stats[rule.name]
+            mean_seconds = stats.mean_seconds
+            lines.append(
+                f'{rule.name:<24} {stats.evaluated:>9} {stats.rejected:>8} {stats.skipped:>7} '
+                + (f'{mean_seconds * 1000:8.2f}' if mean_seconds is not None else f'{"-":>8}')
+                + f' {stats.seconds:8.2f}')
+        mean_seconds = self.mean_assignment_seconds()
+        if mean_seconds is not None:
+            lines.append(f'{self.assignment_count} assignments, {mean_seconds * 1000:.2f} ms '
+                         f'per assignment, budget {self.budget_seconds * 1000:.2f} ms')
+        return '\n'.join(lines)
+
+    def log_report(self):
+        _LOGGER.info(f"Validation rules:\n{self.report()}")
+        mean_seconds = self.mean_assignment_seconds()
+        if mean_seconds is not None and mean_seconds > self.budget_seconds:
+            _LOGGER.warning(f"Validation takes {mean_seconds * 1000:.2f} ms per assignment, "
+                            f"above the budget of {self.budget_seconds * 1000:.2f} ms")
@@ -0,0 +1,152 @@
+"""In-memory statistics of the assignments submitted by each worker.
+
+The statistics are loaded once when the collection starts, updated with every reviewed
+assignment and saved to a compact json file, so they are kept between runs. They allow
+the validation to skip the expensive checks for workers with a good history.
+"""
+import json
+import os
+import random
+import statistics
+
+from typing import Any, Dict, List, Optional
+
+from common import logger
+
+_LOGGER = logger.get_logger(__name__)
+
+
+class WorkerStats:
+    """Counts of the reviewed assignments of a single worker."""
+
+    # Only the most recent submission times are kept to compute the median
+    MAX_SUBMIT_SECONDS = 50
+
+    def __init__(self, qualified: int = 0, unqualified: int = 0, duplicates: int = 0,
+                 submit_seconds: Optional[List[float]] = None) -> None:
+        self.qualified = qualified
+        self.unqualified = unqualified
+        self.duplicates = duplicates
+        self.submit_seconds = submit_seconds or []
+
+    @property
+    def total(self) -> int:
+        return self.qualified + self.unqualified
+
+    @property
+    def qualified_rate(self) -> float:
+        return self.qualified / self.total if self.total > 0 else 0.0
+
+    @property
+    def duplicate_rate(self) -> float:
+        return self.duplicates / self.total if self.total > 0 else 0.0
+
+    @property
+    def median_submit_seconds(self) -> Optional[float]:
+        if len(self.submit_seconds) == 0:
+            return None
+        return statistics.median(self.submit_seconds)
+
+    def record(self, is_qualified: bool, is_duplicate: bool = False,
+               submit_seconds: Optional[float] = None):
+        if is_qualified:
+            self.qualified += 1
+        else:
+            self.unqualified += 1
+        if is_duplicate:
+            self.duplicates += 1
+        if submit_seconds is not None:
+            self.submit_seconds.append(round(submit_seconds, 1))
+            del self.submit_seconds[:-self.MAX_SUBMIT_SECONDS]
+
+    def to_list(self) -> List[Any]:
+        return [self.qualified, self.unqualified, self.duplicates, self.submit_seconds]
+
+    @classmethod
+    def from_list(cls, values: List[Any]) -> 'WorkerStats':
+        return cls(*values)
+
+
+class WorkerStatsStore:
+    """Map from worker id to `WorkerStats`, persisted in a json file.
+
+    A worker is trusted once it has at least `trusted_min_assignments` reviewed
+    assignments, a qualified rate of at least `trusted_min_qualified_rate` and a duplicate
+    rate of at most `trusted_max_duplicate_rate`. A fraction `audit_rate` of the
+    assignments of trusted workers is still fully validated, so their statistics keep
+    being updated with the results of every check.
+    """
+
+    def __init__(self, filepath: Optional[str] = None, trusted_min_assignments: int = 10,
+                 trusted_min_qualified_rate: float = 0.9,
+                 trusted_max_duplicate_rate: float = 0.05, audit_rate: float = 0.1) -> None:
+        self.filepath = filepath
+        self.trusted_min_assignments = trusted_min_assignments
+        self.trusted_min_qualified_rate = trusted_min_qualified_rate
+        self.trusted_max_duplicate_rate = trusted_max_duplicate_rate
+        self.audit_rate = audit_rate
+        self.workers: Dict[str, WorkerStats] = {}
+
+    def __len__(self) -> int:
+        return len(self.workers)
+
+    def get(self, worker_id: str) -> WorkerStats:
+        if worker_id not in self.workers:
+            self.workers[worker_id] = WorkerStats()
+        return self.workers[worker_id]
+
+    def is_trusted(self, worker_id: str) -> bool:
+        worker_stats = self.workers.get(worker_id)
+        return (worker_stats is not None and
+                worker_stats.total >= self.trusted_min_assignments and
+                worker_stats.qualified_rate >= self.trusted_min_qualified_rate and
+                worker_stats.duplicate_rate <= self.trusted_max_duplicate_rate)
+
+    def use_fast_path(self, worker_id: str) -> bool:
+        """Whether to skip the expensive checks for an assignment of @worker_id."""
+        return self.is_trusted(worker_id) and random.random() >= self.audit_rate
+
+    def record_assignment(self, assignment_dict: Dict[str, Any]):
+        """Updates the worker statistics with a reviewed assignment.
+
+        Args:
+            assignment_dict (Dict[str, Any]): assignment as returned by
+                `HITManager.complete_open_assignments`, with keys 'WorkerId' and
+                'IsHITQualified', and optionally 'DuplicateOf', 'AcceptTime' and
+                'SubmitTime'.
+        """
+        submit_seconds = None
+        if assignment_dict.get('AcceptTime') and assignment_dict.get('SubmitTime'):
+            submit_seconds = (
+                assignment_dict['SubmitTime'] - assignment_dict['AcceptTime']).total_seconds()
+        self.get(assignment_dict['WorkerId']).record(
+            is_qualified=bool(assignment_dict['IsHITQualified']),
+            is_duplicate=len(assignment_dict.get('DuplicateOf') or []) > 0,
+            submit_seconds=submit_seconds)
+
+    def save(self, filepath: Optional[str] = None):
+        """Writes the statistics to disk, replacing the previous file atomically."""
+        filepath = filepath or self.filepath
+        temporary_filepath = filepath + '.tmp'
+        with open(temporary_filepath, 'w') as stats_file:
+            json.dump({worker_id: worker_stats.to_list()
+                       for worker_id, worker_stats in self.workers.items()},
+                      stats_file, separators=(',', ':'))
+        os.replace(temporary_filepath, filepath)
+
+    @classmethod
+    def load(cls, filepath: str, **kwargs) -> 'WorkerStatsStore':
+        """Reads the statistics of @filepath, or creates an empty store if it does not exist.
+
+        Args:
+            filepath (str): path of the json file with the statistics.
+            kwargs: other arguments of the class constructor.
+        """
+        store = cls(filepath, **kwargs)
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as stats_file:
+                store.workers = {
+                    worker_id: WorkerStats.from_list(values)
+                    for worker_id, values in json.load(stats_file).items()}
+            _LOGGER.info(f"Statistics of {len(store)} workers loaded from {filepath}")
+        return store
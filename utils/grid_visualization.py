@@ -1,22 +1,43 @@
 # from https://gitlab.aicrowd.com/aicrowd/challenges/iglu-challenge-2022/iglu-2022-rl-mhb-baseline/-/blob/master/agents/mhb_baseline/nlp_model/utils.py
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Sequence
+
 import numpy as np
+from matplotlib import colors as mcolors
 from matplotlib import pyplot as plt
 from matplotlib.ticker import MaxNLocator
 
+IDX2COLOR = {1: 'blue', 2: 'green', 3: 'red', 4: 'orange', 5: 'purple', 6: 'yellow'}
 
-def plot_grid(voxel, text=None, figsize=(6,6), fontsize=10):
-    idx2color = {1: 'blue', 2: 'green', 3: 'red', 4: 'orange', 5: 'purple', 6: 'yellow'}
-    vox = voxel.transpose(1, 2, 0)
-    colors = np.empty(vox.shape, dtype=object)
-    for i in range(vox.shape[0]):
-        for j in range(vox.shape[1]):
-            for k in range(vox.shape[2]):
-                if vox[i, j, k] != 0:
-                    colors[i][j][k] = str(idx2color[vox[i, j, k]])
+# Lookup table from block id to RGBA face color. Index 0 (air) is fully transparent,
+# so ax.voxels never draws it anyway.
+COLOR_LUT = np.zeros((len(IDX2COLOR) + 1, 4))
+COLOR_LUT[1:] = mcolors.to_rgba_array([IDX2COLOR[i] for i in range(1, len(IDX2COLOR) + 1)])
 
-    fig = plt.figure(figsize=figsize, dpi=200)
+# Figure and axes reused by each worker process of render_grids_to_png
+_WORKER_FIGURE = None
+_WORKER_AXES = None
+
+
+def _create_axes(fig):
     ax = fig.add_subplot(projection='3d', )
+    box = ax.get_position()
+    box.x0 = box.x0 - 0.05
+    box.x1 = box.x1 - 0.05
+    box.y1 = box.y1 + 0.16
+    box.y0 = box.y0 + 0.16
+    ax.set_position(box)
+    return ax
+
+
+def _draw_grid(ax, voxel, text=None, fontsize=10):
+    vox = np.asarray(voxel).transpose(1, 2, 0)
+    # Unknown block ids, negative ones included, are drawn as air instead of raising a
+    # KeyError or wrapping around the lookup table.
+    colors = COLOR_LUT[np.where((vox >= 0) & (vox < len(COLOR_LUT)), vox, 0)]
+
     ax.voxels(vox, facecolors=colors, edgecolor='k', )
 
     ax.xaxis.set_major_locator(MaxNLocator(integer=True, nbins=11))
@@ -26,19 +47,67 @@ def plot_grid(voxel, text=None, figsize=(6,6), fontsize=10):
     ax.set_yticks(np.arange(0, 12, 1), minor=True)
     ax.set_zticks(np.arange(0, 9, 1), minor=True)
 
-    box = ax.get_position()
-    box.x0 = box.x0 - 0.05
-    box.x1 = box.x1 - 0.05
-    box.y1 = box.y1 + 0.16
-    box.y0 = box.y0 + 0.16
-    ax.set_position(box)
-
     if text is not None:
-        plt.annotate(text, (0, 0), (0, -20), xycoords='axes fraction', textcoords='offset points',
-                     verticalalignment='top', wrap=True, fontsize=fontsize)
+        ax.annotate(text, (0, 0), (0, -20), xycoords='axes fraction', textcoords='offset points',
+                    verticalalignment='top', wrap=True, fontsize=fontsize)
+
+
+def plot_grid(voxel, text=None, figsize=(6,6), fontsize=10):
+    fig = plt.figure(figsize=figsize, dpi=200)
+    ax = _create_axes(fig)
+    _draw_grid(ax, voxel, text=text, fontsize=fontsize)
     return fig
-    
-    
+
+
+def _init_render_worker(figsize, dpi):
+    """Creates the figure and axes reused for every grid rendered by this process."""
+    global _WORKER_FIGURE, _WORKER_AXES
+    plt.switch_backend('Agg')
+    _WORKER_FIGURE = plt.figure(figsize=figsize, dpi=dpi)
+    _WORKER_AXES = _create_axes(_WORKER_FIGURE)
+
+
+def _render_grid_to_png(voxel, output_filepath, text=None, fontsize=10):
+    _WORKER_AXES.cla()
+    _draw_grid(_WORKER_AXES, voxel, text=text, fontsize=fontsize)
+    _WORKER_FIGURE.savefig(output_filepath)
+    return output_filepath
+
+
+def render_grids_to_png(voxels: Iterable[np.ndarray], output_filepaths: Sequence[str],
+                        texts: Optional[Sequence[str]] = None, figsize=(3, 3), dpi=100,
+                        fontsize=6, processes: Optional[int] = None,
+                        chunksize: int = 16) -> List[str]:
+    """Renders many grids as PNG thumbnails using a pool of off-screen renderers.
+
+    Each worker process switches to the non-interactive Agg backend and creates a single
+    figure that is cleared and reused for every grid it receives, so the cost of creating
+    figures and 3d axes is paid once per process instead of once per grid.
+
+    Args:
+        voxels (Iterable[np.ndarray]): grids with the same layout taken by `plot_grid`.
+        output_filepaths (Sequence[str]): path of the PNG file to write for each grid.
+        texts (Optional[Sequence[str]]): optional annotation for each grid.
+        processes (Optional[int]): number of worker processes, defaults to the cpu count.
+        chunksize (int): number of grids sent to a worker at once.
+
+    Returns:
+        List[str]: the paths of the written files, in the same order as `voxels`.
+    """
+    if texts is None:
+        texts = [None] * len(output_filepaths)
+    for output_filepath in output_filepaths:
+        output_dirname = os.path.dirname(output_filepath)
+        if output_dirname:
+            os.makedirs(output_dirname, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_render_worker,
+                             initargs=(figsize, dpi)) as executor:
+        return list(executor.map(
+            _render_grid_to_png, voxels, output_filepaths, texts,
+            [fontsize] * len(output_filepaths), chunksize=chunksize))
+
+
 def break_str_to_lines(text, max_char_len=50):
     lines = []
     current_line = ''
@@ -48,4 +117,4 @@ def break_str_to_lines(text, max_char_len=50):
             current_line = ''
         current_line += ch
     lines.append(current_line)
-    return '\n'.join(lines)
\ No newline at end of file
+    return '\n'.join(lines)
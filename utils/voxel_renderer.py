@@ -0,0 +1,142 @@
+"""Orthographic voxel rasterizer written only with NumPy.
+
+Renders the same grids taken by `grid_visualization.plot_grid`, i.e., arrays of block ids
+with shape (height, x, z), from the four horizontal directions and from the top. Every view
+is axis aligned, so the depth buffer of each pixel is the index of the first occupied cell
+along the viewing axis, which is computed for the whole image with a single argmax. No
+display or plotting library is needed, which allows to render screenshots in bulk on
+headless machines.
+
+Directions follow the Minecraft convention: x grows to the east and z to the south. The
+`north` view is the structure seen from its north side, i.e., looking south.
+"""
+import struct
+import zlib
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+VIEWS = ('north', 'east', 'south', 'west', 'top')
+
+# Same palette as grid_visualization.IDX2COLOR, as 8 bit RGB. Index 0 is air.
+PALETTE = np.array([
+    [0, 0, 0],        # air
+    [0, 0, 255],      # blue
+    [0, 128, 0],      # green
+    [255, 0, 0],      # red
+    [255, 165, 0],    # orange
+    [128, 0, 128],    # purple
+    [255, 255, 0],    # yellow
+], dtype=np.uint8)
+
+BACKGROUND_COLOR = (235, 235, 235)
+EDGE_COLOR = (0, 0, 0)
+
+
+def _orient_grid(voxel: np.ndarray, view: str) -> np.ndarray:
+    """Transposes and flips the grid so the camera looks along axis 0.
+
+    The returned array has shape (depth, image rows, image columns), with depth 0 being
+    the cell closest to the camera and row 0 the top of the image.
+    """
+    # (height, x, z) -> axes named y, x, z
+    if view == 'top':
+        # Looking down, north at the top of the image and east to the right.
+        return voxel[::-1, :, :].transpose(0, 2, 1)
+    # Horizontal views have the highest cells at the top of the image.
+    upside_down = voxel[::-1]
+    if view == 'north':
+        # Looking south, west is to the right.
+        return upside_down.transpose(2, 0, 1)[:, :, ::-1]
+    if view == 'south':
+        # Looking north, east is to the right.
+        return upside_down.transpose(2, 0, 1)[::-1, :, :]
+    if view == 'east':
+        # Looking west, north is to the right.
+        return upside_down.transpose(1, 0, 2)[::-1, :, ::-1]
+    if view == 'west':
+        # Looking east, south is to the right.
+        return upside_down.transpose(1, 0, 2)
+    raise ValueError(f'Unknown view {view}, expected one of {VIEWS}')
+
+
+def render_view(voxel: np.ndarray, view: str = 'north', scale: int = 16,
+                depth_shading: float = 0.5, draw_edges: bool = True) -> np.ndarray:
+    """Renders one orthographic view of a grid.
+
+    Args:
+        voxel (np.ndarray): integer grid of block ids with shape (height, x, z).
+        view (str): one of `VIEWS`.
+        scale (int): side in pixels of each rendered cell.
+        depth_shading (float): fraction in which the color of the farthest cells is darkened,
+            to give a sense of depth to the flat projection.
+        draw_edges (bool): whether to outline each visible cell.
+
+    Returns:
+        np.ndarray: an RGB image with dtype uint8.
+    """
+    oriented = _orient_grid(np.asarray(voxel), view)
+    occupied = oriented != 0
+    depth_count = oriented.shape[0]
+
+    # Depth buffer: index of the first occupied cell along each ray
+    hit = occupied.any(axis=0)
+    depth = occupied.argmax(axis=0)
+    block_ids = np.take_along_axis(oriented, depth[np.newaxis], axis=0)[0]
+    block_ids = np.where(hit & (block_ids < len(PALETTE)), block_ids, 0)
+
+    shade = 1.0 - depth_shading * depth / max(depth_count - 1, 1)
+    cells = PALETTE[block_ids] * shade[..., np.newaxis]
+    cells[~hit] = BACKGROUND_COLOR
+    cells = cells.astype(np.uint8)
+
+    image = np.repeat(np.repeat(cells, scale, axis=0), scale, axis=1)
+    if draw_edges and scale > 2:
+        edges = np.repeat(np.repeat(hit, scale, axis=0), scale, axis=1)
+        border = np.zeros((scale, scale), dtype=bool)
+        border[0, :] = border[-1, :] = border[:, 0] = border[:, -1] = True
+        edges &= np.tile(border, hit.shape)
+        image[edges] = EDGE_COLOR
+    return image
+
+
+def render_views(voxel: np.ndarray, views: Sequence[str] = VIEWS,
+                 **render_kwargs) -> Dict[str, np.ndarray]:
+    """Renders several views of the same grid, see `render_view` for the arguments."""
+    return {view: render_view(voxel, view, **render_kwargs) for view in views}
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (struct.pack('>I', len(data)) + chunk_type + data +
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def encode_png(image: np.ndarray, compression_level: int = 6) -> bytes:
+    """Encodes an RGB uint8 image as PNG bytes without any imaging library."""
+    height, width, _ = image.shape
+    # Each scanline is prefixed with filter type 0 (None)
+    scanlines = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = np.ascontiguousarray(image, dtype=np.uint8).reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', header),
+        _png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), compression_level)),
+        _png_chunk(b'IEND', b''),
+    ])
+
+
+def save_views(voxel: np.ndarray, output_prefix: str, views: Sequence[str] = VIEWS,
+               **render_kwargs) -> Tuple[str, ...]:
+    """Writes one PNG file per view, named `<output_prefix>_<view>.png`.
+
+    Returns:
+        Tuple[str, ...]: the written file paths.
+    """
+    filepaths = []
+    for view, image in render_views(voxel, views, **render_kwargs).items():
+        filepath = f'{output_prefix}_{view}.png'
+        with open(filepath, 'wb') as png_file:
+            png_file.write(encode_png(image))
+        filepaths.append(filepath)
+    return tuple(filepaths)